@@ -4,6 +4,7 @@ from tencentcloud.common.profile.client_profile import ClientProfile
 from tencentcloud.common.profile.http_profile import HttpProfile
 from tencentcloud.tts.v20190823 import tts_client, models
 import base64
+import hashlib
 import json
 import os
 import sys  # 添加sys模块导入
@@ -14,6 +15,22 @@ import csv
 import tempfile
 import subprocess
 import pathlib
+import signal
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from credential_pool import CredentialPool, DEFAULT_KEY_QPS
+from region_selector import RegionSelector, DEFAULT_REGIONS, is_region_error
+from hedging import HedgePolicy, HedgeStats, DEFAULT_HEDGE_BUDGET
+from job_metrics import JobMetrics
+from scheduler import PriorityExecutor, PriorityLimiter
+from hls_output import HlsWriter
+from throughput_model import THROUGHPUT_STATS_FILE, get_default_model, format_eta
+import profiling
+from audio_utils import (AudioFormatError, format_key, parse_wav_header, validate_wav_segment, wav_duration,
+                         build_wav_header, extract_pcm,
+                         parse_mp3, mp3_format_key, concat_mp3, validate_mp3_segment)
 
 # 设置基础目录（项目根目录）
 base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "./"))
@@ -51,14 +68,63 @@ def load_credentials_from_csv(csv_path):
         print(f"读取凭证文件失败: {str(e)}")
         return None, None
 
-def process_text_by_lines(text):
-    """将文本按行分割，并组合成不超过150字的片段"""
+def load_credential_pool_from_csv(csv_path):
+    """从CSV文件中加载所有凭证，返回[(SecretId, SecretKey, QPS), ...]
+
+    第三列QPS可选，用于设置该凭证的每秒请求上限
+    """
+    credentials = []
+    try:
+        with open(csv_path, 'r') as f:
+            reader = csv.reader(f)
+            # 跳过标题行
+            next(reader, None)
+            seen = set()
+            for row in reader:
+                row = [cell.strip() for cell in row]
+                if len(row) < 2 or not row[0] or not row[1] or row[0] in seen:
+                    continue
+                seen.add(row[0])
+                qps = DEFAULT_KEY_QPS
+                if len(row) >= 3 and row[2]:
+                    try:
+                        qps = max(1, int(row[2]))
+                    except ValueError:
+                        print(f"凭证 {row[0][:6]}*** 的QPS配置无效，使用默认值{DEFAULT_KEY_QPS}")
+                credentials.append((row[0], row[1], qps))
+        if not credentials:
+            print(f"错误：无法从CSV文件中读取有效的凭证")
+        return credentials
+    except Exception as e:
+        print(f"读取凭证文件失败: {str(e)}")
+        return []
+
+# 默认片段长度上限（TextToVoice单次请求最多150字）
+DEFAULT_MAX_SEGMENT_LENGTH = 150
+# 超长行优先在这些标点之后断开
+SENTENCE_BREAKS = "。！？；!?;…，,、"
+
+def split_long_line(line, max_length):
+    """将超过长度上限的行在句读处拆开，找不到标点时按长度硬拆"""
+    parts = []
+    while len(line) > max_length:
+        cut = max(line.rfind(mark, 0, max_length) for mark in SENTENCE_BREAKS)
+        cut = cut + 1 if cut > 0 else max_length
+        parts.append(line[:cut].strip())
+        line = line[cut:].strip()
+    if line:
+        parts.append(line)
+    return parts
+
+def process_text_by_lines(text, max_length=DEFAULT_MAX_SEGMENT_LENGTH):
+    """将文本按行分割，并组合成不超过max_length字的片段"""
     segments = []
     current_segment = ""
-    max_length = 150
     
-    # 按行分割文本
-    lines = text.strip().split('\n')
+    # 按行分割文本，超长的行先在句读处拆开
+    lines = []
+    for line in text.strip().split('\n'):
+        lines.extend(split_long_line(line.strip(), max_length))
     
     for line in lines:
         line = line.strip()
@@ -83,15 +149,66 @@ def process_text_by_lines(text):
         
     return segments
 
+def get_config_path(filename):
+    """获取配置目录下文件的路径：程序（打包后为exe）所在目录下的config，不受当前工作目录影响"""
+    return os.path.join(base_dir, 'config', filename)
+
+def get_voice_category(voice_id):
+    """根据音色ID获取音色类型（标准音色/精品音色/大模型音色），未找到时返回None"""
+    csv_path = get_config_path('tencent_cloud_voice_type.csv')
+    try:
+        with open(csv_path, 'r', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            # 跳过标题行
+            next(reader, None)
+            for row in reader:
+                if len(row) >= 4 and row[0].strip() == str(voice_id):
+                    return row[3].strip()
+    except OSError:
+        pass
+    return None
+
+# 片段长度调优结果文件（由 audio_generator.py calibrate 生成）
+SEGMENT_TUNING_FILE = 'segment_tuning.json'
+_segment_tuning = {"mtime": None, "limits": {}}
+
+def load_segment_tuning():
+    """读取各音色类型的片段长度上限，文件有变化时重新加载"""
+    path = get_config_path(SEGMENT_TUNING_FILE)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    if mtime != _segment_tuning["mtime"]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            _segment_tuning["limits"] = {category: int(entry["max_length"])
+                                         for category, entry in data.get("voice_types", {}).items()}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"读取片段长度调优文件失败: {e}")
+            _segment_tuning["limits"] = {}
+        _segment_tuning["mtime"] = mtime
+    return _segment_tuning["limits"]
+
+def get_segment_max_length(voice_type):
+    """获取音色对应的片段长度上限（有调优结果时使用调优值）"""
+    limits = load_segment_tuning()
+    if not limits:
+        return DEFAULT_MAX_SEGMENT_LENGTH
+    max_length = limits.get(get_voice_category(voice_type), DEFAULT_MAX_SEGMENT_LENGTH)
+    return max(1, min(max_length, DEFAULT_MAX_SEGMENT_LENGTH))
+
+def split_text_for_voice(text, voice_type):
+    """按音色对应的片段长度上限分割文本"""
+    return process_text_by_lines(text, get_segment_max_length(voice_type))
+
 def get_voice_name(voice_id):
     """根据音色ID获取音色名称"""
     voice_id_str = str(voice_id)
     
     # 修改CSV路径获取方式
-    if getattr(sys, 'frozen', False):
-        csv_path = os.path.join(base_dir, 'config', 'tencent_cloud_voice_type.csv')
-    else:
-        csv_path = os.path.join('Config', 'tencent_cloud_voice_type.csv')
+    csv_path = get_config_path('tencent_cloud_voice_type.csv')
     
     # 如果音色文件不存在，直接返回ID作为前缀
     if not os.path.exists(csv_path):
@@ -115,139 +232,783 @@ def get_voice_name(voice_id):
         print(f"读取音色文件失败: {str(e)}")
         return voice_id_str
 
-def text_to_speech(text, output_file="output.wav", voice_type=101011, speed=0, volume=5):
+# 同时进行的TextToVoice请求数上限
+DEFAULT_CONCURRENCY = 4
+# 片段缓存保留的最大条目数
+DEFAULT_CACHE_ENTRIES = 512
+# 本地片段存储的默认容量上限（字节）
+DEFAULT_STORE_MAX_BYTES = 500 * 1024 * 1024
+# 默认接入域名（就近接入）和地域
+DEFAULT_ENDPOINT = "tts.tencentcloudapi.com"
+DEFAULT_REGION = "ap-guangzhou"
+# 单次请求的连接超时和读取超时（秒），避免卡住的请求一直占用并发名额
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+# 等待片段时检查取消标记的间隔（秒）
+CANCEL_POLL_INTERVAL = 0.1
+# 被限流时等待凭证恢复后重试的最长时间（秒），只有一个凭证时也不会因一次限流就放弃片段
+THROTTLE_RETRY_SECONDS = 30
+
+def get_secret_key_csv_path():
+    """获取凭证CSV文件路径（适配打包环境）
+
+    旧版本在开发环境下从当前目录的Config读取凭证，程序目录下没有凭证文件时仍使用该位置
+    """
+    path = get_config_path('tencent_cloud_secret_key.csv')
+    legacy_path = os.path.join('Config', 'tencent_cloud_secret_key.csv')
+    if not getattr(sys, 'frozen', False) and not os.path.exists(path) and os.path.exists(legacy_path):
+        return legacy_path
+    return path
+
+def create_tts_client(secret_id, secret_key, region=DEFAULT_REGION, endpoint=DEFAULT_ENDPOINT,
+                      connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT):
+    """根据凭证创建指定地域和接入域名的TTS客户端"""
+    cred = credential.Credential(secret_id, secret_key)
+    httpProfile = HttpProfile()
+    httpProfile.endpoint = endpoint
+    httpProfile.keepAlive = True  # 复用连接，避免每个片段重新握手
+    # SDK把reqTimeout原样传给requests，元组表示(连接超时, 读取超时)
+    httpProfile.reqTimeout = (connect_timeout, read_timeout)
+    clientProfile = ClientProfile()
+    clientProfile.httpProfile = httpProfile
+    return tts_client.TtsClient(cred, region, clientProfile)
+
+class SynthesisCancelled(Exception):
+    """合成被取消"""
+
+class CancelToken:
+    """取消标记：其他线程调用cancel()后，text_to_speech在片段之间和等待片段时尽快退出"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def wait(self, timeout):
+        """等待取消，返回是否已取消"""
+        return self._event.wait(timeout)
+
+    def check(self):
+        """已取消时抛出SynthesisCancelled"""
+        if self._event.is_set():
+            raise SynthesisCancelled("合成已取消")
+
+def make_segment_key(segment, voice_type, speed, volume, codec):
+    """生成片段缓存键：(文本, 音色, 语速, 音量, 编码)"""
+    return (segment, int(voice_type), float(speed), int(volume), codec)
+
+# 片段音频无效时最多请求的次数
+SEGMENT_ATTEMPTS = 3
+
+def validate_segment_audio(key, audio_data):
+    """检查片段音频是否完整（WAV检查头部一致性，MP3检查帧完整性，并检查时长），不合法时抛出AudioFormatError"""
+    segment, speed, codec = key[0], key[2], key[4]
+    if not audio_data:
+        raise AudioFormatError("音频数据为空")
+    char_count = len("".join(segment.split()))
+    if codec == "wav":
+        validate_wav_segment(audio_data, char_count, speed)
+    elif codec == "mp3":
+        validate_mp3_segment(audio_data, char_count, speed)
+
+class SegmentCache:
+    """线程安全的片段音频缓存（LRU）"""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+class SingleFlight:
+    """合并相同键的并发调用：同一时刻只执行一次，其余调用等待并共享结果"""
+
+    def __init__(self):
+        self.shared = 0  # 共享了其他调用结果的次数
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+class DiskSegmentStore:
+    """本地磁盘片段存储，接口与SegmentCache相同，进程重启后仍可复用已合成的片段"""
+
+    def __init__(self, directory, max_bytes=DEFAULT_STORE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.bin")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with profiling.stage("file_io"), open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        # 更新访问时间，容量超限时优先删除最久未使用的片段
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with profiling.stage("file_io"):
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        self.prune()
+
+    def discard(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def prune(self):
+        """总大小超过上限时删除最久未使用的片段"""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".bin"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def __len__(self):
+        return sum(1 for name in os.listdir(self.directory) if name.endswith(".bin"))
+
+class SynthesisSession:
+    """合成会话：在多次合成之间共享凭证池（TTS客户端）、片段缓存和并发限制"""
+
+    def __init__(self, max_concurrency=DEFAULT_CONCURRENCY, cache=None, credentials_path=None,
+                 key_strategy="round_robin", region=DEFAULT_REGION, endpoint=DEFAULT_ENDPOINT,
+                 region_selector=None, segment_store=None, hedge_policy=None,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 mp3_transport=False):
+        self.max_concurrency = max_concurrency
+        self.cache = cache if cache is not None else SegmentCache()
+        # 可选的本地磁盘片段存储（例如GUI预合成的片段），位于内存缓存之后
+        self.segment_store = segment_store
+        self.credentials_path = credentials_path or get_secret_key_csv_path()
+        self.key_strategy = key_strategy
+        # 固定地域和接入域名；设置region_selector时按探测延迟自动选择
+        self.region = region
+        self.endpoint = endpoint
+        self.region_selector = region_selector
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # 输出MP3时直接请求MP3编码并拼接音频帧，不再传输WAV后用ffmpeg重新编码
+        self.mp3_transport = mp3_transport
+        # 限制同时在途的网络请求数，缓存命中不占用名额；
+        # 片段任务和并发名额都按优先级调度，交互式请求排在批量任务之前（见scheduler.py）
+        self.limiter = PriorityLimiter(max_concurrency)
+        self._executor = PriorityExecutor(max_workers=max_concurrency * 2,
+                                          thread_name_prefix="tts-segment")
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # 相同片段（文本、音色、语速、音量、编码）的并发请求只发送一次
+        self.single_flight = SingleFlight()
+        # 可选的对冲请求：请求超过近期p95延迟仍未返回时再发一个相同请求
+        self.hedge_policy = hedge_policy
+        self._hedge_executor = None
+        if hedge_policy is not None:
+            self._hedge_executor = ThreadPoolExecutor(max_workers=max_concurrency * 2,
+                                                      thread_name_prefix="tts-hedge")
+
+    def get_pool(self):
+        """获取共享的凭证池，凭证无效时返回None"""
+        with self._pool_lock:
+            if self._pool is None:
+                credentials = load_credential_pool_from_csv(self.credentials_path)
+                if not credentials:
+                    print("错误：无法获取腾讯云凭证，请检查CSV文件")
+                    return None
+                self._pool = CredentialPool(credentials, self._create_client, strategy=self.key_strategy)
+                if len(credentials) > 1:
+                    print(f"已加载 {len(credentials)} 组凭证，分配策略: {self.key_strategy}")
+            return self._pool
+
+    def _create_client(self, secret_id, secret_key, region, endpoint):
+        return create_tts_client(secret_id, secret_key, region, endpoint,
+                                 self.connect_timeout, self.read_timeout)
+
+    def submit(self, fn, *args, **kwargs):
+        """在会话的线程池中执行任务，返回Future
+
+        任务按当前线程的优先级排队（默认交互式，批量任务在scheduler.priority_scope(PRIORITY_BULK)中提交）
+        """
+        return self._executor.submit(profiling.profiled(fn), *args, **kwargs)
+
+    def fetch_segment(self, segment, voice_type, speed=0, volume=5, codec="wav", hedge_stats=None, metrics=None):
+        """合成单个文本片段，返回音频字节
+
+        依次查找内存缓存和本地存储；都未命中时，相同片段的并发调用共享同一个请求。
+        hedge_stats（HedgeStats）用于统计调用方任务的对冲请求，
+        metrics（JobMetrics）用于记录调用方任务的缓存命中、请求延迟、重试和排队等待
+        """
+        key = make_segment_key(segment, voice_type, speed, volume, codec)
+        audio_data = self.cache.get(key)
+        if audio_data is not None:
+            if metrics is not None:
+                metrics.cache_lookup(True)
+            return audio_data
+        if metrics is None:
+            return self.single_flight.do(key, self._load_segment, key, hedge_stats)
+        # 共享其他调用正在进行的请求也算作命中
+        loaded = []
+        def load():
+            loaded.append(True)
+            return self._load_segment(key, hedge_stats, metrics)
+        audio_data = self.single_flight.do(key, load)
+        if not loaded:
+            metrics.cache_lookup(True)
+        return audio_data
+
+    def _load_segment(self, key, hedge_stats=None, metrics=None):
+        """从本地存储读取片段，未命中时请求TextToVoice并写入缓存"""
+        # 等待期间其他调用可能已经写入缓存
+        audio_data = self.cache.get(key)
+        if audio_data is None and self.segment_store is not None:
+            audio_data = self.segment_store.get(key)
+            if audio_data is not None:
+                try:
+                    validate_segment_audio(key, audio_data)
+                    self.cache.put(key, audio_data)
+                except AudioFormatError as e:
+                    print(f"本地存储的片段无效（{e}），重新请求")
+                    self.segment_store.discard(key)
+                    audio_data = None
+        if metrics is not None:
+            metrics.cache_lookup(audio_data is not None, len(key[0]))
+        if audio_data is not None:
+            return audio_data
+
+        # 解码后立即检查音频，无效的片段自动重新请求，不写入缓存
+        wait_start = time.monotonic()
+        with profiling.stage("queue_wait"):
+            self.limiter.acquire()
+        try:
+            if metrics is not None:
+                metrics.add_wait(time.monotonic() - wait_start)
+            for attempt in range(SEGMENT_ATTEMPTS):
+                if self.hedge_policy is None:
+                    audio_data = self._request_segment(key, metrics)
+                else:
+                    audio_data = self._request_hedged(key, hedge_stats, metrics)
+                try:
+                    validate_segment_audio(key, audio_data)
+                    break
+                except AudioFormatError as e:
+                    if attempt == SEGMENT_ATTEMPTS - 1:
+                        raise
+                    print(f"片段音频无效（{e}），重新请求（第{attempt + 2}次）")
+                    if metrics is not None:
+                        metrics.add_retry()
+        finally:
+            self.limiter.release()
+        self.cache.put(key, audio_data)
+        if self.segment_store is not None:
+            self.segment_store.put(key, audio_data)
+        return audio_data
+
+    def _request_segment(self, key, metrics=None):
+        """请求TextToVoice合成片段，返回音频字节"""
+        segment, voice_type, speed, volume, codec = key
+        pool = self.get_pool()
+        if pool is None:
+            raise RuntimeError("无法获取腾讯云凭证")
+
+        # 实例化请求对象
+        req = models.TextToVoiceRequest()
+        params = {
+            "Text": segment,
+            "SessionId": f"session-{hash(key)}",
+            "VoiceType": int(voice_type),  # 音色ID
+            "Volume": volume,        # 音量
+            "Speed": speed,         # 语速
+            "Codec": codec,     # 编码格式
+            "PrimaryLanguage": 1,  # 语言
+        }
+        req.from_json_string(json.dumps(params))
+
+        # 被限流或额度耗尽的凭证会被暂时剔除，换下一个凭证重试；
+        # 自动选择地域时，网络或服务端错误也会重试（可能切换到其他地域）。
+        # 限流重试在THROTTLE_RETRY_SECONDS内不占用重试次数：凭证全部被剔除时pool.acquire会等待最早恢复的凭证
+        selector = self.region_selector
+        attempts = len(pool) + (len(selector.states) if selector else 0)
+        throttle_deadline = time.monotonic() + THROTTLE_RETRY_SECONDS
+        attempt = 0
+        while True:
+            region, endpoint = selector.choose() if selector else (self.region, self.endpoint)
+            # 等待凭证（QPS限制、限流剔除）的时间计入排队等待
+            wait_start = time.monotonic()
+            with profiling.stage("queue_wait"):
+                slot = pool.acquire()
+            if metrics is not None:
+                metrics.add_wait(time.monotonic() - wait_start)
+                metrics.request_started()
+            request_start = time.monotonic()
+            try:
+                with profiling.stage("network"):
+                    resp = pool.get_client(slot, region, endpoint).TextToVoice(req)
+            except Exception as e:
+                if metrics is not None:
+                    metrics.request_finished()
+                kind = pool.release(slot, e)
+                region_error = is_region_error(e)
+                if selector:
+                    selector.record(region, not region_error)
+                retry = kind is not None or (selector is not None and region_error)
+                if kind != "throttle" or time.monotonic() >= throttle_deadline:
+                    attempt += 1
+                    if not retry or attempt >= attempts:
+                        raise
+                if metrics is not None:
+                    metrics.add_retry(throttled=kind is not None)
+                continue
+            if metrics is not None:
+                metrics.request_finished(time.monotonic() - request_start)
+            pool.release(slot)
+            if selector:
+                selector.record(region, True)
+            break
+
+        # 解析Base64编码的音频数据
+        with profiling.stage("base64"):
+            return base64.b64decode(resp.Audio)
+
+    def _timed_request(self, key, metrics=None):
+        """请求片段并把成功请求的延迟计入对冲阈值"""
+        start = time.monotonic()
+        audio_data = self._request_segment(key, metrics)
+        self.hedge_policy.record(time.monotonic() - start)
+        return audio_data
+
+    def _request_hedged(self, key, hedge_stats=None, metrics=None):
+        """请求片段，超过对冲阈值仍未返回时（预算允许）再发一个相同请求，采用先成功返回的结果"""
+        policy = self.hedge_policy
+        policy.note_request()
+        primary = self._hedge_executor.submit(profiling.profiled(self._timed_request), key, metrics)
+        threshold = policy.threshold()
+        if threshold is None or wait([primary], timeout=threshold).done or not policy.try_hedge():
+            return primary.result()
+
+        # 对冲请求不占用并发名额，数量由对冲预算限制；落后的请求在后台结束后丢弃
+        backup = self._hedge_executor.submit(profiling.profiled(self._timed_request), key, metrics)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    won = future is backup
+                    if won:
+                        policy.note_win()
+                    if hedge_stats is not None:
+                        hedge_stats.add(won)
+                    return future.result()
+                error = error or future.exception()
+        if hedge_stats is not None:
+            hedge_stats.add(False)
+        raise error
+
+    def discard_segment(self, segment, voice_type, speed=0, volume=5, codec="wav"):
+        """从缓存和本地存储中删除片段，下次获取时重新请求"""
+        key = make_segment_key(segment, voice_type, speed, volume, codec)
+        self.cache.discard(key)
+        if self.segment_store is not None:
+            self.segment_store.discard(key)
+
+    def is_cached(self, segment, voice_type, speed=0, volume=5, codec="wav"):
+        """片段是否已在缓存或本地存储中（不发起请求）"""
+        key = make_segment_key(segment, voice_type, speed, volume, codec)
+        return key in self.cache or (self.segment_store is not None and key in self.segment_store)
+
+    def close(self):
+        """关闭线程池"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False, cancel_futures=True)
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+def get_default_session():
+    """获取进程内默认的合成会话（CLI和GUI共用）"""
+    global _default_session
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = SynthesisSession()
+        return _default_session
+
+def get_throughput_model():
+    """进程内共享的合成耗时模型（config/throughput_stats.json）"""
+    return get_default_model(get_config_path(THROUGHPUT_STATS_FILE))
+
+def voice_categories(items):
+    """[(片段, 音色ID, 语速, 音量), ...]中各音色的类型：{音色ID字符串: 音色类型}"""
+    return {str(voice_type): get_voice_category(voice_type) for voice_type in {item[1] for item in items}}
+
+def estimate_job(items, output_file, session=None, codec="wav", categories=None):
+    """根据历史记录预估合成items的耗时，返回(网络耗时, 合并耗时)秒数，没有记录时返回None
+
+    已在会话缓存或本地存储中的片段不计入网络耗时
+    """
+    if session is None:
+        session = get_default_session()
+    if categories is None:
+        categories = voice_categories(items)
+    return get_throughput_model().estimate(
+        items, output_file, session.max_concurrency,
+        cached=lambda segment, voice_type, speed, volume: session.is_cached(segment, voice_type, speed, volume, codec),
+        categories=categories)
+
+def record_throughput(items, output_file, metrics, session, categories=None):
+    """把成功任务的指标记入耗时模型并保存（出错时只打印警告，不影响合成结果）"""
+    try:
+        model = get_throughput_model()
+        model.record(items, output_file, metrics.snapshot(), session.max_concurrency, categories)
+        model.save()
+    except Exception as e:
+        print(f"警告：记录耗时统计失败: {e}")
+
+def merge_audio_files(input_files, output_file, work_dir):
+    """使用FFmpeg合并音频片段，并根据输出文件后缀选择编码"""
+    # 创建concat文件列表
+    concat_list_path = os.path.join(work_dir, "concat_list.txt")
+    with open(concat_list_path, "w") as f:
+        for input_file in input_files:
+            f.write(f"file '{input_file}'\n")
+
+    # 获取输出文件的格式
+    output_ext = os.path.splitext(output_file)[1].lower()
+
+    # 使用FFmpeg合并音频文件
+    cmd = [
+        ffmpeg_path,
+        "-f", "concat",
+        "-safe", "0",
+        "-i", concat_list_path
+    ]
+
+    # 根据输出格式添加相应的编码选项
+    if output_ext == ".mp3":
+        cmd.extend(["-c:a", "libmp3lame", "-q:a", "2"])
+    elif output_ext == ".aac" or output_ext == ".m4a":
+        cmd.extend(["-c:a", "aac", "-b:a", "192k"])
+    elif output_ext == ".ogg":
+        cmd.extend(["-c:a", "libvorbis", "-q:a", "4"])
+    elif output_ext == ".flac":
+        cmd.extend(["-c:a", "flac"])
+    else:
+        # WAV或其他未指定格式，直接复制
+        cmd.extend(["-c", "copy"])
+
+    # 添加输出文件
+    cmd.append(output_file)
+
+    try:
+        # 添加creationflags参数隐藏控制台窗口（仅Windows系统）
+        creation_flags = 0x08000000 if sys.platform == "win32" else 0  # CREATE_NO_WINDOW标志
+        with profiling.stage("ffmpeg"):
+            subprocess.run(cmd, check=True, capture_output=True, creationflags=creation_flags)
+        print(f"所有片段已合并，最终文件保存为 {output_file}")
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"合并音频失败: {e.stderr}")
+        return False
+    finally:
+        if os.path.exists(concat_list_path):
+            os.remove(concat_list_path)
+
+def text_to_speech(text, output_file="output.wav", voice_type=101011, speed=0, volume=5, session=None,
+                   on_segment=None, hedge_stats=None, cancel_token=None, metrics=None):
+    """合成文本并保存为output_file
+
+    on_segment(index, total, audio_data)会在每个片段按顺序就绪时调用，可用于边合成边播放；
+    会话启用对冲请求时，本次任务的对冲次数记录在hedge_stats（HedgeStats）中；
+    cancel_token（CancelToken）被取消后尽快停止并返回False；
+    metrics（JobMetrics）记录本次任务的进度、吞吐、请求延迟等实时指标
+    """
+    # 将文本分段（默认每段不超过150字，有调优结果时按音色类型调整），并保持句子完整性
+    segments = split_text_for_voice(text, voice_type)
+    print(f"文本已分割为{len(segments)}个片段")
+    return synthesize_segments([(segment, voice_type, speed, volume) for segment in segments], output_file,
+                               session, on_segment, hedge_stats, cancel_token, metrics)
+
+def describe_segment(audio_data, codec):
+    """解析片段音频，返回(格式信息, 格式键)，格式信息中含duration"""
+    if codec == "mp3":
+        info = parse_mp3(audio_data)
+        return info, mp3_format_key(info)
+    fmt = parse_wav_header(audio_data)
+    fmt["duration"] = wav_duration(fmt)
+    return fmt, format_key(fmt)
+
+def synthesize_segments(items, output_file, session=None, on_segment=None, hedge_stats=None, cancel_token=None,
+                        metrics=None):
+    """并发合成[(片段, 音色ID, 语速, 音量), ...]，按顺序合并保存为output_file
+
+    各片段可以使用不同的音色和参数（例如多角色对话），其余参数与text_to_speech相同；
+    会话开启mp3_transport且输出为.mp3时，片段以MP3编码传输，on_segment收到的是MP3数据；
+    输出为.m3u8时写HLS：每个片段就绪后立即编码为MPEG-TS分片并更新播放列表，不再合并为单个文件
+    """
     temp_dir = None
     temp_files = []
-    concat_list_path = None
+    futures = []
+    # 首个片段的音频格式和按音频头累计的总时长
+    first_format = None
+    total_duration = 0.0
+    # MP3传输时各片段解析出的音频帧
+    mp3_parts = []
+    # HLS输出时的分片写入器
+    hls_writer = None
+    
+    # 未指定会话时使用进程内共享的默认会话（客户端、缓存和并发限制）
+    if session is None:
+        session = get_default_session()
+    codec = "mp3" if session.mp3_transport and output_file.lower().endswith(".mp3") else "wav"
     
-    # 添加路径验证
-    if not os.path.exists(ffmpeg_path):
+    # 添加路径验证（MP3帧直接拼接，不需要ffmpeg）
+    if codec == "wav" and not os.path.exists(ffmpeg_path):
         print(f"致命错误：ffmpeg路径不存在 {ffmpeg_path}")
         return False
         
     try:
-        # 从CSV文件加载凭证
-        # 修改CSV路径获取方式
-        if getattr(sys, 'frozen', False):
-            csv_path = os.path.join(base_dir, 'config', 'tencent_cloud_secret_key.csv')
-        else:
-            csv_path = os.path.join('Config', 'tencent_cloud_secret_key.csv')
-            
-        secret_id, secret_key = load_credentials_from_csv(csv_path)
-        
-        if not secret_id or not secret_key:
-            print("错误：无法获取腾讯云凭证，请检查CSV文件")
+        if session.get_pool() is None:
             return False
         
-        # 实例化一个认证对象
-        cred = credential.Credential(secret_id, secret_key)
-        
-        # 实例化client
-        httpProfile = HttpProfile()
-        httpProfile.endpoint = "tts.tencentcloudapi.com"
-        clientProfile = ClientProfile()
-        clientProfile.httpProfile = httpProfile
-        client = tts_client.TtsClient(cred, "ap-guangzhou", clientProfile)
-        
-        # 将文本分段，每段不超过150字，并保持句子完整性
-        segments = process_text_by_lines(text)
-        print(f"文本已分割为{len(segments)}个片段")
+        duplicates = len(items) - len(set(items))
+        if duplicates:
+            print(f"其中{duplicates}个片段与前文重复，将复用同一次请求的音频")
         
         # 创建临时目录存放临时音频片段
         temp_dir = tempfile.mkdtemp()
+        if output_file.lower().endswith(".m3u8"):
+            hls_writer = HlsWriter(output_file, ffmpeg_path)
+        
+        if hedge_stats is None:
+            hedge_stats = HedgeStats()
+        if metrics is None:
+            metrics = JobMetrics()
+        metrics.start(items)
+        
+        # 根据同音色、同输出格式的历史任务预估耗时
+        categories = voice_categories(items)
+        try:
+            estimate = estimate_job(items, output_file, session, codec, categories)
+        except Exception as e:
+            estimate = None
+            print(f"警告：预估耗时失败: {e}")
+        else:
+            if estimate is not None:
+                metrics.set_estimate(*estimate)
+                print(f"根据历史记录预计耗时约{format_eta(sum(estimate))}")
+            else:
+                print("暂无该音色的历史耗时记录，本次完成后开始记录")
         
-        # 处理每个文本片段
-        for i, segment in enumerate(segments):
+        # 所有片段并发提交，再按顺序取回结果
+        futures = [session.submit(session.fetch_segment, segment, voice_type, speed, volume, codec, hedge_stats,
+                                  metrics)
+                   for segment, voice_type, speed, volume in items]
+        
+        for i, ((segment, voice_type, speed, volume), future) in enumerate(zip(items, futures)):
             temp_file = os.path.join(temp_dir, f"segment_{i}.wav")
-            temp_files.append(temp_file)
-            
-            print(f"处理片段 {i+1}/{len(segments)}: {segment[:30]}...({len(segment)}字)")
             
-            # 实例化请求对象
-            req = models.TextToVoiceRequest()
-            params = {
-                "Text": segment,
-                "SessionId": f"session-{i}-{hash(segment)}",
-                "VoiceType": voice_type,  # 使用传入的音色ID
-                "Volume": volume,        # 音量
-                "Speed": speed,         # 语速
-                "Codec": "wav",     # 编码格式
-                "PrimaryLanguage": 1,  # 语言
-            }
-            req.from_json_string(json.dumps(params))
+            print(f"处理片段 {i+1}/{len(items)}: {segment[:30]}...({len(segment)}字)")
             
             try:
-                # 发送请求并获取响应
-                resp = client.TextToVoice(req)
-                
-                # 解析Base64编码的音频数据并保存为临时文件
-                audio_data = base64.b64decode(resp.Audio)
-                with open(temp_file, 'wb') as f:
-                    f.write(audio_data)
+                # 等待片段时定期检查取消标记，不必等到请求超时
+                while cancel_token is not None and not future.done():
+                    if cancel_token.wait(CANCEL_POLL_INTERVAL):
+                        break
+                if cancel_token is not None:
+                    cancel_token.check()
+                audio_data = future.result()
+                # 各片段格式必须一致才能直接拼接，不一致时重新请求一次
+                fmt, fmt_key = describe_segment(audio_data, codec)
+                if first_format is None:
+                    first_format = fmt_key
+                elif fmt_key != first_format:
+                    print(f"片段 {i+1}/{len(items)} 的音频格式与前面的片段不一致，重新请求")
+                    session.discard_segment(segment, voice_type, speed, volume, codec)
+                    metrics.add_retry()
+                    audio_data = session.fetch_segment(segment, voice_type, speed, volume, codec, hedge_stats,
+                                                       metrics)
+                    fmt, fmt_key = describe_segment(audio_data, codec)
+                    if fmt_key != first_format:
+                        raise AudioFormatError("音频格式与前面的片段不一致")
+                total_duration += fmt["duration"]
+                metrics.segment_done(len(segment), fmt["duration"])
+                if codec == "mp3":
+                    mp3_parts.append(fmt)
+                elif hls_writer is not None:
+                    # 按顺序送入HLS编码器，客户端可以立即播放已写完的分片
+                    encode_start = time.monotonic()
+                    hls_writer.add_segment(audio_data)
+                    metrics.add_merge(time.monotonic() - encode_start)
+                else:
+                    # 保存为临时文件
+                    with profiling.stage("file_io"), open(temp_file, 'wb') as f:
+                        f.write(audio_data)
+                    temp_files.append(temp_file)
                     
-                print(f"片段 {i+1}/{len(segments)} 合成成功")
+                eta = metrics.snapshot()["eta"]
+                if eta is None:
+                    print(f"片段 {i+1}/{len(items)} 合成成功")
+                else:
+                    print(f"片段 {i+1}/{len(items)} 合成成功，预计剩余{format_eta(eta)}")
+                if on_segment:
+                    on_segment(i, len(items), audio_data)
                 
+            except SynthesisCancelled:
+                raise
             except Exception as e:
-                print(f"片段 {i+1}/{len(segments)} 合成失败: {e}")
+                print(f"片段 {i+1}/{len(items)} 合成失败: {e}")
                 return False
         
-        # 使用FFmpeg合并所有音频片段
-        if len(temp_files) > 0:
-            # 创建concat文件列表
-            concat_list_path = os.path.join(temp_dir, "concat_list.txt")
-            with open(concat_list_path, "w") as f:
-                for temp_file in temp_files:
-                    f.write(f"file '{temp_file}'\n")
-            
-            # 获取输出文件的格式
-            output_ext = os.path.splitext(output_file)[1].lower()
-            
-            # 使用FFmpeg合并音频文件
-            cmd = [
-                ffmpeg_path,
-                "-f", "concat",
-                "-safe", "0",
-                "-i", concat_list_path
-            ]
-            
-            # 根据输出格式添加相应的编码选项
-            if output_ext == ".mp3":
-                cmd.extend(["-c:a", "libmp3lame", "-q:a", "2"])
-            elif output_ext == ".aac" or output_ext == ".m4a":
-                cmd.extend(["-c:a", "aac", "-b:a", "192k"])
-            elif output_ext == ".ogg":
-                cmd.extend(["-c:a", "libvorbis", "-q:a", "4"])
-            elif output_ext == ".flac":
-                cmd.extend(["-c:a", "flac"])
-            else:
-                # WAV或其他未指定格式，直接复制
-                cmd.extend(["-c", "copy"])
-            
-            # 添加输出文件
-            cmd.append(output_file)
-            
-            try:
-                # 添加creationflags参数隐藏控制台窗口（仅Windows系统）
-                creation_flags = 0x08000000 if sys.platform == "win32" else 0  # CREATE_NO_WINDOW标志
-                subprocess.run(cmd, check=True, capture_output=True, creationflags=creation_flags)
-                print(f"所有片段已合并，最终文件保存为 {output_file}")
-                return True
-            except subprocess.CalledProcessError as e:
-                print(f"合并音频失败: {e.stderr}")
-                return False
+        if session.hedge_policy is not None:
+            print(f"对冲请求 {hedge_stats.hedges} 次，其中 {hedge_stats.wins} 次先于原请求返回")
+        
+        if cancel_token is not None:
+            cancel_token.check()
+        
+        if hls_writer is not None:
+            # 等待编码器写完剩余的分片
+            encode_start = time.monotonic()
+            hls_writer.finish()
+            metrics.add_merge(time.monotonic() - encode_start)
+            print(f"HLS播放列表已完成，共{len(hls_writer.entries)}个分片，保存为 {output_file}")
+            print(f"音频总时长 {total_duration:.1f} 秒")
+            record_throughput(items, output_file, metrics, session, categories)
+            return True
+        
+        merge_start = time.monotonic()
+        if codec == "mp3" and mp3_parts:
+            # 直接拼接MP3帧并重写Xing/Info帧中的帧数，不重新编码
+            data = concat_mp3(mp3_parts)
+            with profiling.stage("file_io"), open(output_file, 'wb') as f:
+                f.write(data)
+            print(f"所有片段已拼接（MP3帧直接拼接），最终文件保存为 {output_file}")
+            merged = True
+        elif len(temp_files) > 0:
+            # 使用FFmpeg合并所有音频片段
+            merged = merge_audio_files(temp_files, output_file, temp_dir)
         else:
             print("没有生成任何音频片段")
             return False
+        metrics.add_merge(time.monotonic() - merge_start)
+        if not merged:
+            return False
+        print(f"音频总时长 {total_duration:.1f} 秒")
+        record_throughput(items, output_file, metrics, session, categories)
+        return True
             
+    except SynthesisCancelled:
+        print("合成已取消")
+        return False
     except Exception as e:
         print(f"语音合成失败: {e}")
         return False
     finally:
+        if metrics is not None:
+            metrics.finish()
+        # 失败或取消时也结束播放列表，避免客户端一直等待新分片
+        if hls_writer is not None and (hls_writer.entries or hls_writer.started) and not hls_writer.ended:
+            try:
+                hls_writer.finish()
+            except (OSError, RuntimeError):
+                pass
+        # 取消尚未开始的片段请求
+        for future in futures:
+            future.cancel()
         # 确保在任何情况下都清理临时文件
         try:
-            if concat_list_path and os.path.exists(concat_list_path):
-                os.remove(concat_list_path)
-                
             for temp_file in temp_files:
                 if os.path.exists(temp_file):
                     os.remove(temp_file)
@@ -259,13 +1020,136 @@ def text_to_speech(text, output_file="output.wav", voice_type=101011, speed=0, v
         except Exception as e:
             print(f"清理临时文件时出错: {e}")
 
-# 主函数
-if __name__ == "__main__":
+# 预览时估算语音时长使用的语速（字/秒）
+PREVIEW_CHARS_PER_SECOND = 4
+
+def preview_items(items, seconds=None):
+    """取[(片段, 音色ID, 语速, 音量), ...]开头用于快速预览的部分
+
+    默认只取第一个片段；指定seconds时按每秒约PREVIEW_CHARS_PER_SECOND字取开头的文本，在句读处截断
+    """
+    if seconds is None:
+        return items[:1]
+    budget = max(1, int(seconds * PREVIEW_CHARS_PER_SECOND))
+    result = []
+    for segment, *params in items:
+        if len(segment) > budget:
+            # 第一个片段就超出时截取开头的句子，之后的片段放不下时停止
+            if not result:
+                result.append((split_long_line(segment, budget)[0], *params))
+            break
+        result.append((segment, *params))
+        budget -= len(segment)
+    return result
+
+def preview_speech(items, session=None, on_segment=None, cancel_token=None):
+    """合成预览片段，直接拼接PCM返回WAV数据（不经过ffmpeg），失败或取消时返回None
+
+    on_segment(index, total, audio_data)在每个片段按顺序就绪时调用，可用于立即播放
+    """
+    if session is None:
+        session = get_default_session()
+    if not items or session.get_pool() is None:
+        return None
+    futures = [session.submit(session.fetch_segment, segment, voice_type, speed, volume)
+               for segment, voice_type, speed, volume in items]
+    first_format = None
+    pcm_parts = []
+    try:
+        for i, future in enumerate(futures):
+            while cancel_token is not None and not future.done():
+                if cancel_token.wait(CANCEL_POLL_INTERVAL):
+                    break
+            if cancel_token is not None:
+                cancel_token.check()
+            audio_data = future.result()
+            fmt, pcm = extract_pcm(audio_data)
+            if first_format is None:
+                first_format = fmt
+            elif format_key(fmt) != format_key(first_format):
+                raise AudioFormatError("音频格式与前面的片段不一致")
+            pcm_parts.append(pcm)
+            if on_segment:
+                on_segment(i, len(items), audio_data)
+    except SynthesisCancelled:
+        print("预览已取消")
+        return None
+    except Exception as e:
+        print(f"预览合成失败: {e}")
+        return None
+    finally:
+        for future in futures:
+            future.cancel()
+    data_size = sum(len(pcm) for pcm in pcm_parts)
+    header = build_wav_header(first_format["channels"], first_format["sample_rate"],
+                              first_format["bits_per_sample"], data_size)
+    return header + b"".join(pcm_parts)
+
+def play_audio(path):
+    """用ffmpeg目录下的ffplay播放音频，找不到ffplay时返回False"""
+    ffplay_path = os.path.join(os.path.dirname(ffmpeg_path), "ffplay" + os.path.splitext(ffmpeg_path)[1])
+    if not os.path.exists(ffplay_path):
+        return False
+    creation_flags = 0x08000000 if sys.platform == "win32" else 0  # CREATE_NO_WINDOW标志
+    subprocess.run([ffplay_path, "-nodisp", "-autoexit", "-loglevel", "quiet", path],
+                   creationflags=creation_flags)
+    return True
+
+# 子命令 -> 实现模块（各模块提供main(argv)）
+SUBCOMMANDS = {
+    "serve": "tts_server",
+    "worker": "tts_worker",
+    "calibrate": "segment_tuner",
+    "watch": "tts_watcher",
+}
+
+def add_session_arguments(parser):
+    """添加合成会话相关的命令行参数（CLI和各子命令共用）"""
+    parser.add_argument('--region', default=DEFAULT_REGION, help=f'请求的地域（默认{DEFAULT_REGION}）')
+    parser.add_argument('--endpoint', default=DEFAULT_ENDPOINT, help=f'接入域名（默认{DEFAULT_ENDPOINT}）')
+    parser.add_argument('--auto-region', action='store_true',
+                        help='探测候选地域的延迟，自动选择最快的健康地域并在故障时切换')
+    parser.add_argument('--regions', default=",".join(DEFAULT_REGIONS),
+                        help='--auto-region的候选地域，逗号分隔')
+    parser.add_argument('--connect-timeout', type=float, default=DEFAULT_CONNECT_TIMEOUT,
+                        help=f'单次请求的连接超时（秒，默认{DEFAULT_CONNECT_TIMEOUT}）')
+    parser.add_argument('--read-timeout', type=float, default=DEFAULT_READ_TIMEOUT,
+                        help=f'单次请求的读取超时（秒，默认{DEFAULT_READ_TIMEOUT}）')
+    parser.add_argument('--mp3-transport', action='store_true',
+                        help='输出为.mp3时直接请求MP3编码并拼接音频帧（传输量约为WAV的1/10，不再用ffmpeg重新编码）')
+    parser.add_argument('--hedge', action='store_true',
+                        help='片段请求超过近期p95延迟仍未返回时再发一个相同请求，采用先返回的结果')
+    parser.add_argument('--hedge-budget', type=float, default=DEFAULT_HEDGE_BUDGET,
+                        help=f'对冲请求占总请求数的比例上限（默认{DEFAULT_HEDGE_BUDGET}）')
+
+def create_session_from_args(args, **kwargs):
+    """根据命令行参数创建合成会话"""
+    region_selector = None
+    if args.auto_region:
+        regions = [region.strip() for region in args.regions.split(",") if region.strip()]
+        region_selector = RegionSelector(regions)
+    hedge_policy = HedgePolicy(args.hedge_budget) if args.hedge else None
+    return SynthesisSession(region=args.region, endpoint=args.endpoint,
+                            region_selector=region_selector, hedge_policy=hedge_policy,
+                            connect_timeout=args.connect_timeout, read_timeout=args.read_timeout,
+                            mp3_transport=args.mp3_transport, **kwargs)
+
+def run_cli(argv):
+    """单次合成命令行入口"""
     parser = argparse.ArgumentParser(description='文本转语音工具')
     parser.add_argument('-f', '--file', required=True, help='指定文本文件路径（必需）')
     parser.add_argument('-o', '--output', help='指定输出文件路径，包含完整路径和文件后缀（例如：path/to/output.mp3）')
     parser.add_argument('-v', '--voice', type=int, default=101012, help='指定音色ID')
-    args = parser.parse_args()
+    parser.add_argument('--dialogue', action='store_true',
+                        help='按多角色对话脚本合成（角色声明和台词格式见README），没有角色标签的行使用-v指定的音色')
+    parser.add_argument('--preview', action='store_true',
+                        help='只合成第一个片段用于试听，保存为"输出文件名_preview.wav"并播放，不合并完整音频')
+    parser.add_argument('--preview-seconds', type=float,
+                        help='预览时按时长（秒）截取开头的文本，代替只取第一个片段（隐含--preview）')
+    parser.add_argument('--profile', action='store_true',
+                        help='用cProfile剖析本次任务，在输出文件旁保存"输出文件名_profile.pstats"和各阶段耗时报告')
+    add_session_arguments(parser)
+    args = parser.parse_args(argv)
     
     text_file = args.file
     output_path = args.output
@@ -277,7 +1161,7 @@ if __name__ == "__main__":
     # 检查指定的文件是否存在
     if not os.path.exists(text_file):
         print(f"错误：指定的文件 {text_file} 不存在")
-        exit(1)
+        return 1
     
     # 设置输出文件路径和名称
     if output_path:
@@ -299,9 +1183,89 @@ if __name__ == "__main__":
             
         if not text_content:
             print(f"错误：文件 {text_file} 内容为空")
-            exit(1)
+            return 1
         
-        # 合成语音
-        text_to_speech(text_content, output_file, voice_type)
+        # 合成语音；第一次Ctrl+C取消合成并清理临时文件，第二次直接中断
+        session = create_session_from_args(args)
+        cancel_token = CancelToken()
+        def on_sigint(signum, frame):
+            print("正在取消合成，再次按Ctrl+C强制退出...")
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            cancel_token.cancel()
+        previous_handler = signal.signal(signal.SIGINT, on_sigint)
+        profiler = profiling.JobProfiler() if args.profile else None
+        if profiler is not None:
+            profiler.start()
+        try:
+            if args.preview or args.preview_seconds is not None:
+                return run_preview(args, text_content, output_file, session, cancel_token)
+            if args.dialogue:
+                import dialogue
+                success = dialogue.dialogue_to_speech(text_content, output_file, voice_type, session=session,
+                                                      cancel_token=cancel_token)
+            else:
+                success = text_to_speech(text_content, output_file, voice_type, session=session,
+                                         cancel_token=cancel_token)
+            if cancel_token.cancelled:
+                return 130
+            return 0 if success else 1
+        finally:
+            signal.signal(signal.SIGINT, previous_handler)
+            session.close()
+            if profiler is not None:
+                profiler.stop()
+                save_profile(profiler, output_file)
     except Exception as e:
-        print(f"处理文件时出错: {str(e)}")
\ No newline at end of file
+        print(f"处理文件时出错: {str(e)}")
+        return 1
+
+def save_profile(profiler, output_file):
+    """保存剖析结果并输出文件路径"""
+    try:
+        paths = profiler.save(profiling.profile_prefix(output_file))
+    except OSError as e:
+        print(f"保存剖析结果失败: {e}")
+        return
+    for path in paths:
+        print(f"剖析结果已保存为 {path}")
+
+def run_preview(args, text, output_file, session, cancel_token):
+    """--preview：合成开头的片段，保存为WAV并播放"""
+    if args.dialogue:
+        import dialogue
+        try:
+            items = dialogue.script_segments(text, args.voice)
+        except dialogue.DialogueScriptError as e:
+            print(f"对话脚本有误: {e}")
+            return 1
+    else:
+        items = [(segment, args.voice, 0, 5) for segment in split_text_for_voice(text, args.voice)]
+    items = preview_items(items, args.preview_seconds)
+    print(f"预览开头{sum(len(item[0]) for item in items)}字（共{len(items)}个片段）")
+    audio_data = preview_speech(items, session, cancel_token=cancel_token)
+    if cancel_token.cancelled:
+        return 130
+    if audio_data is None:
+        return 1
+    preview_file = f"{os.path.splitext(output_file)[0]}_preview.wav"
+    with open(preview_file, 'wb') as f:
+        f.write(audio_data)
+    print(f"预览音频已保存为 {preview_file}")
+    if not play_audio(preview_file):
+        print("未找到ffplay，请手动播放预览音频")
+    return 0
+
+def main(argv=None):
+    """命令行入口：`serve`等子命令交给对应模块，其余参数按单次合成处理"""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in SUBCOMMANDS:
+        import importlib
+        module = importlib.import_module(SUBCOMMANDS[argv[0]])
+        return module.main(argv[1:])
+    return run_cli(argv)
+
+# 主函数
+if __name__ == "__main__":
+    # 子命令等模块通过import audio_generator引用本模块，避免以脚本运行时再加载一份
+    sys.modules.setdefault("audio_generator", sys.modules[__name__])
+    sys.exit(main())
\ No newline at end of file
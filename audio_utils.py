@@ -0,0 +1,274 @@
+# 音频数据处理工具（WAV头解析与构造、MP3帧解析与拼接），不依赖ffmpeg
+import struct
+
+# 合理的语音时长范围（1.0倍语速下的每字秒数），用于发现被截断或异常的片段；
+# 下限留出英文字母、数字等读得比汉字快的余量，上限留出数字、英文等一字多音节的余量，实际范围按语速缩放
+MIN_SECONDS_PER_CHAR = 0.04
+MAX_SECONDS_PER_CHAR = 1.0
+# 语速参数 -> 播放速度倍数（腾讯云文档给出的对应关系，中间值按线性插值）
+SPEED_FACTORS = ((-2, 0.6), (-1, 0.8), (0, 1.0), (1, 1.2), (2, 1.5), (6, 2.5))
+# 时长上限额外允许的秒数（句首句尾静音）
+DURATION_SLACK_SECONDS = 3.0
+
+
+class AudioFormatError(ValueError):
+    """音频数据格式不合法"""
+
+
+def parse_wav_header(data):
+    """解析WAV数据的RIFF头，返回格式信息和PCM数据位置"""
+    if len(data) < 12 or data[0:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise AudioFormatError("不是有效的RIFF/WAVE数据")
+
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        chunk_size = struct.unpack("<I", data[pos + 4:pos + 8])[0]
+        body = pos + 8
+        if chunk_id == b"fmt ":
+            if chunk_size < 16 or body + 16 > len(data):
+                raise AudioFormatError("fmt块长度不正确")
+            audio_format, channels, sample_rate, byte_rate, block_align, bits = struct.unpack(
+                "<HHIIHH", data[body:body + 16])
+            fmt = {
+                "audio_format": audio_format,
+                "channels": channels,
+                "sample_rate": sample_rate,
+                "byte_rate": byte_rate,
+                "block_align": block_align,
+                "bits_per_sample": bits,
+            }
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise AudioFormatError("data块出现在fmt块之前")
+            # 流式WAV的data长度可能是占位值，以实际数据长度为准
+            available = len(data) - body
+            fmt["data_offset"] = body
+            fmt["data_size"] = min(chunk_size, available)
+            fmt["declared_data_size"] = chunk_size
+            return fmt
+        # RIFF块按偶数字节对齐
+        pos = body + chunk_size + (chunk_size & 1)
+
+    raise AudioFormatError("未找到data块")
+
+
+def build_wav_header(channels, sample_rate, bits_per_sample, data_size):
+    """构造44字节的PCM WAV头"""
+    block_align = channels * bits_per_sample // 8
+    byte_rate = sample_rate * block_align
+    # 超出32位范围时（流式输出未知长度）使用最大值占位
+    riff_size = min(36 + data_size, 0xFFFFFFFF)
+    data_size = min(data_size, 0xFFFFFFFF)
+    return (b"RIFF" + struct.pack("<I", riff_size) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate,
+                                    byte_rate, block_align, bits_per_sample)
+            + b"data" + struct.pack("<I", data_size))
+
+
+def extract_pcm(data):
+    """从WAV数据中取出PCM部分，返回(格式信息, PCM字节)"""
+    fmt = parse_wav_header(data)
+    start = fmt["data_offset"]
+    return fmt, data[start:start + fmt["data_size"]]
+
+
+def format_key(fmt):
+    """用于比较片段格式是否一致的元组：(编码, 声道数, 采样率, 位深)"""
+    return (fmt["audio_format"], fmt["channels"], fmt["sample_rate"], fmt["bits_per_sample"])
+
+
+def wav_duration(fmt):
+    """根据WAV头计算PCM数据的时长（秒）"""
+    return fmt["data_size"] / fmt["byte_rate"]
+
+
+def validate_wav_segment(data, char_count=None, speed=0):
+    """检查合成片段的WAV数据是否完整、自洽，返回格式信息（含duration）
+
+    char_count为片段字数时同时检查时长是否与字数、语速参数speed相符；不合法时抛出AudioFormatError
+    """
+    fmt = parse_wav_header(data)
+    riff_size = struct.unpack("<I", data[4:8])[0]
+    if riff_size + 8 > len(data):
+        raise AudioFormatError(f"数据不完整：RIFF头声明{riff_size + 8}字节，实际{len(data)}字节")
+    if fmt["declared_data_size"] > fmt["data_size"]:
+        raise AudioFormatError(f"数据不完整：data块声明{fmt['declared_data_size']}字节，"
+                               f"实际{fmt['data_size']}字节")
+    if not fmt["channels"] or not fmt["sample_rate"] or not fmt["bits_per_sample"]:
+        raise AudioFormatError("声道数、采样率或位深为0")
+    block_align = fmt["channels"] * fmt["bits_per_sample"] // 8
+    if fmt["block_align"] != block_align or fmt["byte_rate"] != fmt["sample_rate"] * block_align:
+        raise AudioFormatError("fmt块的block_align或byte_rate与声道数、采样率、位深不一致")
+    if fmt["data_size"] == 0:
+        raise AudioFormatError("音频数据为空")
+    if fmt["data_size"] % block_align:
+        raise AudioFormatError("音频数据长度不是采样帧的整数倍")
+
+    fmt["duration"] = wav_duration(fmt)
+    check_duration(fmt["duration"], char_count, speed)
+    return fmt
+
+
+# MP3（MPEG Layer III）帧解析与拼接
+# 版本位 -> (版本名, 每帧采样数, 采样率表, 比特率表kbps)
+MP3_VERSIONS = {
+    3: ("MPEG1", 1152, (44100, 48000, 32000),
+        (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)),
+    2: ("MPEG2", 576, (22050, 24000, 16000),
+        (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)),
+    0: ("MPEG2.5", 576, (11025, 12000, 8000),
+        (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)),
+}
+
+
+def parse_mp3_frame_header(header):
+    """解析4字节的MP3帧头，不是合法的Layer III帧头时返回None"""
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    version_bits = (header[1] >> 3) & 0x03
+    layer_bits = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    if version_bits not in MP3_VERSIONS or layer_bits != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    version, samples, sample_rates, bitrates = MP3_VERSIONS[version_bits]
+    sample_rate = sample_rates[sample_rate_index]
+    bitrate = bitrates[bitrate_index] * 1000
+    padding = (header[2] >> 1) & 0x01
+    channels = 1 if header[3] >> 6 == 3 else 2
+    return {
+        "version": version,
+        "samples_per_frame": samples,
+        "sample_rate": sample_rate,
+        "bitrate": bitrate,
+        "channels": channels,
+        "crc": not header[1] & 0x01,
+        "frame_size": samples // 8 * bitrate // sample_rate + padding,
+    }
+
+
+def mp3_side_info_size(frame):
+    """帧头之后的side information长度，Xing/Info标签位于其后"""
+    if frame["version"] == "MPEG1":
+        return 17 if frame["channels"] == 1 else 32
+    return 9 if frame["channels"] == 1 else 17
+
+
+def skip_id3v2(data):
+    """跳过开头的ID3v2标签，返回音频帧的起始位置"""
+    if len(data) >= 10 and data[0:3] == b"ID3":
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        return 10 + size + footer
+    return 0
+
+
+def parse_mp3(data):
+    """解析MP3数据，去掉ID3标签和Xing/Info/VBRI帧，返回格式信息和音频帧
+
+    返回的"frames"为音频帧数据（bytes），"frame_count"为帧数，"duration"为时长（秒）
+    """
+    pos = skip_id3v2(data)
+    end = len(data)
+    if end - pos >= 128 and data[end - 128:end - 125] == b"TAG":
+        end -= 128
+    first = None
+    first_header = None
+    frames = []
+    frame_count = 0
+    bitrates = set()
+    while pos < end:
+        frame = parse_mp3_frame_header(data[pos:pos + 4])
+        if frame is None:
+            raise AudioFormatError(f"第{frame_count + 1}帧位置的数据不是有效的MP3帧")
+        if pos + frame["frame_size"] > end:
+            raise AudioFormatError("数据不完整：最后一帧被截断")
+        body = data[pos:pos + frame["frame_size"]]
+        tag_pos = 4 + (2 if frame["crc"] else 0) + mp3_side_info_size(frame)
+        is_info_frame = (first is None and
+                         (body[tag_pos:tag_pos + 4] in (b"Xing", b"Info") or body[36:40] == b"VBRI"))
+        if first is None:
+            first, first_header = frame, bytes(data[pos:pos + 4])
+        elif (frame["version"], frame["sample_rate"], frame["channels"]) != \
+                (first["version"], first["sample_rate"], first["channels"]):
+            raise AudioFormatError("MP3帧的采样率或声道数不一致")
+        if not is_info_frame:
+            frames.append(body)
+            frame_count += 1
+            bitrates.add(frame["bitrate"])
+        pos += frame["frame_size"]
+    if frame_count == 0:
+        raise AudioFormatError("MP3数据中没有音频帧")
+    return {
+        "version": first["version"],
+        "sample_rate": first["sample_rate"],
+        "channels": first["channels"],
+        "samples_per_frame": first["samples_per_frame"],
+        "header": first_header,
+        "bitrates": bitrates,
+        "frame_count": frame_count,
+        "frames": b"".join(frames),
+        "duration": frame_count * first["samples_per_frame"] / first["sample_rate"],
+    }
+
+
+def mp3_format_key(info):
+    """用于比较MP3片段能否直接拼接的元组：(版本, 采样率, 声道数)"""
+    return (info["version"], info["sample_rate"], info["channels"])
+
+
+def build_mp3_info_frame(header, frame_count, stream_size, vbr):
+    """按首帧的帧头构造Xing（可变码率）或Info（固定码率）帧，记录帧数和字节数供播放器计算时长"""
+    header = bytearray(header)
+    header[1] |= 0x01          # 不带CRC
+    header[2] &= 0xFD          # 不填充
+    frame = parse_mp3_frame_header(header)
+    tag_pos = 4 + mp3_side_info_size(frame)
+    if tag_pos + 16 > frame["frame_size"]:
+        return b""
+    body = bytearray(frame["frame_size"])
+    body[0:4] = header
+    body[tag_pos:tag_pos + 4] = b"Xing" if vbr else b"Info"
+    # 标志位：0x1帧数有效，0x2字节数有效
+    struct.pack_into(">III", body, tag_pos + 4, 0x03, frame_count, stream_size + len(body))
+    return bytes(body)
+
+
+def concat_mp3(infos):
+    """拼接parse_mp3解析出的各片段音频帧（不重新编码），开头写入新的Xing/Info帧"""
+    frame_count = sum(info["frame_count"] for info in infos)
+    audio = b"".join(info["frames"] for info in infos)
+    vbr = len(set().union(*(info["bitrates"] for info in infos))) > 1
+    return build_mp3_info_frame(infos[0]["header"], frame_count, len(audio), vbr) + audio
+
+
+def validate_mp3_segment(data, char_count=None, speed=0):
+    """检查合成片段的MP3数据是否完整，返回parse_mp3的结果；不合法时抛出AudioFormatError"""
+    info = parse_mp3(data)
+    check_duration(info["duration"], char_count, speed)
+    return info
+
+
+def speed_factor(speed):
+    """语速参数对应的播放速度倍数，超出范围时取两端的值"""
+    speed = float(speed)
+    if speed <= SPEED_FACTORS[0][0]:
+        return SPEED_FACTORS[0][1]
+    for (low_speed, low_factor), (high_speed, high_factor) in zip(SPEED_FACTORS, SPEED_FACTORS[1:]):
+        if speed <= high_speed:
+            return low_factor + (high_factor - low_factor) * (speed - low_speed) / (high_speed - low_speed)
+    return SPEED_FACTORS[-1][1]
+
+
+def check_duration(duration, char_count, speed=0):
+    """检查时长是否与字数、语速相符"""
+    if not char_count:
+        return
+    factor = speed_factor(speed)
+    low = char_count * MIN_SECONDS_PER_CHAR / factor
+    high = char_count * MAX_SECONDS_PER_CHAR / factor + DURATION_SLACK_SECONDS
+    if not low <= duration <= high:
+        raise AudioFormatError(f"时长{duration:.2f}秒与字数{char_count}不符")
+
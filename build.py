@@ -12,6 +12,8 @@ import shutil
 import subprocess
 import argparse
 
+from sample_pack import build_pack, PACK_NAME
+
 def run_command(command):
     """执行系统命令并打印输出"""
     print(f"执行: {command}")
@@ -68,10 +70,10 @@ def create_spec_file():
     if "excludes" in modified_analysis:
         modified_analysis = modified_analysis.replace(
             "excludes=[]", 
-            "excludes=['matplotlib', 'pandas', 'scipy', 'numpy', 'PIL', 'tkinter', 'PySide2', 'IPython', 'notebook', 'jedi']"
+            "excludes=['matplotlib', 'pandas', 'scipy', 'PIL', 'tkinter', 'PySide2', 'IPython', 'notebook', 'jedi']"
         )
     else:
-        modified_analysis += ",\n    excludes=['matplotlib', 'pandas', 'scipy', 'numpy', 'PIL', 'tkinter', 'PySide2', 'IPython', 'notebook', 'jedi']"
+        modified_analysis += ",\n    excludes=['matplotlib', 'pandas', 'scipy', 'PIL', 'tkinter', 'PySide2', 'IPython', 'notebook', 'jedi']"
     
     # 替换修改后的Analysis部分
     content = content[:analysis_start] + modified_analysis + content[analysis_end:]
@@ -166,7 +168,19 @@ def build_exe(use_upx=False, one_file=True):
             
             # 新增：复制资源目录到exe所在目录
             target_dir = os.path.dirname(os.path.abspath(exe_path))
-            for folder in ['AudioResources', 'config']:
+            folders = ['AudioResources', 'config']
+            
+            # 将示例音频打包为单个文件，代替复制整个AudioResources目录
+            if os.path.exists('AudioResources'):
+                try:
+                    count = build_pack('AudioResources', PACK_NAME)
+                    shutil.copy2(PACK_NAME, target_dir)
+                    folders.remove('AudioResources')
+                    print(f"已打包 {count} 个示例音频并复制 {PACK_NAME} 到 {target_dir}")
+                except OSError as e:
+                    print(f"警告：打包示例音频失败，改为复制目录: {e}")
+            
+            for folder in folders:
                 if os.path.exists(folder):
                     dest = os.path.join(target_dir, folder)
                     shutil.copytree(folder, dest, dirs_exist_ok=True)
@@ -0,0 +1,163 @@
+# 多凭证池：在多个SecretId/SecretKey之间分配请求，按凭证限速，并暂时剔除被限流或额度耗尽的凭证
+import threading
+import time
+
+# 每个凭证默认的QPS上限（腾讯云TTS基础语音合成默认20次/秒）
+DEFAULT_KEY_QPS = 20
+# 被限流的凭证暂停使用的时间（秒）
+THROTTLE_EJECT_SECONDS = 5
+# 额度耗尽、欠费或鉴权失败的凭证暂停使用的时间（秒）
+QUOTA_EJECT_SECONDS = 300
+# 所有凭证都不可用时最多等待的时间（秒）
+DEFAULT_ACQUIRE_TIMEOUT = 60
+
+# 错误码前缀 -> 剔除时长
+THROTTLE_ERROR_CODES = ("RequestLimitExceeded", "LimitExceeded")
+QUOTA_ERROR_CODES = (
+    "UnsupportedOperation.PkgExhausted",
+    "UnsupportedOperation.AccountArrears",
+    "UnsupportedOperation.ServerNotOpen",
+    "UnsupportedOperation.ServerDestroy",
+    "ResourceInsufficient",
+    "AuthFailure",
+)
+
+STRATEGIES = ("round_robin", "least_loaded")
+
+
+def classify_error(error):
+    """根据SDK异常的错误码判断类型：throttle / quota / None"""
+    code = getattr(error, "code", None) or ""
+    if code.startswith(THROTTLE_ERROR_CODES):
+        return "throttle"
+    if code.startswith(QUOTA_ERROR_CODES):
+        return "quota"
+    return None
+
+
+class CredentialSlot:
+    """池中的一个凭证：令牌桶限速、在途请求数和剔除状态"""
+
+    def __init__(self, secret_id, secret_key, qps=DEFAULT_KEY_QPS):
+        self.secret_id = secret_id
+        self.secret_key = secret_key
+        self.qps = qps
+        self.tokens = float(qps)
+        self.last_refill = time.monotonic()
+        self.in_flight = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+        # (地域, 接入域名) -> TTS客户端
+        self.clients = {}
+
+    @property
+    def label(self):
+        """日志中使用的凭证标识，不暴露完整SecretId"""
+        return f"{self.secret_id[:6]}***"
+
+    def refill(self, now):
+        self.tokens = min(float(self.qps), self.tokens + (now - self.last_refill) * self.qps)
+        self.last_refill = now
+
+    def ready_in(self, now):
+        """距离该凭证可以发出下一个请求的秒数"""
+        if self.ejected_until > now:
+            return self.ejected_until - now
+        self.refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.qps
+
+
+class CredentialPool:
+    """凭证池，按轮询或最少在途请求选择凭证
+
+    client_factory(secret_id, secret_key, region, endpoint)用于按需创建客户端
+    """
+
+    def __init__(self, credentials, client_factory, strategy="round_robin",
+                 acquire_timeout=DEFAULT_ACQUIRE_TIMEOUT):
+        if not credentials:
+            raise ValueError("凭证池不能为空")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"不支持的凭证分配策略: {strategy}")
+        self.slots = [CredentialSlot(*cred) for cred in credentials]
+        self.client_factory = client_factory
+        self.strategy = strategy
+        self.acquire_timeout = acquire_timeout
+        self._cursor = 0
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self.slots)
+
+    def _pick(self, now):
+        """选择一个立即可用的凭证，没有则返回None"""
+        ready = [slot for slot in self.slots if slot.ready_in(now) == 0]
+        if not ready:
+            return None
+        if self.strategy == "least_loaded":
+            return min(ready, key=lambda slot: (slot.in_flight, slot.requests))
+        # 轮询：从游标位置开始找第一个可用的凭证
+        for offset in range(len(self.slots)):
+            slot = self.slots[(self._cursor + offset) % len(self.slots)]
+            if slot in ready:
+                self._cursor = (self._cursor + offset + 1) % len(self.slots)
+                return slot
+        return None
+
+    def acquire(self):
+        """取得一个可用凭证（阻塞等待限速或剔除结束），返回CredentialSlot"""
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                slot = self._pick(now)
+                if slot is not None:
+                    slot.tokens -= 1
+                    slot.in_flight += 1
+                    slot.requests += 1
+                    return slot
+                wait = min(s.ready_in(now) for s in self.slots)
+                if now + wait > deadline:
+                    raise RuntimeError("所有凭证暂时不可用（限流或额度耗尽）")
+                self._cond.wait(wait)
+
+    def get_client(self, slot, region, endpoint):
+        """获取凭证在指定地域的客户端（每个凭证、每个地域只创建一次）"""
+        with self._cond:
+            client = slot.clients.get((region, endpoint))
+            if client is None:
+                client = self.client_factory(slot.secret_id, slot.secret_key, region, endpoint)
+                slot.clients[(region, endpoint)] = client
+            return client
+
+    def release(self, slot, error=None):
+        """归还凭证；如果请求因限流或额度问题失败，暂时剔除该凭证"""
+        with self._cond:
+            slot.in_flight -= 1
+            kind = classify_error(error) if error is not None else None
+            if error is not None:
+                slot.failures += 1
+            if kind is not None:
+                seconds = THROTTLE_EJECT_SECONDS if kind == "throttle" else QUOTA_EJECT_SECONDS
+                slot.ejected_until = time.monotonic() + seconds
+                slot.ejections += 1
+                print(f"凭证 {slot.label} 因{'限流' if kind == 'throttle' else '额度或鉴权'}错误暂停使用{seconds}秒")
+            self._cond.notify_all()
+            return kind
+
+    def stats(self):
+        """各凭证的使用统计"""
+        now = time.monotonic()
+        with self._cond:
+            return [{
+                "key": slot.label,
+                "requests": slot.requests,
+                "failures": slot.failures,
+                "ejections": slot.ejections,
+                "in_flight": slot.in_flight,
+                "ejected": slot.ejected_until > now,
+            } for slot in self.slots]
@@ -0,0 +1,126 @@
+# 多角色对话脚本：每行带角色标签，不同角色使用不同的音色、语速和音量，所有台词并发合成后按脚本顺序合并
+#
+# 脚本格式：
+#   @旁白 101011                  声明角色：@角色名 音色ID或音色名称 [speed=语速] [volume=音量]
+#   @小明 智宇 speed=0.5 volume=6
+#   旁白：很久以前，山里住着一户人家。
+#   小明：我们出发吧！
+#   没有角色标签的行沿用上一行的角色；未声明的标签视为普通文本；以#开头的行是注释
+import csv
+import re
+from itertools import groupby
+
+import audio_generator
+
+# 台词行：角色名 + 中文或英文冒号 + 台词
+LINE_PATTERN = re.compile(r"^([^\s：:]{1,20})\s*[：:]\s*(.*)$")
+
+
+class DialogueScriptError(ValueError):
+    """对话脚本格式不正确"""
+
+
+def find_voice_id(voice):
+    """把音色ID或音色名称解析为音色ID，找不到时返回None"""
+    voice = voice.strip()
+    if voice.isdigit():
+        return int(voice)
+    csv_path = audio_generator.get_config_path('tencent_cloud_voice_type.csv')
+    try:
+        with open(csv_path, 'r', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                if len(row) >= 2 and row[1].strip() == voice:
+                    return int(row[0])
+    except (OSError, ValueError) as e:
+        print(f"读取音色文件失败: {e}")
+    return None
+
+
+def parse_speaker(line, line_no):
+    """解析角色声明行，返回(角色名, {"voice", "speed", "volume"})"""
+    parts = line[1:].split()
+    if len(parts) < 2:
+        raise DialogueScriptError(f"第{line_no}行：角色声明格式应为 @角色名 音色 [speed=语速] [volume=音量]")
+    name, voice = parts[0], parts[1]
+    voice_id = find_voice_id(voice)
+    if voice_id is None:
+        raise DialogueScriptError(f"第{line_no}行：未找到音色 {voice}")
+    speaker = {"voice": voice_id}
+    for option in parts[2:]:
+        key, _, value = option.partition("=")
+        if key not in ("speed", "volume"):
+            raise DialogueScriptError(f"第{line_no}行：不支持的参数 {key}")
+        try:
+            speaker[key] = float(value) if key == "speed" else int(value)
+        except ValueError:
+            raise DialogueScriptError(f"第{line_no}行：参数 {option} 的值不正确")
+    return name, speaker
+
+
+def parse_script(text, default_voice=None, default_speed=0, default_volume=5):
+    """解析对话脚本，返回[(角色名, 台词, 音色ID, 语速, 音量), ...]
+
+    未指定语速、音量的角色使用默认值；第一个角色标签之前的行使用default_voice（角色名为None）
+    """
+    speakers = {}
+    lines = []
+    current = None
+    for line_no, raw in enumerate(text.splitlines(), 1):
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("@"):
+            name, speaker = parse_speaker(line, line_no)
+            speakers[name] = speaker
+            continue
+        match = LINE_PATTERN.match(line)
+        if match and match.group(1) in speakers:
+            current, line = match.group(1), match.group(2).strip()
+            if not line:
+                continue
+        if current is None:
+            if default_voice is None:
+                raise DialogueScriptError(f"第{line_no}行：没有角色标签，且未指定默认音色")
+            lines.append((None, line, int(default_voice), default_speed, default_volume))
+            continue
+        speaker = speakers[current]
+        lines.append((current, line, speaker["voice"], speaker.get("speed", default_speed),
+                      speaker.get("volume", default_volume)))
+    if not lines:
+        raise DialogueScriptError("脚本中没有台词")
+    return lines
+
+
+def lines_to_segments(lines):
+    """把台词切分为synthesize_segments使用的[(片段, 音色ID, 语速, 音量), ...]
+
+    连续使用相同音色和参数的台词合在一起切分，减少请求数
+    """
+    items = []
+    for (voice, speed, volume), group in groupby(lines, key=lambda line: line[2:]):
+        text = "\n".join(line[1] for line in group)
+        items.extend((segment, voice, speed, volume)
+                     for segment in audio_generator.split_text_for_voice(text, voice))
+    return items
+
+
+def script_segments(text, default_voice=None, default_speed=0, default_volume=5):
+    """解析对话脚本并切分为片段"""
+    return lines_to_segments(parse_script(text, default_voice, default_speed, default_volume))
+
+
+def dialogue_to_speech(text, output_file, default_voice=None, default_speed=0, default_volume=5,
+                       session=None, on_segment=None, cancel_token=None, metrics=None):
+    """合成对话脚本并保存为output_file，参数与text_to_speech相同"""
+    try:
+        lines = parse_script(text, default_voice, default_speed, default_volume)
+    except DialogueScriptError as e:
+        print(f"对话脚本有误: {e}")
+        return False
+    speakers = {speaker for speaker, *_ in lines if speaker is not None}
+    items = lines_to_segments(lines)
+    print(f"对话脚本共{len(lines)}句台词、{len(speakers)}个角色，分割为{len(items)}个片段")
+    return audio_generator.synthesize_segments(items, output_file, session, on_segment,
+                                               cancel_token=cancel_token, metrics=metrics)
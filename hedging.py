@@ -0,0 +1,86 @@
+# 对冲请求：片段请求超过近期p95延迟仍未返回时，再发送一个相同的请求，采用先返回的结果
+import math
+import threading
+from collections import deque
+
+# 触发对冲的延迟分位数
+HEDGE_PERCENTILE = 0.95
+# 延迟统计窗口（最近N次成功请求）
+LATENCY_WINDOW = 200
+# 开始对冲前至少需要的延迟样本数
+MIN_SAMPLES = 20
+# 对冲请求数占总请求数的比例上限
+DEFAULT_HEDGE_BUDGET = 0.05
+# 请求数较少时额外允许的对冲次数
+HEDGE_BURST = 2
+
+
+class HedgeStats:
+    """单个任务的对冲统计"""
+
+    def __init__(self):
+        self.hedges = 0  # 发出的对冲请求数
+        self.wins = 0    # 对冲请求先于原请求返回的次数
+        self._lock = threading.Lock()
+
+    def add(self, won):
+        with self._lock:
+            self.hedges += 1
+            self.wins += int(won)
+
+
+class HedgePolicy:
+    """记录片段请求延迟，给出对冲阈值，并按预算限制对冲请求数"""
+
+    def __init__(self, budget=DEFAULT_HEDGE_BUDGET, percentile=HEDGE_PERCENTILE,
+                 window=LATENCY_WINDOW, min_samples=MIN_SAMPLES):
+        if not 0 <= budget <= 1:
+            raise ValueError(f"对冲预算应在0到1之间: {budget}")
+        self.budget = budget
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.requests = 0
+        self.hedges = 0
+        self.wins = 0
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        """记录一次成功请求的延迟（秒）"""
+        with self._lock:
+            self._latencies.append(latency)
+
+    def threshold(self):
+        """当前的对冲阈值（秒），样本不足时返回None（不对冲）"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(self.percentile * len(ordered)) - 1)]
+
+    def note_request(self):
+        """记录一次原始请求，用于计算对冲预算"""
+        with self._lock:
+            self.requests += 1
+
+    def try_hedge(self):
+        """预算允许时占用一次对冲名额，返回是否可以发出对冲请求"""
+        with self._lock:
+            if self.hedges >= HEDGE_BURST + self.requests * self.budget:
+                return False
+            self.hedges += 1
+            return True
+
+    def note_win(self):
+        with self._lock:
+            self.wins += 1
+
+    def stats(self):
+        threshold = self.threshold()
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "wins": self.wins,
+                "threshold_ms": None if threshold is None else round(threshold * 1000, 1),
+            }
@@ -0,0 +1,146 @@
+# HLS输出：把合成好的片段依次送入同一个ffmpeg进程编码为MPEG-TS（AAC）分片，并实时更新.m3u8播放列表
+#
+# 整个任务只启动一个ffmpeg：各片段的PCM依次写入其标准输入，由segment muxer按HLS_TARGET_DURATION秒切分。
+# 只有一次AAC编码器预热（priming），分片之间没有额外的静音和爆音，时间戳也由同一个编码器连续生成。
+# ffmpeg每写完一个分片就在CSV列表中追加一行（文件名、起止时间），据此更新播放列表。
+# 播放列表为EVENT类型，客户端可以在合成结束前开始播放，结束时追加EXT-X-ENDLIST
+import csv
+import os
+import subprocess
+import sys
+import tempfile
+
+import profiling
+from audio_utils import extract_pcm, format_key
+
+# 分片最长时长（秒），也是播放列表的EXT-X-TARGETDURATION
+HLS_TARGET_DURATION = 10
+# AAC码率
+HLS_AUDIO_BITRATE = "64k"
+# 位深 -> ffmpeg的原始PCM格式
+PCM_FORMATS = {8: "u8", 16: "s16le", 24: "s24le", 32: "s32le"}
+
+
+class HlsWriter:
+    """把WAV片段依次送入ffmpeg编码为HLS分片，并维护播放列表"""
+
+    def __init__(self, playlist_path, ffmpeg_path, target_duration=HLS_TARGET_DURATION,
+                 bitrate=HLS_AUDIO_BITRATE):
+        self.playlist_path = playlist_path
+        self.directory = os.path.dirname(os.path.abspath(playlist_path))
+        self.stem = os.path.splitext(os.path.basename(playlist_path))[0]
+        self.ffmpeg_path = ffmpeg_path
+        self.target_duration = target_duration
+        self.bitrate = bitrate
+        self.entries = []  # [(时长, 分片文件名), ...]，ffmpeg写完的分片
+        self.offset = 0.0  # 已送入编码器的累计时长（秒）
+        self.ended = False
+        self.list_path = os.path.join(self.directory, f"{self.stem}_segments.csv")
+        self._process = None
+        self._format = None
+        self._stderr = None
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _start(self, fmt):
+        """按首个片段的格式启动ffmpeg，从标准输入读取原始PCM"""
+        if fmt["bits_per_sample"] not in PCM_FORMATS:
+            raise RuntimeError(f"不支持的位深: {fmt['bits_per_sample']}")
+        cmd = [
+            self.ffmpeg_path, "-y", "-hide_banner", "-loglevel", "error",
+            "-f", PCM_FORMATS[fmt["bits_per_sample"]], "-ar", str(fmt["sample_rate"]),
+            "-ac", str(fmt["channels"]), "-i", "pipe:0",
+            "-c:a", "aac", "-b:a", self.bitrate,
+            "-f", "segment", "-segment_format", "mpegts", "-segment_time", str(self.target_duration),
+            "-segment_list", self.list_path, "-segment_list_type", "csv",
+            os.path.join(self.directory, f"{self.stem}_%05d.ts"),
+        ]
+        creation_flags = 0x08000000 if sys.platform == "win32" else 0  # CREATE_NO_WINDOW标志
+        # 错误输出写入临时文件，避免管道写满后ffmpeg阻塞
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                         stderr=self._stderr, creationflags=creation_flags)
+        self._format = format_key(fmt)
+
+    @property
+    def started(self):
+        """编码器正在运行（已送入数据且尚未结束）"""
+        return self._process is not None
+
+    def _error_output(self):
+        self._stderr.seek(0)
+        return self._stderr.read().decode(errors="replace")[-500:]
+
+    def add_segment(self, wav_data):
+        """把一个合成片段的PCM送入编码器，并按已写完的分片更新播放列表"""
+        fmt, pcm = extract_pcm(wav_data)
+        if self._process is None:
+            self._start(fmt)
+        elif format_key(fmt) != self._format:
+            raise RuntimeError("片段的音频格式与前面的片段不一致")
+        if not pcm:
+            return
+        try:
+            with profiling.stage("ffmpeg"):
+                self._process.stdin.write(pcm)
+                self._process.stdin.flush()
+        except OSError:
+            self._process.wait()
+            raise RuntimeError(f"编码HLS分片失败: {self._error_output()}")
+        self.offset += len(pcm) / fmt["byte_rate"]
+        self.refresh()
+
+    def refresh(self):
+        """读取ffmpeg已写完的分片列表，有新分片时更新播放列表"""
+        try:
+            with open(self.list_path, "r", encoding="utf-8", newline="") as f:
+                text = f.read()
+        except FileNotFoundError:
+            return
+        # 只使用完整的行，最后一行可能正在写入
+        entries = []
+        for row in csv.reader(text[:text.rfind("\n") + 1].splitlines()):
+            if len(row) == 3:
+                entries.append((float(row[2]) - float(row[1]), row[0]))
+        if len(entries) > len(self.entries):
+            self.entries = entries
+            self.write_playlist()
+
+    def write_playlist(self, ended=False):
+        """原子地重写播放列表，ended为True时追加EXT-X-ENDLIST"""
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{self.target_duration}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+        ]
+        for duration, filename in self.entries:
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(filename)
+        if ended:
+            lines.append("#EXT-X-ENDLIST")
+        temp_path = f"{self.playlist_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, self.playlist_path)
+
+    def finish(self):
+        """结束编码并结束播放列表（失败或取消时也调用，让客户端不再等待新分片）"""
+        returncode = 0
+        if self._process is not None:
+            try:
+                self._process.stdin.close()
+            except OSError:
+                pass
+            with profiling.stage("ffmpeg"):
+                returncode = self._process.wait()
+            self.refresh()
+            error_output = self._error_output()
+            self._stderr.close()
+            self._process = None
+            if os.path.exists(self.list_path):
+                os.remove(self.list_path)
+        self.write_playlist(ended=True)
+        self.ended = True
+        if returncode:
+            raise RuntimeError(f"编码HLS分片失败: {error_output}")
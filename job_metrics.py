@@ -0,0 +1,156 @@
+# 合成任务的实时指标：片段进度、在途请求、吞吐、请求延迟、重试、排队等待、合并耗时和缓存命中率
+# 由synthesize_segments和SynthesisSession在合成过程中更新，可在任意线程读取快照（例如GUI定时刷新）
+#
+# 设置了历史预估（throughput_model）时，快照中的eta为预计剩余时间：开始时按历史预估，
+# 随着进度推进逐渐改用本次任务实际的吞吐
+import threading
+import time
+from collections import deque
+
+# 快照中保留的最近请求延迟数（用于绘制延迟曲线）
+LATENCY_HISTORY = 120
+
+
+class JobMetrics:
+    """单个合成任务的指标（线程安全）"""
+
+    def __init__(self, history=LATENCY_HISTORY):
+        self.segments_total = 0
+        self.chars_total = 0
+        self.segments_done = 0
+        self.chars_done = 0
+        self.audio_seconds = 0.0
+        self.in_flight = 0         # 已发出、尚未返回的请求数
+        self.requests = 0          # 成功返回的请求数
+        self.retries = 0           # 重新请求次数（含限流重试、音频无效、格式不一致）
+        self.throttled = 0         # 其中因限流或额度耗尽换凭证重试的次数
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.chars_requested = 0   # 未命中缓存、实际发出请求的片段字数
+        self.wait_seconds = 0.0    # 等待并发名额的累计时间
+        self.merge_seconds = 0.0   # 合并或拼接音频的耗时
+        self.started = None
+        self.finished = None
+        self.estimate = None       # 历史预估的(网络耗时, 合并耗时)秒数
+        self.latencies = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def start(self, items):
+        """开始合成[(片段, 音色ID, 语速, 音量), ...]"""
+        with self._lock:
+            self.segments_total = len(items)
+            self.chars_total = sum(len(item[0]) for item in items)
+            self.started = time.monotonic()
+
+    def set_estimate(self, network_seconds, merge_seconds):
+        with self._lock:
+            self.estimate = (network_seconds, merge_seconds)
+
+    def finish(self):
+        with self._lock:
+            self.finished = time.monotonic()
+
+    def segment_done(self, chars, audio_seconds):
+        with self._lock:
+            self.segments_done += 1
+            self.chars_done += chars
+            self.audio_seconds += audio_seconds
+
+    def cache_lookup(self, hit, chars=0):
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+                self.chars_requested += chars
+
+    def add_wait(self, seconds):
+        with self._lock:
+            self.wait_seconds += seconds
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self, latency=None):
+        """请求结束，latency为None表示请求失败"""
+        with self._lock:
+            self.in_flight -= 1
+            if latency is not None:
+                self.requests += 1
+                self.latencies.append(latency)
+
+    def add_retry(self, throttled=False):
+        with self._lock:
+            self.retries += 1
+            self.throttled += int(throttled)
+
+    def add_merge(self, seconds):
+        with self._lock:
+            self.merge_seconds += seconds
+
+    def snapshot(self):
+        """返回当前指标的字典副本"""
+        with self._lock:
+            now = self.finished or time.monotonic()
+            elapsed = now - self.started if self.started is not None else 0.0
+            lookups = self.cache_hits + self.cache_misses
+            latencies = list(self.latencies)
+            return {
+                "segments_done": self.segments_done,
+                "segments_total": self.segments_total,
+                "chars_done": self.chars_done,
+                "chars_total": self.chars_total,
+                "audio_seconds": self.audio_seconds,
+                "in_flight": self.in_flight,
+                "requests": self.requests,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "cache_hits": self.cache_hits,
+                "cache_hit_rate": self.cache_hits / lookups if lookups else None,
+                "chars_requested": self.chars_requested,
+                "wait_seconds": self.wait_seconds,
+                "merge_seconds": self.merge_seconds,
+                "elapsed": elapsed,
+                "chars_per_second": self.chars_done / elapsed if elapsed > 0 else 0.0,
+                "latencies": latencies,
+                "mean_latency": sum(latencies) / len(latencies) if latencies else None,
+                "estimate": sum(self.estimate) if self.estimate is not None else None,
+                "eta": self._eta(elapsed),
+            }
+
+    def _eta(self, elapsed):
+        """预计剩余秒数，既没有历史预估也还没有完成片段时返回None（调用方持有锁）"""
+        if self.finished is not None:
+            return 0.0
+        remaining = self.chars_total - self.chars_done
+        if self.estimate is None:
+            if not self.chars_done or elapsed <= 0:
+                return None
+            return remaining / (self.chars_done / elapsed)
+        network, merge = self.estimate
+        if not self.chars_done or elapsed <= 0:
+            return max(network - elapsed, 0.0) + merge
+        # 按已完成的比例在历史预估和本次实际吞吐之间过渡
+        progress = self.chars_done / self.chars_total
+        planned = network * remaining / self.chars_total
+        observed = remaining / (self.chars_done / elapsed)
+        return planned * (1 - progress) + observed * progress + merge
+
+    def summary(self):
+        """一行文字摘要（任务结束时输出到日志）"""
+        s = self.snapshot()
+        parts = [f"片段 {s['segments_done']}/{s['segments_total']}",
+                 f"耗时 {s['elapsed']:.1f}秒",
+                 f"{s['chars_per_second']:.1f}字/秒",
+                 f"请求 {s['requests']} 次",
+                 f"重试 {s['retries']} 次（限流 {s['throttled']} 次）",
+                 f"排队等待 {s['wait_seconds']:.1f}秒",
+                 f"合并 {s['merge_seconds']:.1f}秒"]
+        if s["mean_latency"] is not None:
+            parts.append(f"平均请求延迟 {s['mean_latency'] * 1000:.0f}毫秒")
+        if s["cache_hit_rate"] is not None:
+            parts.append(f"缓存命中率 {s['cache_hit_rate']:.0%}")
+        if s["estimate"] is not None:
+            parts.append(f"预估耗时 {s['estimate']:.1f}秒")
+        return "，".join(parts)
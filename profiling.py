@@ -0,0 +1,201 @@
+# 性能剖析：排查现场偶发的慢任务时，记录一次合成任务的函数调用耗时和各阶段的实际耗时
+#
+# 启用后（命令行--profile，GUI中勾选“性能剖析”），任务结束时在输出文件旁生成：
+#   <输出文件名>_profile.pstats  cProfile统计（包含片段线程池中执行的任务），可用pstats或snakeviz查看
+#   <输出文件名>_profile.txt     各阶段耗时和累计耗时最多的函数，可直接附在问题单中
+# 阶段耗时由代码中的stage(...)标记记录：累计为各线程的耗时之和（并发请求会重复计算），
+# 实际占用为按墙钟时间合并重叠区间后的时长。未启用剖析时stage()只做一次判断，几乎没有开销
+#
+# 当前剖析器保存在ContextVar中：只有调用start的线程和经profiled()包装后提交到线程池的任务会记录阶段耗时，
+# 共用同一会话的其他任务（GUI预览、预合成、服务中的并发任务）不会混入报告
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+
+# 阶段名 -> 报告中的名称
+STAGES = {
+    "queue_wait": "排队等待（并发名额、凭证QPS）",
+    "network": "网络请求",
+    "base64": "Base64解码",
+    "file_io": "文件读写",
+    "ffmpeg": "ffmpeg子进程",
+    "qt_signal": "Qt信号发送（GUI）",
+}
+# 报告中列出的函数数
+REPORT_FUNCTIONS = 40
+
+def pad(text, width, right=False):
+    """按显示宽度（中文字符占两列）补齐空格，right为True时右对齐"""
+    display = sum(2 if unicodedata.east_asian_width(char) in "WF" else 1 for char in text)
+    spaces = " " * max(width - display, 0)
+    return spaces + text if right else text + spaces
+
+
+# 当前上下文中启用的剖析器
+_active = contextvars.ContextVar("active_profiler", default=None)
+
+
+class JobProfiler:
+    """记录一次任务的cProfile统计和阶段耗时"""
+
+    def __init__(self):
+        self.intervals = {name: [] for name in STAGES}
+        self.profiles = []
+        self.started = None
+        self.finished = None
+        self._profile = None
+        self._token = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """在执行任务的线程中调用，开始剖析"""
+        self._token = _active.set(self)
+        self.started = time.perf_counter()
+        self._profile = cProfile.Profile()
+        try:
+            self._profile.enable()
+        except ValueError as e:
+            # Python 3.12起同一时间只能启用一个cProfile，其他任务正在剖析时只记录阶段耗时
+            print(f"无法启用cProfile（{e}），只记录阶段耗时")
+            self._profile = None
+
+    def stop(self):
+        """在调用start的线程中调用，结束剖析"""
+        if self._profile is not None:
+            self._profile.disable()
+        self.finished = time.perf_counter()
+        _active.reset(self._token)
+        self._token = None
+        if self._profile is not None:
+            with self._lock:
+                self.profiles.append(self._profile)
+
+    def add(self, name, start, end):
+        with self._lock:
+            self.intervals[name].append((start, end))
+
+    @contextmanager
+    def thread_profile(self):
+        """在线程池的任务中启用单独的cProfile
+
+        Python 3.12起cProfile基于sys.monitoring，start中启用的剖析器已覆盖所有线程，这里无法再启用时直接执行
+        """
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            profile = None
+        if profile is None:
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                self.profiles.append(profile)
+
+    def stage_summary(self):
+        """返回[(阶段名, 次数, 累计秒数, 实际占用秒数), ...]"""
+        result = []
+        with self._lock:
+            intervals = {name: sorted(spans) for name, spans in self.intervals.items()}
+        for name, spans in intervals.items():
+            total = sum(end - start for start, end in spans)
+            covered, current_start, current_end = 0.0, None, None
+            for start, end in spans:
+                if current_end is None or start > current_end:
+                    if current_end is not None:
+                        covered += current_end - current_start
+                    current_start, current_end = start, end
+                else:
+                    current_end = max(current_end, end)
+            if current_end is not None:
+                covered += current_end - current_start
+            result.append((name, len(spans), total, covered))
+        return result
+
+    def report(self):
+        """文字报告：任务总时长、各阶段耗时和累计耗时最多的函数"""
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        lines = [f"任务总时长 {elapsed:.3f}秒", "",
+                 pad("阶段", 32) + pad("次数", 8, True) + pad("累计(秒)", 12, True) + pad("实际占用(秒)", 14, True)
+                 + pad("占比", 10, True)]
+        for name, count, total, covered in self.stage_summary():
+            share = covered / elapsed if elapsed > 0 else 0.0
+            lines.append(f"{pad(STAGES[name], 32)}{count:>8}{total:>12.3f}{covered:>14.3f}{share:>10.1%}")
+        stats = self.stats()
+        if stats is not None:
+            buffer = io.StringIO()
+            stats.stream = buffer
+            stats.sort_stats("cumulative").print_stats(REPORT_FUNCTIONS)
+            lines += ["", buffer.getvalue()]
+        return "\n".join(lines)
+
+    def stats(self):
+        """合并各线程的cProfile统计，没有数据时返回None"""
+        with self._lock:
+            profiles = list(self.profiles)
+        stats = None
+        for profile in profiles:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+            except TypeError:
+                # 没有记录到任何调用的剖析器
+                continue
+        return stats
+
+    def save(self, prefix):
+        """写入<prefix>.pstats和<prefix>.txt，返回写入的文件路径列表"""
+        paths = []
+        stats = self.stats()
+        if stats is not None:
+            stats.dump_stats(f"{prefix}.pstats")
+            paths.append(f"{prefix}.pstats")
+        with open(f"{prefix}.txt", 'w', encoding='utf-8') as f:
+            f.write(self.report())
+        paths.append(f"{prefix}.txt")
+        return paths
+
+
+@contextmanager
+def stage(name):
+    """标记一段代码属于某个阶段（当前上下文未启用剖析时不记录）"""
+    profiler = _active.get()
+    if profiler is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.add(name, start, time.perf_counter())
+
+
+def profiled(fn):
+    """包装提交到线程池的任务：提交时的上下文启用了剖析时，在执行线程中沿用该剖析器并记录cProfile统计"""
+    profiler = _active.get()
+    if profiler is None:
+        return fn
+    def run(*args, **kwargs):
+        token = _active.set(profiler)
+        try:
+            with profiler.thread_profile():
+                return fn(*args, **kwargs)
+        finally:
+            _active.reset(token)
+    return run
+
+
+def profile_prefix(output_file):
+    """剖析结果文件的路径前缀（输出文件旁）"""
+    return f"{os.path.splitext(output_file)[0]}_profile"
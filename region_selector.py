@@ -0,0 +1,152 @@
+# 地域选择：探测候选地域的接入延迟，把请求发往最快的健康地域，错误率升高时自动切换
+import socket
+import ssl
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# 默认候选地域
+DEFAULT_REGIONS = ("ap-guangzhou", "ap-shanghai", "ap-beijing")
+# 探测结果的有效期（秒），过期后在后台重新探测
+PROBE_INTERVAL = 60
+# 单次探测的超时时间（秒）
+PROBE_TIMEOUT = 3
+# 延迟估计的平滑系数（越大越看重最新的探测结果）
+EWMA_ALPHA = 0.3
+# 错误率统计窗口（最近N次请求）
+ERROR_WINDOW = 20
+# 窗口内错误率超过该值时视为不健康
+ERROR_RATE_THRESHOLD = 0.5
+# 判断错误率所需的最少请求数
+MIN_SAMPLES = 4
+# 不健康地域的冷却时间（秒），之后重新参与选择
+UNHEALTHY_COOLDOWN = 30
+# 表示网络或服务端故障的错误码，计入地域错误率
+REGION_ERROR_CODES = ("ClientNetworkError", "ServerNetworkError", "InternalError")
+
+
+def is_region_error(error):
+    """判断请求错误是否与地域的网络或服务状态有关"""
+    code = getattr(error, "code", None)
+    if code is None:
+        return isinstance(error, OSError) or "Timeout" in type(error).__name__
+    return code.startswith(REGION_ERROR_CODES)
+
+
+def regional_endpoint(region):
+    """地域对应的TTS接入域名"""
+    return f"tts.{region}.tencentcloudapi.com"
+
+
+def probe_latency(endpoint, timeout=PROBE_TIMEOUT):
+    """测量到接入点的TCP+TLS握手耗时（秒），失败返回None"""
+    start = time.monotonic()
+    try:
+        context = ssl.create_default_context()
+        with socket.create_connection((endpoint, 443), timeout=timeout) as sock:
+            with context.wrap_socket(sock, server_hostname=endpoint):
+                pass
+    except (OSError, ssl.SSLError):
+        return None
+    return time.monotonic() - start
+
+
+class RegionState:
+    """单个地域的延迟估计与最近请求结果"""
+
+    def __init__(self, region, endpoint):
+        self.region = region
+        self.endpoint = endpoint
+        self.latency = None
+        self.outcomes = deque(maxlen=ERROR_WINDOW)
+        self.unhealthy_until = 0.0
+
+    def error_rate(self):
+        if len(self.outcomes) < MIN_SAMPLES:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def to_dict(self, now):
+        return {
+            "region": self.region,
+            "endpoint": self.endpoint,
+            "latency_ms": None if self.latency is None else round(self.latency * 1000, 1),
+            "error_rate": round(self.error_rate(), 2),
+            "healthy": self.unhealthy_until <= now,
+        }
+
+
+class RegionSelector:
+    """按探测延迟选择地域，并在错误率升高时切换到次优地域"""
+
+    def __init__(self, regions=DEFAULT_REGIONS, probe=probe_latency):
+        if not regions:
+            raise ValueError("候选地域不能为空")
+        self.states = [RegionState(region, regional_endpoint(region)) for region in regions]
+        self.probe = probe
+        self.current = None
+        self._lock = threading.Lock()
+        # 首次探测期间持有，并发的首批请求只探测一次
+        self._first_probe_lock = threading.Lock()
+        self._last_probe = 0.0
+        self._probing = False
+
+    def probe_all(self):
+        """并发探测所有候选地域，更新延迟估计"""
+        with ThreadPoolExecutor(max_workers=len(self.states)) as executor:
+            results = list(executor.map(lambda state: self.probe(state.endpoint), self.states))
+        with self._lock:
+            for state, latency in zip(self.states, results):
+                if latency is None:
+                    continue
+                if state.latency is None:
+                    state.latency = latency
+                else:
+                    state.latency = EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * state.latency
+            self._last_probe = time.monotonic()
+            self._probing = False
+
+    def _refresh_in_background(self):
+        """探测结果过期时在后台线程重新探测，不阻塞请求"""
+        if self._probing or time.monotonic() - self._last_probe < PROBE_INTERVAL:
+            return
+        self._probing = True
+        threading.Thread(target=self.probe_all, name="tts-region-probe", daemon=True).start()
+
+    def choose(self):
+        """返回当前应使用的(地域, 接入域名)"""
+        if self._last_probe == 0.0:
+            with self._first_probe_lock:
+                if self._last_probe == 0.0:
+                    self.probe_all()
+        with self._lock:
+            self._refresh_in_background()
+            now = time.monotonic()
+            healthy = [s for s in self.states if s.unhealthy_until <= now]
+            # 全部不健康时退回到冷却最早结束的地域
+            candidates = healthy or [min(self.states, key=lambda s: s.unhealthy_until)]
+            best = min(candidates, key=lambda s: (s.latency is None, s.latency or 0))
+            if best is not self.current:
+                latency = "未知" if best.latency is None else f"{best.latency * 1000:.0f}ms"
+                print(f"切换到地域 {best.region}（接入延迟 {latency}）")
+                self.current = best
+            return best.region, best.endpoint
+
+    def record(self, region, ok):
+        """记录一次请求结果，错误率超过阈值时暂时标记该地域为不健康"""
+        with self._lock:
+            for state in self.states:
+                if state.region != region:
+                    continue
+                state.outcomes.append(ok)
+                if state.error_rate() > ERROR_RATE_THRESHOLD:
+                    state.unhealthy_until = time.monotonic() + UNHEALTHY_COOLDOWN
+                    state.outcomes.clear()
+                    print(f"地域 {region} 错误率过高，暂停使用{UNHEALTHY_COOLDOWN}秒")
+                break
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return [state.to_dict(now) for state in self.states]
@@ -0,0 +1,174 @@
+# 音色示例音频生成工具
+# 对比音色文件和AudioResources下已有的示例音频，只合成缺失或过期的示例，并发请求
+#
+# 用法：python sample_generator.py [--resources AudioResources] [--dry-run] [--force]
+#
+# 生成参数记录在 AudioResources/manifest.json：{音色ID: {"file", "text", "speed", "volume", "generated"}}
+# 清单中没有记录的示例音频视为手工维护，默认保留（--replace-unmanaged 时重新生成）；
+# 预览文本、语速、音量变化，或音色名称、类型变化后，清单中记录的示例视为过期
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import datetime
+
+import audio_generator
+from sample_pack import collect_samples
+
+MANIFEST_NAME = "manifest.json"
+SAMPLE_CODEC = "mp3"
+# 固定的预览文本（按音色支持的语言选择）
+PREVIEW_TEXTS = {
+    "中文": "您好，欢迎使用腾讯云语音合成。这是我的声音，希望能为您带来愉快的收听体验。",
+    "英文": "Hello, welcome to Tencent Cloud text to speech. This is my voice, and I hope you enjoy listening.",
+}
+
+
+def load_voices(csv_path):
+    """读取音色文件，返回[{"id", "name", "category", "language"}, ...]"""
+    voices = []
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if len(row) >= 5:
+                voices.append({"id": row[0].strip(), "name": row[1].strip(),
+                               "category": row[3].strip(), "language": row[4].strip()})
+    return voices
+
+
+def load_manifest(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"读取清单失败，按没有清单处理: {e}")
+        return {}
+
+
+def save_manifest(path, manifest):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def sample_params(voice, speed, volume):
+    """示例音频的生成参数（写入清单，用于判断是否过期）"""
+    text = PREVIEW_TEXTS.get(voice["language"], PREVIEW_TEXTS["中文"])
+    return {"text": text, "speed": speed, "volume": volume}
+
+
+def plan_samples(voices, resource_dir, manifest, speed, volume, force=False, replace_unmanaged=False):
+    """返回需要生成的示例[(音色, 目标相对路径, 原有文件路径或None, 原因), ...]和音色文件中已没有的示例"""
+    existing = {voice_id: os.path.relpath(path, resource_dir)
+                for voice_id, _, _, path in collect_samples(resource_dir)} if os.path.isdir(resource_dir) else {}
+    plan = []
+    for voice in voices:
+        target = os.path.join(voice["category"], f"{voice['id']}_{voice['name']}.{SAMPLE_CODEC}")
+        current = existing.get(voice["id"])
+        entry = manifest.get(voice["id"])
+        if current is None:
+            reason = "缺失"
+        elif force:
+            reason = "强制重新生成"
+        elif entry is None:
+            if not replace_unmanaged:
+                continue
+            reason = "手工维护"
+        elif current != target or entry.get("file") != target:
+            reason = "音色名称或类型已变化"
+        elif {key: entry.get(key) for key in ("text", "speed", "volume")} != sample_params(voice, speed, volume):
+            reason = "生成参数已变化"
+        else:
+            continue
+        plan.append((voice, target, current, reason))
+    known = {voice["id"] for voice in voices}
+    orphans = sorted(path for voice_id, path in existing.items() if voice_id not in known)
+    return plan, orphans
+
+
+def generate_sample(session, voice, params, resource_dir, target, previous):
+    """合成一个示例音频并写入目标路径，返回清单条目"""
+    audio_data = session.fetch_segment(params["text"], voice["id"], params["speed"], params["volume"], SAMPLE_CODEC)
+    path = os.path.join(resource_dir, target)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(audio_data)
+    os.replace(temp_path, path)
+    # 音色改名或换类型后删除旧文件
+    if previous and previous != target:
+        try:
+            os.remove(os.path.join(resource_dir, previous))
+        except OSError:
+            pass
+    return dict(params, file=target, generated=datetime.now().isoformat(timespec="seconds"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="合成缺失或过期的音色示例音频")
+    parser.add_argument("--resources", default="AudioResources", help="示例音频目录")
+    parser.add_argument("--voices", default=audio_generator.get_config_path('tencent_cloud_voice_type.csv'),
+                        help="音色文件路径")
+    parser.add_argument("--speed", type=float, default=0, help="示例音频的语速")
+    parser.add_argument("--volume", type=int, default=5, help="示例音频的音量")
+    parser.add_argument("--concurrency", type=int, default=audio_generator.DEFAULT_CONCURRENCY, help="同时请求数")
+    parser.add_argument("--force", action="store_true", help="重新生成所有示例音频")
+    parser.add_argument("--replace-unmanaged", action="store_true", help="同时重新生成清单中没有记录的（手工维护的）示例")
+    parser.add_argument("--dry-run", action="store_true", help="只列出需要生成的示例，不发送请求")
+    audio_generator.add_session_arguments(parser)
+    args = parser.parse_args(argv)
+
+    try:
+        voices = load_voices(args.voices)
+    except OSError as e:
+        print(f"读取音色文件失败: {e}")
+        return 1
+    manifest_path = os.path.join(args.resources, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    plan, orphans = plan_samples(voices, args.resources, manifest, args.speed, args.volume,
+                                 args.force, args.replace_unmanaged)
+
+    for path in orphans:
+        print(f"提示：{path} 的音色已不在音色文件中，可手动删除")
+    if not plan:
+        print(f"共 {len(voices)} 个音色，示例音频都是最新的")
+        return 0
+    for voice, target, _, reason in plan:
+        print(f"{reason}: {target}")
+    if args.dry_run:
+        print(f"需要生成 {len(plan)} 个示例音频")
+        return 0
+
+    session = audio_generator.create_session_from_args(args, max_concurrency=args.concurrency)
+    if session.get_pool() is None:
+        return 1
+    failed = 0
+    try:
+        futures = [(voice, session.submit(generate_sample, session, voice,
+                                          sample_params(voice, args.speed, args.volume),
+                                          args.resources, target, previous))
+                   for voice, target, previous, _ in plan]
+        for voice, future in futures:
+            try:
+                manifest[voice["id"]] = future.result()
+                print(f"已生成 {manifest[voice['id']]['file']}")
+            except Exception as e:
+                failed += 1
+                print(f"音色 {voice['id']}（{voice['name']}）示例生成失败: {e}")
+    finally:
+        session.close()
+        save_manifest(manifest_path, manifest)
+
+    print(f"已生成 {len(plan) - failed} 个示例音频，失败 {failed} 个")
+    if os.path.exists(os.path.join(os.path.dirname(os.path.abspath(args.resources)), "AudioResources.pack")):
+        print("示例音频包需要重新生成：python sample_pack.py")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# 音色示例音频打包工具
+# 将AudioResources下的示例音频打包为单个文件，GUI通过mmap按音色ID直接读取，
+# 避免在网络共享目录或被杀毒软件扫描的Windows主机上逐个打开文件
+#
+# 用法：python sample_pack.py [--source AudioResources] [--output AudioResources.pack]
+#
+# 文件格式：
+#   8字节魔数 TTSPACK1
+#   4字节小端无符号整数：索引长度N
+#   N字节UTF-8 JSON索引：{音色ID: {"category", "name", "offset", "length"}}，offset相对于数据区起始位置
+#   数据区：各示例音频的原始内容依次拼接
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+
+PACK_MAGIC = b"TTSPACK1"
+PACK_NAME = "AudioResources.pack"
+SAMPLE_EXTENSIONS = (".mp3", ".wav")
+
+
+def collect_samples(resource_dir):
+    """收集示例音频，返回[(音色ID, 分类目录, 文件名, 文件路径), ...]"""
+    samples = []
+    seen = set()
+    for category in sorted(os.listdir(resource_dir)):
+        category_dir = os.path.join(resource_dir, category)
+        if not os.path.isdir(category_dir):
+            continue
+        for name in sorted(os.listdir(category_dir)):
+            if not name.endswith(SAMPLE_EXTENSIONS):
+                continue
+            voice_id = name.split("_", 1)[0]
+            if voice_id in seen:
+                print(f"警告：音色 {voice_id} 有多个示例音频，忽略 {category}/{name}")
+                continue
+            seen.add(voice_id)
+            samples.append((voice_id, category, name, os.path.join(category_dir, name)))
+    return samples
+
+
+def build_pack(resource_dir, pack_path):
+    """打包示例音频，返回打包的数量"""
+    samples = collect_samples(resource_dir)
+    index = {}
+    offset = 0
+    for voice_id, category, name, path in samples:
+        length = os.path.getsize(path)
+        index[voice_id] = {"category": category, "name": name, "offset": offset, "length": length}
+        offset += length
+    index_bytes = json.dumps(index, ensure_ascii=False).encode("utf-8")
+
+    temp_path = f"{pack_path}.tmp"
+    with open(temp_path, "wb") as out:
+        out.write(PACK_MAGIC)
+        out.write(struct.pack("<I", len(index_bytes)))
+        out.write(index_bytes)
+        for _, _, _, path in samples:
+            with open(path, "rb") as f:
+                out.write(f.read())
+    os.replace(temp_path, pack_path)
+    return len(samples)
+
+
+def valid_entry(entry):
+    """索引项包含字符串category、name和非负整数offset、length"""
+    return (isinstance(entry, dict)
+            and all(isinstance(entry.get(key), str) for key in ("category", "name"))
+            and all(isinstance(entry.get(key), int) and entry[key] >= 0 for key in ("offset", "length")))
+
+
+class SamplePack:
+    """以mmap方式只读打开示例音频包，按音色ID返回零拷贝的memoryview"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"示例音频包为空: {path}")
+        try:
+            self._read_index()
+        except Exception:
+            self.close()
+            raise
+        self._view = memoryview(self._map)
+
+    def _read_index(self):
+        header_size = len(PACK_MAGIC) + 4
+        if len(self._map) < header_size or self._map[:len(PACK_MAGIC)] != PACK_MAGIC:
+            raise ValueError(f"不是有效的示例音频包: {self.path}")
+        index_size = struct.unpack("<I", self._map[len(PACK_MAGIC):header_size])[0]
+        if len(self._map) < header_size + index_size:
+            raise ValueError(f"示例音频包不完整: {self.path}")
+        # 索引损坏时json/utf-8解码错误都是ValueError
+        self.entries = json.loads(self._map[header_size:header_size + index_size].decode("utf-8"))
+        if not isinstance(self.entries, dict):
+            raise ValueError(f"示例音频包索引格式错误: {self.path}")
+        self._data_start = header_size + index_size
+        # 所有示例都必须完整位于数据区内，避免截断的音频包返回不完整的音频
+        for voice_id, entry in self.entries.items():
+            if not valid_entry(entry):
+                raise ValueError(f"示例音频包中音色 {voice_id} 的索引格式错误: {self.path}")
+            if self._data_start + entry["offset"] + entry["length"] > len(self._map):
+                raise ValueError(f"示例音频包不完整，音色 {voice_id} 的音频超出文件末尾: {self.path}")
+
+    def get(self, voice_id):
+        """返回音色示例音频的memoryview，不存在时返回None"""
+        entry = self.entries.get(str(voice_id))
+        if entry is None:
+            return None
+        start = self._data_start + entry["offset"]
+        return self._view[start:start + entry["length"]]
+
+    def close(self):
+        if getattr(self, "_view", None) is not None:
+            self._view.release()
+            self._view = None
+        self._map.close()
+        self._file.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="将音色示例音频打包为单个文件")
+    parser.add_argument("--source", default="AudioResources", help="示例音频目录")
+    parser.add_argument("--output", default=PACK_NAME, help="输出的示例音频包路径")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.source):
+        print(f"错误：示例音频目录 {args.source} 不存在")
+        return 1
+    count = build_pack(args.source, args.output)
+    size_mb = os.path.getsize(args.output) / (1024 * 1024)
+    print(f"已打包 {count} 个示例音频到 {args.output}（{size_mb:.2f} MB）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+# 优先级调度：交互式请求（GUI、单次命令行合成、流式接口）优先于批量任务（后台任务、预合成、监视目录）
+#
+# 优先级按线程传递：在priority_scope(PRIORITY_BULK)中提交的片段任务以批量优先级排队，
+# 任务执行时继承提交时的优先级，申请并发名额时也按该优先级排队。
+# 调度以片段为单位：已发出的请求不会被打断，但新的交互式片段会排在所有等待中的批量片段之前；
+# 批量片段等待时，连续INTERACTIVE_BURST次调度交互式片段后必须调度一次批量片段，避免批量任务饿死
+import threading
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+PRIORITY_NAMES = {"interactive": PRIORITY_INTERACTIVE, "bulk": PRIORITY_BULK}
+# 批量片段等待时，最多连续调度的交互式片段数
+INTERACTIVE_BURST = 4
+
+_local = threading.local()
+
+
+def current_priority():
+    """当前线程的调度优先级（默认交互式）"""
+    return getattr(_local, "priority", PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def priority_scope(priority):
+    """在with块内以指定优先级提交和执行片段任务"""
+    previous = current_priority()
+    _local.priority = priority
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def run_with_priority(priority, fn, *args, **kwargs):
+    """以指定优先级调用fn（例如交给run_in_executor在其他线程执行）"""
+    with priority_scope(priority):
+        return fn(*args, **kwargs)
+
+
+class FairQueue:
+    """按优先级出队（同一优先级先进先出），并保证低优先级不会一直等待（非线程安全，由调用方加锁）"""
+
+    def __init__(self, burst=INTERACTIVE_BURST):
+        self.burst = burst
+        self._queues = {PRIORITY_INTERACTIVE: deque(), PRIORITY_BULK: deque()}
+        self._streak = 0
+
+    def push(self, priority, item):
+        self._queues[PRIORITY_BULK if priority >= PRIORITY_BULK else PRIORITY_INTERACTIVE].append(item)
+
+    def pop(self):
+        interactive, bulk = self._queues[PRIORITY_INTERACTIVE], self._queues[PRIORITY_BULK]
+        if interactive and not (bulk and self._streak >= self.burst):
+            self._streak = self._streak + 1 if bulk else 0
+            return interactive.popleft()
+        self._streak = 0
+        return bulk.popleft()
+
+    def __len__(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+
+class PriorityLimiter:
+    """限制同时在途的请求数，名额释放时按优先级交给等待者（替代BoundedSemaphore）"""
+
+    def __init__(self, slots):
+        self.slots = slots
+        self._free = slots
+        self._waiters = FairQueue()
+        self._lock = threading.Lock()
+
+    def acquire(self, priority=None):
+        priority = current_priority() if priority is None else priority
+        with self._lock:
+            if self._free > 0 and not self._waiters:
+                self._free -= 1
+                return
+            event = threading.Event()
+            self._waiters.push(priority, event)
+        event.wait()
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # 名额直接交给下一个等待者
+                self._waiters.pop().set()
+            elif self._free < self.slots:
+                self._free += 1
+            else:
+                raise ValueError("名额释放次数多于申请次数")
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class PriorityExecutor:
+    """按优先级取任务的线程池，接口与ThreadPoolExecutor的submit/shutdown相同"""
+
+    def __init__(self, max_workers, thread_name_prefix="tts-priority"):
+        self.max_workers = max_workers
+        self.thread_name_prefix = thread_name_prefix
+        self._queue = FairQueue()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._idle = 0
+        self._shutdown = False
+
+    def submit(self, fn, *args, **kwargs):
+        """以当前线程的优先级提交任务，返回Future"""
+        future = Future()
+        priority = current_priority()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("线程池已关闭")
+            self._queue.push(priority, (future, priority, fn, args, kwargs))
+            # 空闲线程不够处理排队的任务时才新建线程
+            if len(self._queue) > self._idle and len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._worker, daemon=True,
+                                          name=f"{self.thread_name_prefix}_{len(self._threads)}")
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify()
+        return future
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._shutdown:
+                    self._idle += 1
+                    self._cond.wait()
+                    self._idle -= 1
+                if not self._queue:
+                    return
+                future, priority, fn, args, kwargs = self._queue.pop()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = run_with_priority(priority, fn, *args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        with self._cond:
+            self._shutdown = True
+            if cancel_futures:
+                while self._queue:
+                    self._queue.pop()[0].cancel()
+            self._cond.notify_all()
+        if wait:
+            for thread in list(self._threads):
+                thread.join()
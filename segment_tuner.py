@@ -0,0 +1,177 @@
+# 片段长度调优：测量不同片段长度下的请求延迟，按音色类型找出整体耗时最短的片段长度
+# 用法：python audio_generator.py calibrate [--concurrency 4] [--samples 3] [--job-length 3000]
+#
+# 结果写入程序目录下的 config/segment_tuning.json，text_to_speech 会按音色类型使用调优后的片段长度上限
+# 注意：调优会实际调用TextToVoice，消耗合成额度
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+import time
+from datetime import datetime
+
+import audio_generator
+
+# 候选片段长度
+CANDIDATE_LENGTHS = (40, 60, 80, 100, 120, 150)
+# 每个候选长度的测量次数
+DEFAULT_SAMPLES = 3
+# 估算整体耗时时使用的典型文本长度（字）
+DEFAULT_JOB_LENGTH = 3000
+
+# 测量用的文本，按不同偏移截取，避免命中缓存
+CALIBRATION_TEXT = (
+    "清晨的阳光穿过薄雾洒在湖面上，远处的山峦若隐若现，几只白鹭掠过水面飞向对岸的芦苇丛。"
+    "沿着湖边的小路慢慢走，可以听到鸟鸣声此起彼伏，偶尔还有鱼儿跃出水面的声音。"
+    "小镇的集市在这个时候已经热闹起来，摊主们忙着摆放新鲜的蔬菜和水果，空气中弥漫着刚出炉的包子的香气。"
+    "老人们聚在茶馆里喝茶聊天，讨论着今年的收成和孩子们的近况，孩子们则背着书包结伴走向学校。"
+    "午后下起了一场小雨，雨点敲打着青石板路，屋檐下的燕子安静地躲在巢里。"
+    "雨停之后，天边出现了一道彩虹，街道上的行人纷纷驻足抬头观看，有人拿出手机拍下这难得的景象。"
+    "傍晚时分，炊烟从家家户户的烟囱里升起，饭菜的香味飘满了整条街巷。"
+    "夜幕降临，湖面倒映着点点灯火，微风吹过，带来一丝凉意，小镇渐渐归于宁静。"
+)
+
+
+def sample_text(length, index):
+    """截取指定长度的测量文本，不同序号使用不同偏移"""
+    span = len(CALIBRATION_TEXT) - length
+    start = (index * 37) % max(1, span)
+    return CALIBRATION_TEXT[start:start + length]
+
+
+def representative_voices():
+    """每种音色类型取音色文件中的第一个音色，返回{音色类型: 音色ID}"""
+    voices = {}
+    csv_path = audio_generator.get_config_path('tencent_cloud_voice_type.csv')
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if len(row) >= 4:
+                voices.setdefault(row[3].strip(), int(row[0]))
+    return voices
+
+
+def fit_latency(measurements):
+    """最小二乘拟合 延迟 = 固定开销 + 每字耗时 * 长度，返回(固定开销, 每字耗时)"""
+    n = len(measurements)
+    mean_x = sum(x for x, _ in measurements) / n
+    mean_y = sum(y for _, y in measurements) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in measurements)
+    if var_x == 0:
+        return mean_y, 0.0
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in measurements) / var_x
+    slope = max(0.0, slope)
+    return max(0.0, mean_y - slope * mean_x), slope
+
+
+def estimate_job_time(length, intercept, per_char, job_length, concurrency):
+    """估算用指定片段长度合成job_length字所需的时间（秒）"""
+    segments = math.ceil(job_length / length)
+    rounds = math.ceil(segments / concurrency)
+    return rounds * (intercept + per_char * length)
+
+
+def best_length(intercept, per_char, job_length, concurrency):
+    """在候选范围内找出估算耗时最短的片段长度"""
+    lengths = range(20, audio_generator.DEFAULT_MAX_SEGMENT_LENGTH + 1, 10)
+    return min(lengths, key=lambda length: (
+        estimate_job_time(length, intercept, per_char, job_length, concurrency), -length))
+
+
+def measure(session, voice_type, lengths, samples):
+    """每批同时发出max_concurrency个请求，测量各片段长度的请求延迟，返回[(长度, 秒), ...]"""
+    def timed_request(text):
+        start = time.monotonic()
+        session.fetch_segment(text, voice_type)
+        return len(text), time.monotonic() - start
+
+    texts = [sample_text(length, i) for i in range(samples) for length in lengths]
+    measurements = []
+    # 分批提交，避免排队等待并发名额的时间计入延迟
+    for start in range(0, len(texts), session.max_concurrency):
+        batch = texts[start:start + session.max_concurrency]
+        futures = [session.submit(timed_request, text) for text in batch]
+        measurements.extend(future.result() for future in futures)
+    return measurements
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="audio_generator.py calibrate", description="按音色类型调优片段长度")
+    parser.add_argument("--concurrency", type=int, default=audio_generator.DEFAULT_CONCURRENCY,
+                        help="测量和估算时使用的并发数（应与实际合成时一致）")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES, help="每个候选长度的测量次数")
+    parser.add_argument("--job-length", type=int, default=DEFAULT_JOB_LENGTH, help="估算耗时使用的典型文本长度（字）")
+    parser.add_argument("--voice-type", action="append", help="只调优指定的音色类型（可重复）")
+    audio_generator.add_session_arguments(parser)
+    args = parser.parse_args(argv)
+
+    try:
+        voices = representative_voices()
+    except OSError as e:
+        print(f"读取音色文件失败: {e}")
+        return 1
+    if args.voice_type:
+        voices = {category: voice for category, voice in voices.items() if category in args.voice_type}
+    if not voices:
+        print("没有需要调优的音色类型")
+        return 1
+
+    requests = len(voices) * len(CANDIDATE_LENGTHS) * args.samples
+    print(f"将发送 {requests} 次合成请求进行测量（会消耗合成额度）")
+
+    # 使用不保留条目的缓存，确保每次测量都发出请求
+    session = audio_generator.create_session_from_args(
+        args, max_concurrency=args.concurrency, cache=audio_generator.SegmentCache(max_entries=0))
+    if session.get_pool() is None:
+        return 1
+
+    tuning_path = audio_generator.get_config_path(audio_generator.SEGMENT_TUNING_FILE)
+    try:
+        with open(tuning_path, 'r', encoding='utf-8') as f:
+            tuning = json.load(f)
+    except (OSError, ValueError):
+        tuning = {}
+    results = tuning.setdefault("voice_types", {})
+
+    try:
+        for category, voice_type in voices.items():
+            print(f"测量 {category}（音色 {voice_type}）...")
+            try:
+                measurements = measure(session, voice_type, CANDIDATE_LENGTHS, args.samples)
+            except Exception as e:
+                print(f"{category} 测量失败: {e}")
+                continue
+            intercept, per_char = fit_latency(measurements)
+            length = best_length(intercept, per_char, args.job_length, args.concurrency)
+            results[category] = {
+                "max_length": length,
+                "voice": voice_type,
+                "intercept": round(intercept, 4),
+                "per_char": round(per_char, 6),
+                "samples": len(measurements),
+            }
+            estimate = estimate_job_time(length, intercept, per_char, args.job_length, args.concurrency)
+            default = estimate_job_time(audio_generator.DEFAULT_MAX_SEGMENT_LENGTH, intercept, per_char,
+                                        args.job_length, args.concurrency)
+            print(f"{category}: 固定开销 {intercept:.3f}秒，每字 {per_char * 1000:.2f}毫秒，"
+                  f"最佳片段长度 {length}字（{args.job_length}字估算 {estimate:.1f}秒，默认150字为 {default:.1f}秒）")
+    finally:
+        session.close()
+
+    tuning.update({
+        "concurrency": args.concurrency,
+        "job_length": args.job_length,
+        "updated": datetime.now().isoformat(timespec="seconds"),
+    })
+    os.makedirs(os.path.dirname(tuning_path) or ".", exist_ok=True)
+    with open(tuning_path, 'w', encoding='utf-8') as f:
+        json.dump(tuning, f, ensure_ascii=False, indent=2)
+    print(f"调优结果已保存到 {tuning_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import struct
+
+import pytest
+
+from audio_utils import (AudioFormatError, build_wav_header, check_duration, concat_mp3, extract_pcm, parse_mp3,
+                         parse_mp3_frame_header, parse_wav_header, speed_factor, validate_wav_segment)
+
+SAMPLE_RATE = 16000
+
+
+def make_wav(seconds, sample_rate=SAMPLE_RATE):
+    pcm = b"\x00\x00" * int(seconds * sample_rate)
+    return build_wav_header(1, sample_rate, 16, len(pcm)) + pcm
+
+
+def test_wav_header_round_trip():
+    data = make_wav(0.5)
+    fmt, pcm = extract_pcm(data)
+    assert (fmt["channels"], fmt["sample_rate"], fmt["bits_per_sample"]) == (1, SAMPLE_RATE, 16)
+    assert len(pcm) == SAMPLE_RATE
+    assert validate_wav_segment(data)["duration"] == pytest.approx(0.5)
+
+
+def test_wav_skips_unknown_chunks():
+    data = make_wav(0.1)
+    # 在fmt块和data块之间插入LIST块
+    data = data[:36] + b"LIST" + struct.pack("<I", 4) + b"INFO" + data[36:]
+    data = data[:4] + struct.pack("<I", len(data) - 8) + data[8:]
+    fmt = parse_wav_header(data)
+    assert fmt["data_size"] == int(0.1 * SAMPLE_RATE) * 2
+
+
+def test_truncated_wav_rejected():
+    data = make_wav(0.5)
+    with pytest.raises(AudioFormatError):
+        validate_wav_segment(data[:-100])
+
+
+def test_not_wav_rejected():
+    with pytest.raises(AudioFormatError):
+        parse_wav_header(b"ID3" + b"\x00" * 100)
+
+
+def test_speed_factor_interpolates():
+    assert speed_factor(0) == 1.0
+    assert speed_factor(6) == 2.5
+    assert speed_factor(-2) == 0.6
+    assert speed_factor(4) == pytest.approx(2.0)
+    assert speed_factor(10) == 2.5
+
+
+def test_fast_english_segment_accepted():
+    # 35个非空白字符的英文句子在6档语速（约2.5倍）下大约1秒
+    text = "The quick brown fox jumps over the lazy dog"
+    char_count = len("".join(text.split()))
+    validate_wav_segment(make_wav(1.0), char_count, speed=6)
+    with pytest.raises(AudioFormatError):
+        validate_wav_segment(make_wav(1.0), char_count, speed=0)
+
+
+def test_duration_bounds():
+    check_duration(2.0, 10)
+    with pytest.raises(AudioFormatError):
+        check_duration(0.05, 10)
+    with pytest.raises(AudioFormatError):
+        check_duration(30.0, 10)
+    # 慢速时允许更长的时长
+    check_duration(18.0, 10, speed=-2)
+
+
+# MPEG1 Layer III，128kbps，44100Hz，单声道，无CRC
+MP3_HEADER = bytes([0xFF, 0xFB, 0x90, 0xC0])
+MP3_FRAME_SIZE = 417
+
+
+def make_mp3(frames, header=MP3_HEADER):
+    return (header + b"\x00" * (MP3_FRAME_SIZE - 4)) * frames
+
+
+def test_parse_mp3_frames():
+    info = parse_mp3(b"ID3\x03\x00\x00\x00\x00\x00\x0a" + b"\x00" * 10 + make_mp3(10))
+    assert info["frame_count"] == 10
+    assert (info["version"], info["sample_rate"], info["channels"]) == ("MPEG1", 44100, 1)
+    assert info["duration"] == pytest.approx(10 * 1152 / 44100)
+    assert len(info["frames"]) == 10 * MP3_FRAME_SIZE
+
+
+def test_truncated_mp3_rejected():
+    with pytest.raises(AudioFormatError):
+        parse_mp3(make_mp3(3)[:-10])
+    with pytest.raises(AudioFormatError):
+        parse_mp3(b"\x00" * 100)
+
+
+def test_concat_mp3_writes_info_frame():
+    parts = [parse_mp3(make_mp3(5)), parse_mp3(make_mp3(7))]
+    merged = parse_mp3(concat_mp3(parts))
+    # 拼接结果开头的Info帧不计入音频帧
+    assert merged["frame_count"] == 12
+    data = concat_mp3(parts)
+    assert b"Info" in data[:MP3_FRAME_SIZE]
+    assert struct.unpack(">I", data[data.index(b"Info") + 8:data.index(b"Info") + 12])[0] == 12
+
+
+def test_mp3_format_mismatch_rejected():
+    # 第二帧为48000Hz
+    other = bytes([0xFF, 0xFB, 0x94, 0xC0])
+    with pytest.raises(AudioFormatError):
+        parse_mp3(make_mp3(1) + other + b"\x00" * (parse_mp3_frame_header(other)["frame_size"] - 4))
@@ -0,0 +1,74 @@
+import base64
+import time
+import types
+
+import pytest
+from tencentcloud.common.exception.tencent_cloud_sdk_exception import TencentCloudSDKException
+
+import audio_generator
+import credential_pool
+from audio_utils import build_wav_header
+from credential_pool import CredentialPool, classify_error
+
+
+def make_pool(credentials, **kwargs):
+    return CredentialPool(credentials, lambda *args: object(), **kwargs)
+
+
+def test_classify_error():
+    assert classify_error(TencentCloudSDKException("RequestLimitExceeded.UinLimitExceeded", "")) == "throttle"
+    assert classify_error(TencentCloudSDKException("UnsupportedOperation.PkgExhausted", "")) == "quota"
+    assert classify_error(TencentCloudSDKException("InternalError", "")) is None
+    assert classify_error(ValueError("x")) is None
+
+
+def test_round_robin_skips_ejected_key():
+    pool = make_pool([("id-a", "key-a"), ("id-b", "key-b")])
+    first = pool.acquire()
+    assert pool.release(first, TencentCloudSDKException("RequestLimitExceeded", "")) == "throttle"
+    for _ in range(3):
+        slot = pool.acquire()
+        assert slot is not first
+        pool.release(slot)
+    assert [s["ejected"] for s in pool.stats()] == [True, False]
+
+
+def test_qps_limit_waits_for_token():
+    pool = make_pool([("id-a", "key-a", 2)])
+    start = time.monotonic()
+    for _ in range(3):
+        pool.release(pool.acquire())
+    assert time.monotonic() - start >= 0.4
+
+
+def test_all_keys_ejected_times_out(monkeypatch):
+    monkeypatch.setattr(credential_pool, "QUOTA_EJECT_SECONDS", 10)
+    pool = make_pool([("id-a", "key-a")], acquire_timeout=0.2)
+    pool.release(pool.acquire(), TencentCloudSDKException("AuthFailure", ""))
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+
+
+def test_single_key_throttle_waits_and_retries(monkeypatch):
+    monkeypatch.setattr(credential_pool, "THROTTLE_EJECT_SECONDS", 0.2)
+    pcm = b"\x00\x00" * 16000
+    calls = []
+
+    class Client:
+        def TextToVoice(self, request):
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise TencentCloudSDKException("RequestLimitExceeded", "限流")
+            return types.SimpleNamespace(Audio=base64.b64encode(build_wav_header(1, 16000, 16, len(pcm)) + pcm))
+
+    pool = CredentialPool([("id-a", "key-a")], lambda *args: Client())
+    session = audio_generator.SynthesisSession()
+    monkeypatch.setattr(session, "get_pool", lambda: pool)
+    try:
+        audio = session.fetch_segment("你好", 101012)
+    finally:
+        session.close()
+    assert audio.startswith(b"RIFF")
+    assert len(calls) == 2
+    # 第二次请求等到被剔除的凭证恢复后才发出
+    assert calls[1] - calls[0] >= 0.15
@@ -0,0 +1,46 @@
+import pytest
+
+from dialogue import DialogueScriptError, lines_to_segments, parse_script
+
+SCRIPT = """# 注释行
+@旁白 101011
+@小明 智兰 speed=0.5 volume=6
+旁白：很久以前，山里住着一户人家。
+小明：我们出发吧！
+沿用上一行的角色。
+路人：未声明的标签视为普通文本
+"""
+
+
+def test_parse_script():
+    lines = parse_script(SCRIPT)
+    assert lines == [
+        ("旁白", "很久以前，山里住着一户人家。", 101011, 0, 5),
+        ("小明", "我们出发吧！", 501001, 0.5, 6),
+        ("小明", "沿用上一行的角色。", 501001, 0.5, 6),
+        ("小明", "路人：未声明的标签视为普通文本", 501001, 0.5, 6),
+    ]
+
+
+def test_lines_before_first_speaker_use_default_voice():
+    lines = parse_script("开场白\n@甲 101011\n甲：你好", default_voice=1001, default_speed=1, default_volume=3)
+    assert lines == [(None, "开场白", 1001, 1, 3), ("甲", "你好", 101011, 1, 3)]
+    with pytest.raises(DialogueScriptError, match="第1行"):
+        parse_script("开场白\n@甲 101011\n甲：你好")
+
+
+@pytest.mark.parametrize("script, message", [
+    ("@甲\n甲：你好", "角色声明格式"),
+    ("@甲 不存在的音色\n甲：你好", "未找到音色"),
+    ("@甲 101011 pitch=1\n甲：你好", "不支持的参数"),
+    ("@甲 101011 volume=大\n甲：你好", "值不正确"),
+    ("# 只有注释\n@甲 101011\n", "没有台词"),
+])
+def test_invalid_scripts(script, message):
+    with pytest.raises(DialogueScriptError, match=message):
+        parse_script(script)
+
+
+def test_consecutive_lines_with_same_voice_are_merged():
+    lines = [("甲", "第一句。", 101011, 0, 5), ("乙", "第二句。", 101011, 0, 5), ("丙", "第三句。", 501001, 0, 5)]
+    assert lines_to_segments(lines) == [("第一句。\n第二句。", 101011, 0, 5), ("第三句。", 501001, 0, 5)]
@@ -0,0 +1,45 @@
+import math
+import struct
+
+import pytest
+
+from audio_utils import build_wav_header
+from hls_output import HlsWriter
+
+imageio_ffmpeg = pytest.importorskip("imageio_ffmpeg")
+
+SAMPLE_RATE = 16000
+
+
+def tone(seconds, start=0):
+    samples = range(start, start + int(seconds * SAMPLE_RATE))
+    pcm = b"".join(struct.pack("<h", int(8000 * math.sin(2 * math.pi * 440 * i / SAMPLE_RATE))) for i in samples)
+    return build_wav_header(1, SAMPLE_RATE, 16, len(pcm)) + pcm
+
+
+def test_segments_encoded_by_one_continuous_stream(tmp_path):
+    playlist = tmp_path / "book.m3u8"
+    writer = HlsWriter(str(playlist), imageio_ffmpeg.get_ffmpeg_exe(), target_duration=2)
+    # 文本片段长度与分片长度无关
+    for i in range(5):
+        writer.add_segment(tone(1.5, int(i * 1.5 * SAMPLE_RATE)))
+    writer.finish()
+
+    assert writer.ended
+    assert writer.offset == pytest.approx(7.5)
+    assert len(writer.entries) >= 3
+    # 各分片时长连续，合计约为送入的音频时长（只有一次编码器延迟）
+    assert sum(duration for duration, _ in writer.entries) == pytest.approx(7.5, abs=0.1)
+    for _, filename in writer.entries:
+        assert (tmp_path / filename).stat().st_size > 0
+    lines = playlist.read_text(encoding="utf-8").splitlines()
+    assert lines[-1] == "#EXT-X-ENDLIST"
+    assert [line for line in lines if line.endswith(".ts")] == [name for _, name in writer.entries]
+    assert not (tmp_path / "book_segments.csv").exists()
+
+
+def test_finish_without_segments(tmp_path):
+    playlist = tmp_path / "empty.m3u8"
+    writer = HlsWriter(str(playlist), imageio_ffmpeg.get_ffmpeg_exe())
+    writer.finish()
+    assert playlist.read_text(encoding="utf-8").splitlines()[-1] == "#EXT-X-ENDLIST"
@@ -0,0 +1,54 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import profiling
+
+
+def decode():
+    with profiling.stage("base64"):
+        pass
+
+
+def stage_counts(profiler):
+    return {name: count for name, count, _, _ in profiler.stage_summary()}
+
+
+def test_stages_from_other_threads_are_not_recorded():
+    profiler = profiling.JobProfiler()
+    profiler.start()
+    try:
+        with profiling.stage("network"):
+            pass
+        # 共用会话的其他线程（例如预览）不属于该任务
+        other = threading.Thread(target=decode)
+        other.start()
+        other.join()
+    finally:
+        profiler.stop()
+    counts = stage_counts(profiler)
+    assert counts["network"] == 1
+    assert counts["base64"] == 0
+
+
+def test_profiled_tasks_record_into_submitting_profiler():
+    def task():
+        with profiling.stage("file_io"):
+            return 1
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        profiler = profiling.JobProfiler()
+        profiler.start()
+        try:
+            results = [executor.submit(profiling.profiled(task)).result() for _ in range(3)]
+        finally:
+            profiler.stop()
+        # 剖析结束后提交的任务不再记录
+        executor.submit(profiling.profiled(task)).result()
+    assert results == [1, 1, 1]
+    assert stage_counts(profiler)["file_io"] == 3
+
+
+def test_stage_without_profiler_is_noop():
+    with profiling.stage("network"):
+        pass
+    assert profiling.profiled(len) is len
@@ -0,0 +1,61 @@
+import json
+import struct
+
+import pytest
+
+from sample_pack import PACK_MAGIC, SamplePack, build_pack
+
+
+@pytest.fixture
+def resources(tmp_path):
+    source = tmp_path / "AudioResources"
+    (source / "标准音色").mkdir(parents=True)
+    (source / "精品音色").mkdir()
+    (source / "标准音色" / "1001_智瑜.mp3").write_bytes(b"ID3" + b"a" * 100)
+    (source / "精品音色" / "101012_智燕.wav").write_bytes(b"RIFF" + b"b" * 50)
+    (source / "精品音色" / "readme.txt").write_text("忽略")
+    return source
+
+
+def test_round_trip(resources, tmp_path):
+    pack_path = tmp_path / "AudioResources.pack"
+    assert build_pack(str(resources), str(pack_path)) == 2
+    pack = SamplePack(str(pack_path))
+    try:
+        assert bytes(pack.get(1001)) == b"ID3" + b"a" * 100
+        assert bytes(pack.get("101012")) == b"RIFF" + b"b" * 50
+        assert pack.entries["101012"]["category"] == "精品音色"
+        assert pack.get(999) is None
+    finally:
+        pack.close()
+
+
+def test_truncated_data_rejected(resources, tmp_path):
+    pack_path = tmp_path / "AudioResources.pack"
+    build_pack(str(resources), str(pack_path))
+    pack_path.write_bytes(pack_path.read_bytes()[:-10])
+    with pytest.raises(ValueError):
+        SamplePack(str(pack_path))
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    PACK_MAGIC[:4],
+    b"NOTAPACK" + struct.pack("<I", 2) + b"{}",
+    PACK_MAGIC + struct.pack("<I", 100) + b"{}",
+    PACK_MAGIC + struct.pack("<I", 2) + b"[]",
+    PACK_MAGIC + struct.pack("<I", 4) + b"\xff\xfe{}",
+])
+def test_invalid_header_rejected(tmp_path, data):
+    pack_path = tmp_path / "bad.pack"
+    pack_path.write_bytes(data)
+    with pytest.raises(ValueError):
+        SamplePack(str(pack_path))
+
+
+def test_invalid_entry_rejected(tmp_path):
+    index = json.dumps({"1001": {"category": "标准音色", "name": "1001.mp3", "offset": -1, "length": 1}}).encode()
+    pack_path = tmp_path / "bad.pack"
+    pack_path.write_bytes(PACK_MAGIC + struct.pack("<I", len(index)) + index + b"x")
+    with pytest.raises(ValueError):
+        SamplePack(str(pack_path))
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from throughput_model import ThroughputModel, format_eta
+
+
+def snapshot(elapsed=10.0, merge_seconds=0.0, chars=100, audio_seconds=20.0, latency=0.5):
+    return {"elapsed": elapsed, "merge_seconds": merge_seconds, "chars_requested": chars, "chars_done": chars,
+            "audio_seconds": audio_seconds, "mean_latency": latency}
+
+
+def test_record_and_estimate(tmp_path):
+    model = ThroughputModel(str(tmp_path / "stats.json"))
+    assert model.estimate([("你好", 1001, 0, 0)], "out.wav", 5) is None
+    model.record([("x" * 100, 1001, 0, 0)], "out.mp3", snapshot(elapsed=12.0, merge_seconds=2.0), 5)
+    # 10字/秒，每字0.2秒音频，每秒音频0.1秒合并
+    network, merge = model.estimate([("x" * 50, 1001, 0, 0)], "out.mp3", 5)
+    assert network == pytest.approx(5.0)
+    assert merge == pytest.approx(50 * 0.2 * 0.1)
+    # 并发数低于记录时按比例放慢，高于时不加快
+    assert model.estimate([("x" * 50, 1001, 0, 0)], "out.mp3", 1)[0] == pytest.approx(25.0)
+    assert model.estimate([("x" * 50, 1001, 0, 0)], "out.mp3", 20)[0] == pytest.approx(5.0)
+
+
+def test_duplicates_and_cached_segments(tmp_path):
+    model = ThroughputModel(str(tmp_path / "stats.json"))
+    model.record([("x" * 100, 1001, 0, 0)], "out.wav", snapshot(), 5)
+    item = ("x" * 50, 1001, 0, 0)
+    assert model.estimate([item, item], "out.wav", 5)[0] == pytest.approx(5.0)
+    # 全部命中缓存时没有网络耗时；请求很少时至少需要一次请求的时间
+    assert model.estimate([item], "out.wav", 5, cached=lambda *args: True)[0] == 0
+    assert model.estimate([("x", 1001, 0, 0)], "out.wav", 5)[0] == pytest.approx(0.5)
+
+
+def test_unknown_voice_uses_category_average(tmp_path):
+    model = ThroughputModel(str(tmp_path / "stats.json"))
+    model.record([("x" * 100, 1001, 0, 0)], "out.wav", snapshot(elapsed=10.0), 5, {"1001": "标准音色"})
+    model.record([("x" * 100, 2001, 0, 0)], "out.wav", snapshot(elapsed=50.0), 5, {"2001": "大模型音色"})
+    assert model.voice_stats(3001, "大模型音色")["chars_per_second"] == pytest.approx(2.0)
+    assert model.voice_stats(3001)["chars_per_second"] == pytest.approx(6.0)
+
+
+def test_save_and_load_drops_invalid_entries(tmp_path):
+    path = tmp_path / "stats.json"
+    model = ThroughputModel(str(path))
+    model.record([("x" * 100, 1001, 0, 0)], "out.wav", snapshot(), 5)
+    model.save()
+    data = json.loads(path.read_text(encoding="utf-8"))
+    data["voices"]["1002"] = {"runs": "3", "chars_per_second": 5}
+    data["voices"]["1003"] = {"runs": 1, "chars_per_second": -1}
+    path.write_text(json.dumps(data), encoding="utf-8")
+    loaded = ThroughputModel(str(path)).load()
+    assert set(loaded.voices) == {"1001"}
+    assert loaded.voices["1001"]["chars_per_second"] == pytest.approx(10.0)
+
+
+def test_corrupt_file_starts_empty(tmp_path):
+    path = tmp_path / "stats.json"
+    path.write_text("[1, 2]", encoding="utf-8")
+    assert ThroughputModel(str(path)).load().voices == {}
+
+
+def test_format_eta():
+    assert format_eta(5.4) == "5秒"
+    assert format_eta(65) == "1分05秒"
+    assert format_eta(3720) == "1小时02分"
@@ -0,0 +1,69 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+import audio_generator
+import tts_server
+
+
+async def read(raw):
+    reader = asyncio.StreamReader()
+    reader.feed_data(raw)
+    reader.feed_eof()
+    return await tts_server.read_request(reader)
+
+
+@pytest.mark.parametrize("length", [b"abc", b"-5"])
+def test_malformed_content_length(length):
+    with pytest.raises(tts_server.HttpError) as info:
+        asyncio.run(read(b"POST /synthesize HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n{}"))
+    assert info.value.status == 400
+
+
+def test_body_too_large():
+    length = str(tts_server.MAX_BODY_SIZE + 1).encode()
+    with pytest.raises(tts_server.HttpError) as info:
+        asyncio.run(read(b"POST /synthesize HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n"))
+    assert info.value.status == 413
+
+
+def test_parse_synthesis_params_defaults():
+    params = tts_server.parse_synthesis_params({"text": " 你好 ", "format": "MP3"})
+    assert params["text"] == "你好"
+    assert params["format"] == "mp3"
+    assert params["mode"] == "job"
+    with pytest.raises(tts_server.HttpError):
+        tts_server.parse_synthesis_params({"text": "你好", "speed": 7})
+
+
+def test_delete_running_job_cancels_and_removes_output(tmp_path, monkeypatch):
+    def fake_text_to_speech(text, output_file, voice, speed, volume, session, on_segment, hedge_stats,
+                            cancel_token, metrics):
+        with open(output_file, "wb") as f:
+            f.write(b"partial")
+        deadline = time.monotonic() + 5
+        while not cancel_token.cancelled and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # 取消后合成线程仍可能写出文件
+        with open(output_file, "wb") as f:
+            f.write(b"late")
+        return False
+
+    monkeypatch.setattr(audio_generator, "text_to_speech", fake_text_to_speech)
+
+    async def scenario():
+        server = tts_server.TTSServer(session=None, output_dir=str(tmp_path))
+        job = server.create_job(tts_server.parse_synthesis_params({"text": "你好"}))
+        while not os.path.exists(job.output_file):
+            await asyncio.sleep(0.01)
+        server.remove_job(job)
+        assert job.job_id not in server.jobs
+        while job.finished is None:
+            await asyncio.sleep(0.01)
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.status == "cancelled"
+    assert not os.path.exists(job.output_file)
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+
+import pytest
+
+import tts_worker
+from tts_worker import MAX_SEGMENT_ATTEMPTS, SQLiteJobQueue, Worker
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SQLiteJobQueue(str(tmp_path / "queue.db"))
+
+
+class FakeSession:
+    """按片段文本返回音频，failures中的片段抛出异常"""
+
+    def __init__(self, failures=()):
+        self.failures = set(failures)
+
+    def fetch_segment(self, text, voice_type, speed, volume):
+        if text in self.failures:
+            raise RuntimeError("合成失败")
+        return text.encode("utf-8")
+
+
+def make_worker(queue, tmp_path, session, worker_id="w1"):
+    return Worker(queue, str(tmp_path / "store"), session, worker_id, 1, 0.1, True)
+
+
+def test_renew_and_expired_lease(queue, monkeypatch):
+    job_id = queue.submit_job(["甲"], "out.wav", 101011, 0, 5)
+    item = queue.claim_segment("w1")
+    assert (item["job_id"], item["idx"], item["attempts"]) == (job_id, 0, 0)
+    assert queue.claim_segment("w2") is None
+    assert queue.renew_segment(job_id, 0, "w1")
+    assert not queue.renew_segment(job_id, 0, "w2")
+
+    # 租约过期后片段可被其他worker重新领取，原worker不能再续租或提交结果
+    monkeypatch.setattr(tts_worker, "SEGMENT_LEASE_SECONDS", -1)
+    assert queue.renew_segment(job_id, 0, "w1")
+    item = queue.claim_segment("w2")
+    assert (item["idx"], item["attempts"]) == (0, 1)
+    assert not queue.renew_segment(job_id, 0, "w1")
+    assert not queue.complete_segment(job_id, 0, "w1", "stale.wav")
+    assert queue.fail_segment(job_id, 0, "w1", "超时") is None
+
+
+def test_failed_segment_is_requeued_until_max_attempts(queue, tmp_path):
+    job_id = queue.submit_job(["甲", "乙"], "out.wav", 101011, 0, 5)
+    worker = make_worker(queue, tmp_path, FakeSession(failures={"乙"}))
+    for _ in range(MAX_SEGMENT_ATTEMPTS + 1):
+        worker.process_segment(queue.claim_segment("w1"))
+        if queue.job_status(job_id)[0]["status"] == "failed":
+            break
+    status = queue.job_status(job_id)[0]
+    assert status["status"] == "failed"
+    assert "片段 2" in status["error"]
+    assert queue.claim_segment("w1") is None
+    # 任务失败后删除已完成片段的文件
+    assert not os.path.exists(tmp_path / "store" / job_id)
+
+
+def test_merge_claimed_after_all_segments_done(queue, tmp_path):
+    job_id = queue.submit_job(["甲", "乙"], "out.wav", 101011, 0, 5)
+    worker = make_worker(queue, tmp_path, FakeSession())
+    worker.process_segment(queue.claim_segment("w1"))
+    assert queue.claim_merge("w1") is None
+    worker.process_segment(queue.claim_segment("w1"))
+
+    job, files = queue.claim_merge("w1")
+    assert job["id"] == job_id
+    assert [open(path, "rb").read() for path in files] == ["甲".encode(), "乙".encode()]
+    assert queue.claim_merge("w2") is None
+    assert not queue.finish_job(job_id, "w2", True)
+    assert queue.finish_job(job_id, "w1", True)
+    assert queue.job_status(job_id)[0]["status"] == "done"
+    assert queue.is_idle()
+
+
+def test_stale_merge_is_taken_over(queue, monkeypatch):
+    job_id = queue.submit_job(["甲"], "out.wav", 101011, 0, 5)
+    item = queue.claim_segment("w1")
+    assert queue.complete_segment(job_id, item["idx"], "w1", "a.wav")
+    monkeypatch.setattr(tts_worker, "MERGE_LEASE_SECONDS", -1)
+    assert queue.claim_merge("w1")[0]["id"] == job_id
+    assert queue.claim_merge("w2")[0]["id"] == job_id
+    assert not queue.renew_merge(job_id, "w1")
+
+
+def test_short_jobs_claimed_before_long_jobs(queue):
+    long_job = queue.submit_job(["甲"], "long.wav", 101011, 0, 5, estimate=600)
+    unknown_job = queue.submit_job(["乙"], "unknown.wav", 101011, 0, 5)
+    short_job = queue.submit_job(["丙"], "short.wav", 101011, 0, 5, estimate=1)
+    claimed = [queue.claim_segment("w1")["job_id"] for _ in range(3)]
+    assert claimed == [unknown_job, short_job, long_job]
+
+
+def test_old_queue_is_migrated(tmp_path):
+    path = str(tmp_path / "queue.db")
+    old_schema = tts_worker.SCHEMA.replace(",\n    estimate REAL", "")
+    assert old_schema != tts_worker.SCHEMA
+    conn = sqlite3.connect(path)
+    conn.executescript(old_schema)
+    conn.close()
+    queue = SQLiteJobQueue(path)
+    job_id = queue.submit_job(["甲"], "out.wav", 101011, 0, 5, estimate=3.5)
+    assert queue.job_status(job_id)[0]["estimate"] == 3.5
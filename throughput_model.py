@@ -0,0 +1,193 @@
+# 合成耗时模型：记录已完成任务的吞吐数据，用于在任务开始前和进行中预估耗时
+#
+# 数据保存在程序目录下的 config/throughput_stats.json：
+#   voices  按音色ID记录网络吞吐（实际请求的字数/秒）、平均请求延迟、每字对应的音频时长、记录时的并发数
+#   formats 按输出格式记录每秒音频的合并/编码耗时（ffmpeg合并、MP3拼接、HLS分片编码）
+# 每次任务完成后按指数滑动平均更新，近期的网络状况权重更大。
+# 没有该音色的记录时，依次使用同类型音色（标准/精品/大模型）和全部音色的平均值；完全没有记录时无法预估
+import json
+import os
+import threading
+from datetime import datetime
+
+THROUGHPUT_STATS_FILE = 'throughput_stats.json'
+# 滑动平均中新记录的权重
+SMOOTHING = 0.3
+# 各类记录中的可选数值字段（另有必需的runs次数）
+VOICE_FIELDS = ("chars_per_second", "latency", "audio_per_char", "concurrency")
+FORMAT_FIELDS = ("merge_per_audio_second",)
+
+
+def blend(previous, value):
+    return value if previous is None else previous + SMOOTHING * (value - previous)
+
+
+def output_format(output_file):
+    return os.path.splitext(output_file)[1].lower().lstrip(".") or "wav"
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0
+
+
+def valid_entries(entries, fields):
+    """过滤掉格式错误的记录（不是字典、缺少runs或数值字段不是非负数），返回(有效记录, 丢弃数)"""
+    valid = {}
+    for key, entry in entries.items():
+        if isinstance(entry, dict) and isinstance(entry.get("runs"), int) and is_number(entry["runs"]) and \
+                all(entry.get(field) is None or is_number(entry[field]) for field in fields):
+            valid[key] = entry
+    return valid, len(entries) - len(valid)
+
+
+class ThroughputModel:
+    """各音色和输出格式的历史耗时统计（线程安全）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.voices = {}
+        self.formats = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        """读取统计文件，不存在或损坏时从空记录开始"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            voices, formats = data.get("voices", {}), data.get("formats", {})
+            if not isinstance(voices, dict) or not isinstance(formats, dict):
+                raise ValueError("格式错误")
+        except FileNotFoundError:
+            return self
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"读取耗时统计失败，重新开始记录: {e}")
+            return self
+        voices, dropped_voices = valid_entries(voices, VOICE_FIELDS)
+        formats, dropped_formats = valid_entries(formats, FORMAT_FIELDS)
+        if dropped_voices or dropped_formats:
+            print(f"耗时统计中有{dropped_voices + dropped_formats}条记录格式错误，已忽略")
+        with self._lock:
+            self.voices, self.formats = voices, formats
+        return self
+
+    def save(self):
+        with self._lock:
+            data = {"voices": self.voices, "formats": self.formats}
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(temp_path, self.path)
+
+    def record(self, items, output_file, snapshot, concurrency, categories=None):
+        """记录一次成功任务的指标快照（JobMetrics.snapshot()）
+
+        items为[(片段, 音色ID, 语速, 音量), ...]，多音色任务（对话）的各音色都记录整个任务的吞吐；
+        categories为{音色ID: 音色类型}，用于没有记录的音色按类型估算
+        """
+        voices = {str(item[1]) for item in items}
+        network_seconds = snapshot["elapsed"] - snapshot["merge_seconds"]
+        now = datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            # 全部命中缓存的任务不代表网络吞吐，只更新合并耗时
+            if snapshot["chars_requested"] and network_seconds > 0:
+                chars_per_second = snapshot["chars_requested"] / network_seconds
+                audio_per_char = snapshot["audio_seconds"] / snapshot["chars_done"] if snapshot["chars_done"] else None
+                for voice in voices:
+                    entry = self.voices.setdefault(voice, {"runs": 0})
+                    entry["runs"] += 1
+                    entry["chars_per_second"] = blend(entry.get("chars_per_second"), chars_per_second)
+                    if snapshot["mean_latency"] is not None:
+                        entry["latency"] = blend(entry.get("latency"), snapshot["mean_latency"])
+                    if audio_per_char is not None:
+                        entry["audio_per_char"] = blend(entry.get("audio_per_char"), audio_per_char)
+                    entry["concurrency"] = concurrency
+                    entry["updated"] = now
+                    if categories and categories.get(voice):
+                        entry["category"] = categories[voice]
+            if snapshot["audio_seconds"] > 0:
+                entry = self.formats.setdefault(output_format(output_file), {"runs": 0})
+                entry["runs"] += 1
+                entry["merge_per_audio_second"] = blend(entry.get("merge_per_audio_second"),
+                                                        snapshot["merge_seconds"] / snapshot["audio_seconds"])
+                entry["updated"] = now
+
+    def voice_stats(self, voice_type, category=None):
+        """音色的统计记录；没有记录时返回同类型或全部音色的平均值，完全没有记录时返回None"""
+        with self._lock:
+            entry = self.voices.get(str(voice_type))
+            if entry is not None and entry.get("chars_per_second"):
+                return dict(entry)
+            candidates = [e for e in self.voices.values() if e.get("chars_per_second")]
+            same_category = [e for e in candidates if category and e.get("category") == category]
+            candidates = same_category or candidates
+        if not candidates:
+            return None
+        average = {"runs": 0, "concurrency": candidates[0].get("concurrency")}
+        for key in ("chars_per_second", "latency", "audio_per_char"):
+            values = [e[key] for e in candidates if e.get(key) is not None]
+            average[key] = sum(values) / len(values) if values else None
+        return average
+
+    def estimate(self, items, output_file, concurrency, cached=None, categories=None):
+        """预估合成items的耗时，返回(网络耗时, 合并耗时)秒数，没有历史记录时返回None
+
+        重复的片段只计一次，cached(片段, 音色ID, 语速, 音量)返回True的片段视为命中缓存，不计入网络耗时；
+        并发数低于记录时的并发数时按比例放慢（高于时不加快，通常会受QPS限制）
+        """
+        chars, audio_seconds = {}, 0.0
+        network_seconds, longest_latency = 0.0, 0.0
+        seen = set()
+        for item in items:
+            key = str(item[1])
+            chars.setdefault(key, [0, 0])
+            chars[key][0] += len(item[0])
+            # 重复的片段只请求一次
+            if item not in seen and (cached is None or not cached(*item)):
+                chars[key][1] += len(item[0])
+            seen.add(item)
+        for voice, (total, requested) in chars.items():
+            stats = self.voice_stats(voice, (categories or {}).get(voice))
+            if stats is None:
+                return None
+            rate = stats["chars_per_second"]
+            if stats.get("concurrency") and concurrency < stats["concurrency"]:
+                rate *= concurrency / stats["concurrency"]
+            network_seconds += requested / rate
+            if requested and stats.get("latency"):
+                longest_latency = max(longest_latency, stats["latency"])
+            if stats.get("audio_per_char"):
+                audio_seconds += total * stats["audio_per_char"]
+        # 至少需要一次请求的时间
+        network_seconds = max(network_seconds, longest_latency)
+        with self._lock:
+            entry = self.formats.get(output_format(output_file), {})
+        merge_seconds = audio_seconds * entry.get("merge_per_audio_second", 0.0)
+        return network_seconds, merge_seconds
+
+
+_default_model = None
+_default_model_lock = threading.Lock()
+
+
+def get_default_model(path):
+    """进程内共享的耗时模型（首次调用时读取path指定的统计文件）"""
+    global _default_model
+    with _default_model_lock:
+        if _default_model is None:
+            _default_model = ThroughputModel(path).load()
+        return _default_model
+
+
+def format_eta(seconds):
+    """把秒数格式化为“X分Y秒”"""
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}秒"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}分{seconds:02d}秒"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}小时{minutes:02d}分"
@@ -4,17 +4,19 @@ import csv
 import tempfile
 import subprocess
 import datetime
+import threading
+from collections import deque
 from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, 
                             QLabel, QLineEdit, QTextEdit, QScrollArea, QGridLayout,
                             QTabWidget, QFrame, QStackedWidget, QComboBox, QPlainTextEdit,
                             QFileDialog,QMenuBar,QDialog)
-from PyQt5.QtCore import Qt, QSize, QThread, pyqtSignal, QEvent, QUrl
-from PyQt5.QtGui import QPixmap, QIcon, QPainter, QTextCursor, QCursor
+from PyQt5.QtCore import Qt, QSize, QThread, pyqtSignal, QEvent, QUrl, QBuffer, QByteArray, QIODevice, QTimer, QObject, QPointF
+from PyQt5.QtGui import QPixmap, QIcon, QPainter, QTextCursor, QCursor, QPen, QColor, QPolygonF
 from PyQt5.QtSvg import QSvgRenderer
-from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
+from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent, QAudioOutput, QAudioFormat, QAudio
 from qfluentwidgets import (PushButton, TabBar, SearchLineEdit, Slider, 
                            ToggleButton, CardWidget, ToolButton, InfoBar,
-                           FluentIcon, ComboBox,Dialog,MessageBox)
+                           FluentIcon, ComboBox,Dialog,MessageBox,CheckBox)
 import sip
 
 # 资源路径处理
@@ -67,6 +69,25 @@ sys.excepthook = excepthook
 
 # 导入audio_generator模块
 import audio_generator
+from audio_utils import extract_pcm
+import dialogue
+import profiling
+from job_metrics import JobMetrics
+from throughput_model import format_eta
+from scheduler import PRIORITY_BULK, priority_scope
+from waveform import WaveformPeaks, load_waveform, peaks_path
+from sample_pack import SamplePack, PACK_NAME
+
+# 停止输入多久后开始预合成（毫秒）
+PRESYNTHESIS_DEBOUNCE_MS = 1500
+# 日志框批量刷新的间隔（毫秒）
+LOG_FLUSH_INTERVAL_MS = 100
+# 两次刷新之间最多缓冲的日志行数，超出时丢弃最早的行
+LOG_BUFFER_LINES = 500
+# 日志框最多保留的行数
+LOG_MAX_LINES = 2000
+# 合成指标面板的刷新间隔（毫秒）
+METRICS_REFRESH_MS = 250
 
 # 音色信息类
 class VoiceInfo:
@@ -254,37 +275,340 @@ class VoiceCard(CardWidget):
         self.setStyleSheet("background-color: #e0e0e0; border: 2px solid #1890ff; border-radius: 5px;")
         super().mousePressEvent(event)
 
-# 日志输出重定向类
-class LogRedirector:
-    def __init__(self, text_widget):
+# 音色示例音频缓存
+class SamplePreviewCache:
+    """音色示例音频的内存缓存：建立一次音色ID到文件的索引，并在后台预读文件内容
+
+    存在示例音频包（sample_pack.py生成）时通过mmap直接读取，不再逐个打开文件
+    """
+    SAMPLE_DIRS = ["标准音色", "大模型音色", "精品音色"]
+
+    def __init__(self):
+        self._index = None
+        self._data = {}
+        self._pack = None
+        self._pack_paths = {}  # 音频包内示例的虚拟路径 -> 音色ID
+        self._lock = threading.Lock()
+
+    def _build_index(self):
+        """建立音色ID -> 文件路径的索引（优先使用示例音频包）"""
+        pack_path = get_resource_path(PACK_NAME)
+        if os.path.exists(pack_path):
+            try:
+                self._pack = SamplePack(pack_path)
+            except (OSError, ValueError) as e:
+                print(f"打开示例音频包失败，改为读取音频文件: {e}")
+            else:
+                index = {}
+                for voice_id, entry in self._pack.entries.items():
+                    # 虚拟路径仅用于日志和让播放器识别格式
+                    virtual_path = os.path.join(pack_path, entry["category"], entry["name"])
+                    index[voice_id] = virtual_path
+                    self._pack_paths[virtual_path] = voice_id
+                return index
+        
+        # 扫描示例音频目录
+        index = {}
+        for dir_name in self.SAMPLE_DIRS:
+            dir_path = get_resource_path(os.path.join("AudioResources", dir_name))
+            if not os.path.exists(dir_path):
+                continue
+            for file in os.listdir(dir_path):
+                if file.endswith('.mp3') or file.endswith('.wav'):
+                    voice_id = file.split('_', 1)[0]
+                    index.setdefault(voice_id, os.path.join(dir_path, file))
+        return index
+
+    def find(self, voice_id):
+        """查找音色对应的示例音频路径"""
+        with self._lock:
+            if self._index is None:
+                self._index = self._build_index()
+            return self._index.get(str(voice_id))
+
+    def load(self, file_path):
+        """返回示例音频内容（已缓存则直接返回），读取失败返回None"""
+        with self._lock:
+            if file_path in self._pack_paths:
+                return self._pack.get(self._pack_paths[file_path])
+            data = self._data.get(file_path)
+        if data is not None:
+            return data
+        try:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        with self._lock:
+            self._data[file_path] = data
+        return data
+
+    def preload(self, voice_ids):
+        """在后台线程中预读指定音色的示例音频"""
+        if self._pack is not None:
+            # 音频包通过mmap按需读取，无需预读
+            return
+        def worker():
+            for voice_id in voice_ids:
+                file_path = self.find(voice_id)
+                if file_path:
+                    self.load(file_path)
+        threading.Thread(target=worker, name="sample-preload", daemon=True).start()
+
+# 日志缓冲：任意线程写入的日志先放入环形缓冲，由GUI线程定时批量追加到日志框
+class LogSink(QObject):
+    def __init__(self, text_widget, parent=None):
+        super().__init__(parent)
         self.text_widget = text_widget
-        self.buffer = ""
-        
+        # 日志框只保留最近的行，旧行由Qt自动删除
+        self.text_widget.setMaximumBlockCount(LOG_MAX_LINES)
+        self.pending = deque(maxlen=LOG_BUFFER_LINES)
+        self.dropped = 0
+        self.partial = ""
+        self._lock = threading.Lock()
+        self.timer = QTimer(self)
+        self.timer.setInterval(LOG_FLUSH_INTERVAL_MS)
+        self.timer.timeout.connect(self.flush_pending)
+        self.timer.start()
+    
+    def append(self, message):
+        """添加一行日志（可在任意线程调用）"""
+        with self._lock:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append(message)
+    
     def write(self, text):
-        self.buffer += text
-        if text.endswith('\n'):
-            self.text_widget.appendPlainText(self.buffer.rstrip())
-            self.buffer = ""
-            # 自动滚动到底部
-            self.text_widget.moveCursor(QTextCursor.End)
+        """文件接口，可用于重定向print输出，按整行缓冲"""
+        with self._lock:
+            self.partial += text
+            *lines, self.partial = self.partial.split("\n")
+        for line in lines:
+            if line.strip():
+                self.append(line.rstrip())
     
     def flush(self):
-        if self.buffer:
-            self.text_widget.appendPlainText(self.buffer)
-            self.buffer = ""
+        # 文件接口要求的方法，实际由定时器刷新
+        pass
+    
+    def clear(self):
+        """清空日志框和尚未刷新的日志"""
+        with self._lock:
+            self.pending.clear()
+            self.dropped = 0
+        self.text_widget.clear()
+    
+    def flush_pending(self):
+        """把缓冲的日志一次性追加到日志框（GUI线程）"""
+        with self._lock:
+            if not self.pending:
+                return
+            lines = list(self.pending)
+            self.pending.clear()
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            lines.insert(0, f"……日志过多，省略了{dropped}行")
+        self.text_widget.appendPlainText("\n".join(lines))
+        # 自动滚动到底部
+        self.text_widget.moveCursor(QTextCursor.End)
+
+# 边合成边播放使用的音频数据源
+class ProgressiveAudioDevice(QIODevice):
+    """可持续追加PCM数据的只读设备，供QAudioOutput在合成过程中拉取播放"""
+
+    # 已读取的数据超过该字节数时从缓冲区删除，避免长文本播放时内存持续增长
+    COMPACT_THRESHOLD = 1024 * 1024
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.data = bytearray()
+        self.read_pos = 0
+        self.finished = False
+
+    def append(self, pcm):
+        """追加新合成片段的PCM数据"""
+        self.data.extend(pcm)
+        self.readyRead.emit()
+
+    def finish(self):
+        """标记所有片段都已追加"""
+        self.finished = True
+        self.readyRead.emit()
+
+    def is_drained(self):
+        return self.finished and self.read_pos >= len(self.data)
+
+    def isSequential(self):
+        return True
+
+    def atEnd(self):
+        # 合成尚未结束时数据源不算结束，避免播放器提前停止
+        return self.is_drained()
+
+    def bytesAvailable(self):
+        return len(self.data) - self.read_pos + super().bytesAvailable()
+
+    def readData(self, maxlen):
+        chunk = bytes(self.data[self.read_pos:self.read_pos + maxlen])
+        self.read_pos += len(chunk)
+        if self.read_pos >= self.COMPACT_THRESHOLD:
+            del self.data[:self.read_pos]
+            self.read_pos = 0
+        return chunk
+
+    def writeData(self, data):
+        return -1
+
+# 请求延迟曲线：按顺序绘制最近的片段请求延迟
+class LatencySparkline(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.latencies = []
+        self.setFixedSize(160, 36)
+
+    def set_latencies(self, latencies):
+        self.latencies = latencies
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.fillRect(self.rect(), QColor("#f5f5f5"))
+        if len(self.latencies) < 2:
+            return
+        width, height = self.width() - 4, self.height() - 4
+        peak = max(self.latencies) or 1.0
+        step = width / (len(self.latencies) - 1)
+        points = QPolygonF([QPointF(2 + i * step, 2 + height * (1 - latency / peak))
+                            for i, latency in enumerate(self.latencies)])
+        painter.setPen(QPen(QColor("#0078d4"), 1.5))
+        painter.drawPolyline(points)
+
+# 合成指标面板：由合成线程的JobMetrics定时刷新
+class MetricsPanel(QFrame):
+    FIELDS = [
+        ("segments", "片段"),
+        ("eta", "预计剩余"),
+        ("in_flight", "在途请求"),
+        ("throughput", "吞吐"),
+        ("latency", "平均延迟"),
+        ("retries", "重试"),
+        ("wait", "排队等待"),
+        ("merge", "合并耗时"),
+        ("cache", "缓存命中率"),
+    ]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setFrameShape(QFrame.StyledPanel)
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(8, 4, 8, 4)
+        grid = QGridLayout()
+        self.value_labels = {}
+        for i, (key, title) in enumerate(self.FIELDS):
+            row, column = divmod(i, 5)
+            value = QLabel("-")
+            value.setMinimumWidth(80)
+            grid.addWidget(QLabel(f"{title}:"), row, column * 2)
+            grid.addWidget(value, row, column * 2 + 1)
+            self.value_labels[key] = value
+        layout.addLayout(grid, 1)
+        self.sparkline = LatencySparkline(self)
+        self.sparkline.setToolTip("最近的片段请求延迟")
+        layout.addWidget(self.sparkline)
+        # 排队等待高说明受并发或QPS限制，限流重试多说明被服务端限流，合并耗时高说明瓶颈在编码
+        self.setToolTip("排队等待：等待并发名额或凭证QPS的累计时间\n"
+                        "重试：括号内为因限流或额度换凭证重试的次数\n"
+                        "合并耗时：ffmpeg合并编码或MP3拼接的时间\n"
+                        "预计剩余：开始时按同音色的历史任务预估，随进度逐渐改用本次的实际吞吐")
+
+    def update_metrics(self, s):
+        labels = self.value_labels
+        labels["segments"].setText(f"{s['segments_done']}/{s['segments_total']}")
+        labels["eta"].setText("-" if s["eta"] is None else format_eta(s["eta"]))
+        labels["in_flight"].setText(str(s["in_flight"]))
+        labels["throughput"].setText(f"{s['chars_per_second']:.1f} 字/秒")
+        mean = s["mean_latency"]
+        labels["latency"].setText("-" if mean is None else f"{mean * 1000:.0f} 毫秒")
+        labels["retries"].setText(f"{s['retries']}（限流 {s['throttled']}）")
+        labels["wait"].setText(f"{s['wait_seconds']:.1f} 秒")
+        labels["merge"].setText(f"{s['merge_seconds']:.1f} 秒")
+        rate = s["cache_hit_rate"]
+        labels["cache"].setText("-" if rate is None else f"{rate:.0%}（{s['cache_hits']}）")
+        self.sparkline.set_latencies(s["latencies"])
+
+# 波形概览：显示整段音频的峰值和播放位置，点击跳转
+class WaveformView(QWidget):
+    seek_requested = pyqtSignal(float)  # 信号：请求跳转(0到1之间的位置)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.peaks = None
+        self.position = 0.0
+        self._columns = []
+        self._columns_key = None
+        self.setFixedHeight(56)
+        self.setCursor(Qt.PointingHandCursor)
+        self.setToolTip("点击跳转到对应位置")
+
+    def set_peaks(self, peaks):
+        self.peaks = peaks
+        self.position = 0.0
+        self.update()
+
+    def set_position(self, position):
+        self.position = position
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("#f5f5f5"))
+        if self.peaks is None or not len(self.peaks):
+            return
+        # 峰值数量或宽度变化时才重新合并列（合成过程中会不断追加）
+        key = (len(self.peaks), self.width())
+        if key != self._columns_key:
+            self._columns = self.peaks.columns(self.width())
+            self._columns_key = key
+        middle = self.height() / 2
+        played = int(self.position * len(self._columns))
+        for x, (low, high) in enumerate(self._columns):
+            painter.setPen(QColor("#0078d4" if x < played else "#9cc3e6"))
+            painter.drawLine(x, int(middle - high * middle), x, int(middle - low * middle))
+        painter.setPen(QPen(QColor("#d13438"), 1))
+        painter.drawLine(played, 0, played, self.height())
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton and self.peaks is not None and self.width() > 0:
+            self.seek_requested.emit(min(max(event.x() / self.width(), 0.0), 1.0))
 
 # 创建一个线程类来运行语音合成任务
 class SynthesisThread(QThread):
     synthesis_complete = pyqtSignal(bool, str)  # 信号：合成完成(成功/失败, 输出文件路径)
     progress_update = pyqtSignal(str)  # 信号：进度更新
+    segment_ready = pyqtSignal(int, int, bytes)  # 信号：片段就绪(序号, 片段总数, WAV数据)
 
-    def __init__(self, voice_id, text, speed, volume, output_path):
+    def __init__(self, voice_id, text, speed, volume, output_path, dialogue_mode=False, log_sink=None,
+                 profile=False):
         super().__init__()
+        # 设置log_sink时，合成过程中的print输出直接写入日志缓冲，不再逐行发送信号
+        self.log_sink = log_sink
         self.voice_id = voice_id
         self.text = text
         self.speed = speed
         self.volume = volume
         self.output_path = output_path
+        # 对话脚本模式：按角色标签使用不同音色，选中的音色用于没有标签的行
+        self.dialogue_mode = dialogue_mode
+        self.cancel_token = audio_generator.CancelToken()
+        # 实时指标，由指标面板定时读取
+        self.metrics = JobMetrics()
+        # 调试用的性能剖析，结果保存在输出文件旁
+        self.profiler = profiling.JobProfiler() if profile else None
+
+    def cancel(self):
+        """请求取消合成（等待中的片段会尽快放弃）"""
+        self.cancel_token.cancel()
 
     def run(self):
         try:
@@ -304,13 +628,38 @@ class SynthesisThread(QThread):
             original_stdout = sys.stdout
             sys.stdout = self
 
-            # 调用audio_generator的text_to_speech函数
-            self.progress_update.emit("调用text_to_speech函数...")
-            success = audio_generator.text_to_speech(
-                text=cleaned_text,  # 使用清理后的文本
-                output_file=self.output_path,
-                voice_type=int(self.voice_id)
-            )
+            if self.profiler is not None:
+                self.profiler.start()
+            try:
+                if self.dialogue_mode:
+                    self.progress_update.emit("按对话脚本合成...")
+                    success = dialogue.dialogue_to_speech(
+                        cleaned_text,
+                        self.output_path,
+                        default_voice=int(self.voice_id),
+                        default_speed=self.speed,
+                        default_volume=self.volume,
+                        on_segment=self.emit_segment,
+                        cancel_token=self.cancel_token,
+                        metrics=self.metrics
+                    )
+                else:
+                    # 调用audio_generator的text_to_speech函数
+                    self.progress_update.emit("调用text_to_speech函数...")
+                    success = audio_generator.text_to_speech(
+                        text=cleaned_text,  # 使用清理后的文本
+                        output_file=self.output_path,
+                        voice_type=int(self.voice_id),
+                        speed=self.speed,
+                        volume=self.volume,
+                        on_segment=self.emit_segment,
+                        cancel_token=self.cancel_token,
+                        metrics=self.metrics
+                    )
+            finally:
+                if self.profiler is not None:
+                    self.profiler.stop()
+                    audio_generator.save_profile(self.profiler, self.output_path)
 
             # 恢复原始stdout
             sys.stdout = original_stdout
@@ -322,15 +671,72 @@ class SynthesisThread(QThread):
             self.progress_update.emit(f"合成过程出错: {str(e)}")
             self.synthesis_complete.emit(False, "")
 
+    def emit_segment(self, index, total, audio_data):
+        """发送片段就绪信号（剖析时计入Qt信号阶段）"""
+        with profiling.stage("qt_signal"):
+            self.segment_ready.emit(index, total, audio_data)
+
     def write(self, text):
         # 捕获print输出并发送为进度更新
-        if text.strip():
-            self.progress_update.emit(text.strip())
+        if self.log_sink is not None:
+            self.log_sink.write(text)
+        elif text.strip():
+            with profiling.stage("qt_signal"):
+                self.progress_update.emit(text.strip())
             
     def flush(self):
         # 必须有的方法，用于io操作
         pass
 
+# 快速预览线程：只合成开头的片段，就绪后立即播放，不合并完整音频
+class PreviewThread(QThread):
+    preview_complete = pyqtSignal(bool)  # 信号：预览结束(成功/失败)
+    segment_ready = pyqtSignal(int, int, bytes)  # 信号：片段就绪(序号, 片段总数, WAV数据)
+
+    def __init__(self, items):
+        super().__init__()
+        self.items = items  # [(片段, 音色ID, 语速, 音量), ...]
+        self.cancel_token = audio_generator.CancelToken()
+
+    def cancel(self):
+        self.cancel_token.cancel()
+
+    def run(self):
+        audio_data = audio_generator.preview_speech(self.items, on_segment=self.segment_ready.emit,
+                                                    cancel_token=self.cancel_token)
+        self.preview_complete.emit(audio_data is not None)
+
+# 后台预合成线程：在用户编辑文本时提前合成已完成的段落
+class PresynthesisThread(QThread):
+    presynthesis_done = pyqtSignal(int, int, str)  # 信号：预合成结束(就绪片段数, 片段总数, 错误信息)
+
+    def __init__(self, items):
+        super().__init__()
+        self.items = items  # [(片段, 音色ID, 语速, 音量), ...]
+        self.stopped = False
+
+    def stop(self):
+        """请求停止（在片段之间检查）"""
+        self.stopped = True
+
+    def run(self):
+        session = audio_generator.get_default_session()
+        ready = 0
+        error = ""
+        # 预合成以批量优先级申请并发名额，不影响点击合成后的请求
+        with priority_scope(PRIORITY_BULK):
+            for segment, voice_id, speed, volume in self.items:
+                if self.stopped:
+                    break
+                try:
+                    if not session.is_cached(segment, int(voice_id), speed, volume):
+                        session.fetch_segment(segment, int(voice_id), speed, volume)
+                    ready += 1
+                except Exception as e:
+                    error = str(e)
+                    break
+        self.presynthesis_done.emit(ready, len(self.items), error)
+
 class TTSApp(QWidget):
     def __init__(self):
         super().__init__()
@@ -355,6 +761,36 @@ class TTSApp(QWidget):
         # 跟踪当前正在播放示例音频的音色卡片
         self.current_playing_card = None
         
+        # 当前的合成线程和预览线程
+        self.synthesis_thread = None
+        self.preview_thread = None
+        # 已取消但仍在运行的预览线程，保留引用直到线程结束，避免QThread运行中被销毁
+        self.cancelled_previews = []
+        
+        # 合成过程中定时刷新指标面板
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.setInterval(METRICS_REFRESH_MS)
+        self.metrics_timer.timeout.connect(self.refresh_metrics)
+        
+        # 预合成线程和防抖定时器（输入停止一段时间后才开始预合成）
+        self.presynthesis_thread = None
+        self.presynthesis_timer = QTimer(self)
+        self.presynthesis_timer.setSingleShot(True)
+        self.presynthesis_timer.setInterval(PRESYNTHESIS_DEBOUNCE_MS)
+        self.presynthesis_timer.timeout.connect(self.start_presynthesis)
+        
+        # 边合成边播放的音频输出和数据源
+        self.progressive_output = None
+        self.progressive_device = None
+        
+        # 合成过程中按片段增量计算的波形峰值
+        self.waveform_peaks = None
+        
+        # 示例音频内存缓存，以及当前播放使用的内存缓冲区和它引用的音频数据
+        self.sample_cache = SamplePreviewCache()
+        self.sample_buffer = None
+        self.sample_data = None
+        
         self.load_voice_types()
         self.initUI()
 
@@ -439,22 +875,7 @@ class TTSApp(QWidget):
     
     def find_audio_sample(self, voice_id):
         """查找音色对应的示例音频"""
-        voice_id_str = str(voice_id)
-        
-        # 使用get_resource_path获取音频目录
-        audio_dirs = [
-            get_resource_path(os.path.join("AudioResources", "标准音色")),
-            get_resource_path(os.path.join("AudioResources", "大模型音色")),
-            get_resource_path(os.path.join("AudioResources", "精品音色"))
-        ]
-        
-        for dir_path in audio_dirs:
-            if os.path.exists(dir_path):
-                for file in os.listdir(dir_path):
-                    if file.startswith(voice_id_str) and (file.endswith('.mp3') or file.endswith('.wav')):
-                        return os.path.join(dir_path, file)
-        
-        return None
+        return self.sample_cache.find(voice_id)
 
     def create_menu_bar(self):
         """创建菜单栏"""
@@ -697,6 +1118,21 @@ class TTSApp(QWidget):
         self.synthesize_button.setEnabled(False)  # 初始时禁用按钮
         bottom_controls.addWidget(self.synthesize_button)
         
+        # 预览按钮：只合成开头的片段并立即播放，用于调整音色、语速和音量
+        self.preview_button = PushButton("预览")
+        self.preview_button.setIcon(FluentIcon.PLAY)
+        self.preview_button.setFixedSize(80, 36)
+        self.preview_button.setEnabled(False)
+        self.preview_button.setToolTip("只合成第一个片段并立即播放，不保存完整音频")
+        bottom_controls.addWidget(self.preview_button)
+        
+        # 取消按钮（合成过程中可用）
+        self.cancel_button = PushButton("取消")
+        self.cancel_button.setIcon(FluentIcon.CLOSE)
+        self.cancel_button.setFixedSize(80, 36)
+        self.cancel_button.setEnabled(False)
+        bottom_controls.addWidget(self.cancel_button)
+        
         # 下载按钮 -> 修改为打开文件夹按钮
         self.folder_button = ToolButton()
         self.folder_button.setIcon(FluentIcon.FOLDER)
@@ -725,6 +1161,45 @@ class TTSApp(QWidget):
         
         right_layout.addLayout(bottom_controls)
         
+        # 波形概览（点击跳转）
+        self.waveform_view = WaveformView()
+        self.waveform_view.seek_requested.connect(self.seek_to_fraction)
+        right_layout.addWidget(self.waveform_view)
+        
+        # 边合成边播放开关
+        self.progressive_checkbox = CheckBox("边合成边播放")
+        self.progressive_checkbox.setChecked(True)
+        self.progressive_checkbox.setToolTip("第一个片段合成后立即开始播放，后续片段合成后依次追加")
+        right_layout.addWidget(self.progressive_checkbox)
+        
+        # 预合成开关（默认关闭，会在输入时提前消耗合成额度）
+        self.presynthesis_checkbox = CheckBox("输入时预合成")
+        self.presynthesis_checkbox.setChecked(False)
+        self.presynthesis_checkbox.setToolTip("停止输入后在后台合成已完成的段落，点击合成时只需请求有改动的片段")
+        self.presynthesis_checkbox.toggled.connect(self.on_presynthesis_toggled)
+        right_layout.addWidget(self.presynthesis_checkbox)
+        
+        # 对话脚本模式
+        self.dialogue_checkbox = CheckBox("对话脚本")
+        self.dialogue_checkbox.setChecked(False)
+        self.dialogue_checkbox.setToolTip("按角色标签使用不同音色合成，例如：\n"
+                                          "@旁白 101011\n@小明 智宇 speed=0.5 volume=6\n"
+                                          "旁白：很久以前……\n小明：我们出发吧！\n"
+                                          "没有角色标签的行使用选中的音色")
+        self.dialogue_checkbox.toggled.connect(self.schedule_presynthesis)
+        right_layout.addWidget(self.dialogue_checkbox)
+        
+        # 性能剖析（调试用）
+        self.profile_checkbox = CheckBox("性能剖析")
+        self.profile_checkbox.setChecked(False)
+        self.profile_checkbox.setToolTip("用cProfile记录本次合成的函数耗时和各阶段耗时（网络、解码、文件读写、ffmpeg、Qt信号），\n"
+                                         "结果保存在音频文件旁（_profile.pstats和_profile.txt），可附在问题反馈中；会略微拖慢合成")
+        right_layout.addWidget(self.profile_checkbox)
+        
+        # 合成指标面板
+        self.metrics_panel = MetricsPanel()
+        right_layout.addWidget(self.metrics_panel)
+        
         # 添加日志输出区域
         log_layout = QVBoxLayout()
         
@@ -747,8 +1222,8 @@ class TTSApp(QWidget):
         self.log_output.setStyleSheet("background-color: #f5f5f5; font-family: Consolas, Monaco, monospace;")
         log_layout.addWidget(self.log_output)
         
-        # 重定向标准输出到日志框
-        self.log_redirector = LogRedirector(self.log_output)
+        # 日志先写入缓冲，定时批量刷新到日志框
+        self.log_sink = LogSink(self.log_output, self)
         
         right_layout.addLayout(log_layout)
         
@@ -765,12 +1240,17 @@ class TTSApp(QWidget):
         self.speed_slider.valueChanged.connect(self.update_speed_value)
         self.volume_slider.valueChanged.connect(self.update_volume_value)
         self.synthesize_button.clicked.connect(self.on_synthesize)
+        self.preview_button.clicked.connect(self.on_preview)
+        self.cancel_button.clicked.connect(self.on_cancel_synthesis)
         self.play_button.clicked.connect(self.on_play_audio)
         self.search_box.textChanged.connect(self.filter_voices)
         self.scene_combo.currentTextChanged.connect(self.on_scene_changed)
         self.gender_combo.currentTextChanged.connect(self.on_gender_changed)
         self.type_combo.currentTextChanged.connect(self.on_type_changed)
         self.text_input.textChanged.connect(self.check_text_length)  # 添加文本变化监听
+        self.text_input.textChanged.connect(self.schedule_presynthesis)
+        self.speed_slider.valueChanged.connect(self.schedule_presynthesis)
+        self.volume_slider.valueChanged.connect(self.schedule_presynthesis)
         
         # 输出初始化信息
         self.log("语音合成工具初始化完成")
@@ -781,16 +1261,15 @@ class TTSApp(QWidget):
         text = self.text_input.toPlainText()
         has_text = len(text.strip()) > 0
         self.synthesize_button.setEnabled(has_text)
+        self.preview_button.setEnabled(has_text)
     
     def log(self, message):
-        """添加日志到输出框"""
-        self.log_output.appendPlainText(message)
-        # 自动滚动到底部
-        self.log_output.moveCursor(QTextCursor.End)
+        """添加日志到输出框（批量刷新）"""
+        self.log_sink.append(message)
     
     def clear_log(self):
         """清除日志"""
-        self.log_output.clear()
+        self.log_sink.clear()
         self.log("日志已清除")
     
     def update_voice_list(self):
@@ -890,8 +1369,11 @@ class TTSApp(QWidget):
             no_voice_label.setAlignment(Qt.AlignCenter)
             left_layout.addWidget(no_voice_label)
         
+        # 在后台预读当前显示音色的示例音频，试听时直接从内存播放
+        self.sample_cache.preload([voice.voice_id for voice in voices_to_display])
+        
         # 记录筛选结果
-        if hasattr(self, 'log_output'):
+        if hasattr(self, 'log_sink'):
             self.log(f"显示 {len(voices_to_display)} 种音色")
     
     def on_scene_changed(self, scene_text):
@@ -962,6 +1444,7 @@ class TTSApp(QWidget):
         
         # 记录选择的音色
         self.log(f"已选择音色: {voice_info.name} (ID: {voice_info.voice_id})")
+        self.schedule_presynthesis()
     
     def update_speed_value(self, value):
         """更新语速值显示"""
@@ -972,6 +1455,91 @@ class TTSApp(QWidget):
         """更新音量值显示"""
         self.volume_value.setText(str(value))
     
+    def get_app_dir(self):
+        """获取应用程序所在目录"""
+        if hasattr(sys, '_MEIPASS'):
+            # PyInstaller打包后，使用可执行文件所在目录
+            return os.path.dirname(sys.executable)
+        # 开发环境，使用当前脚本所在目录
+        return os.path.dirname(os.path.abspath(__file__))
+    
+    def on_presynthesis_toggled(self, checked):
+        """开启预合成时为默认会话配置本地片段存储"""
+        session = audio_generator.get_default_session()
+        if checked:
+            if session.segment_store is None:
+                store_dir = os.path.join(self.get_app_dir(), "Cache", "segments")
+                try:
+                    session.segment_store = audio_generator.DiskSegmentStore(store_dir)
+                except OSError as e:
+                    self.log(f"创建预合成片段目录失败，仅使用内存缓存: {str(e)}")
+            self.log("已开启输入时预合成")
+            self.schedule_presynthesis()
+        else:
+            self.presynthesis_timer.stop()
+            if self.presynthesis_thread is not None:
+                self.presynthesis_thread.stop()
+            self.log("已关闭输入时预合成")
+    
+    def schedule_presynthesis(self, *args):
+        """文本或参数变化后重新计时，停止输入一段时间后才开始预合成"""
+        if self.presynthesis_checkbox.isChecked():
+            self.presynthesis_timer.start()
+    
+    def current_synthesis_params(self):
+        """返回当前选择的(音色ID, 语速, 音量)，未选择音色时返回None"""
+        if not (hasattr(self, 'selected_voice') and hasattr(self.selected_voice, 'voice_info')):
+            return None
+        speed = self.speed_slider.value() / 10.0  # 转换为实际值(-2.0到2.0)
+        return self.selected_voice.voice_info.voice_id, speed, self.volume_slider.value()
+    
+    def synthesis_items(self, text, voice_id, speed, volume):
+        """按当前模式把文本切分为[(片段, 音色ID, 语速, 音量), ...]，对话脚本有误时抛出DialogueScriptError"""
+        if self.dialogue_checkbox.isChecked():
+            return dialogue.script_segments(text, voice_id, speed, volume)
+        return [(segment, voice_id, speed, volume)
+                for segment in audio_generator.split_text_for_voice(text, voice_id)]
+    
+    def start_presynthesis(self):
+        """在后台预合成已完成编辑的段落"""
+        if not self.presynthesis_checkbox.isChecked():
+            return
+        # 合成进行中或上一轮预合成尚未结束时，稍后再试
+        synthesis_thread = getattr(self, 'synthesis_thread', None)
+        if (synthesis_thread is not None and synthesis_thread.isRunning()) or \
+                (self.presynthesis_thread is not None and self.presynthesis_thread.isRunning()):
+            if self.presynthesis_thread is not None:
+                self.presynthesis_thread.stop()
+            self.presynthesis_timer.start()
+            return
+        params = self.current_synthesis_params()
+        if params is None:
+            return
+        
+        voice_id, speed, volume = params
+        text = self.text_input.toPlainText()
+        try:
+            items = self.synthesis_items(text, voice_id, speed, volume)
+        except dialogue.DialogueScriptError:
+            # 脚本可能仍在编辑中，等格式正确后再预合成
+            return
+        # 最后一段可能仍在编辑中，文本以换行结尾时才认为它已完成
+        if items and not text.endswith("\n"):
+            items = items[:-1]
+        if not items:
+            return
+        
+        self.presynthesis_thread = PresynthesisThread(items)
+        self.presynthesis_thread.presynthesis_done.connect(self.on_presynthesis_done)
+        self.presynthesis_thread.start()
+    
+    def on_presynthesis_done(self, ready, total, error):
+        """预合成结束"""
+        if error:
+            self.log(f"预合成失败: {error}")
+        elif ready:
+            self.log(f"预合成：{ready}/{total} 个已完成段落已就绪")
+    
     def on_synthesize(self):
         """合成按钮点击事件"""
         text = self.text_input.toPlainText()
@@ -1010,7 +1578,9 @@ class TTSApp(QWidget):
         
         # 禁用UI控件，防止重复操作
         self.synthesize_button.setEnabled(False)
+        self.preview_button.setEnabled(False)
         self.text_input.setReadOnly(True)
+        self.cancel_button.setEnabled(True)
         
         # 显示正在处理消息 - 不保存对象引用，避免线程安全问题
         InfoBar.info(
@@ -1020,13 +1590,22 @@ class TTSApp(QWidget):
             parent=self
         )
         
+        # 停止预合成，剩余片段由合成线程请求
+        self.presynthesis_timer.stop()
+        if self.presynthesis_thread is not None:
+            self.presynthesis_thread.stop()
+        if self.presynthesis_checkbox.isChecked():
+            session = audio_generator.get_default_session()
+            try:
+                items = self.synthesis_items(text, voice_id, speed, volume)
+            except dialogue.DialogueScriptError:
+                items = []
+            ready = sum(1 for segment, item_voice, item_speed, item_volume in items
+                        if session.is_cached(segment, int(item_voice), item_speed, item_volume))
+            self.log(f"- 已预合成片段: {ready}/{len(items)}")
+        
         # 获取应用程序所在目录
-        if hasattr(sys, '_MEIPASS'):
-            # PyInstaller打包后，使用可执行文件所在目录
-            app_dir = os.path.dirname(sys.executable)
-        else:
-            # 开发环境，使用当前脚本所在目录
-            app_dir = os.path.dirname(os.path.abspath(__file__))
+        app_dir = self.get_app_dir()
         
         # 创建Audios目录（如果不存在）
         audio_dir = os.path.join(app_dir, "Audios")
@@ -1053,14 +1632,163 @@ class TTSApp(QWidget):
         
         self.log(f"音频将保存至: {output_path}")
         
+        # 停止上一次的播放和进行中的预览
+        self.cancel_preview()
+        self.stop_progressive_playback()
+        self.media_player.stop()
+        
         # 创建并启动合成线程
-        self.synthesis_thread = SynthesisThread(voice_id, text, speed, volume, output_path)
+        self.synthesis_thread = SynthesisThread(voice_id, text, speed, volume, output_path,
+                                                self.dialogue_checkbox.isChecked(), self.log_sink,
+                                                self.profile_checkbox.isChecked())
         self.synthesis_thread.progress_update.connect(self.log)
         self.synthesis_thread.synthesis_complete.connect(self.on_synthesis_complete)
+        if self.progressive_checkbox.isChecked():
+            self.synthesis_thread.segment_ready.connect(self.on_segment_ready)
+        self.waveform_peaks = None
+        self.waveform_view.set_peaks(None)
+        self.synthesis_thread.segment_ready.connect(self.on_segment_waveform)
         self.synthesis_thread.start()
+        self.refresh_metrics()
+        self.metrics_timer.start()
+
+    def refresh_metrics(self):
+        """用合成线程的实时指标刷新指标面板"""
+        if self.synthesis_thread is not None:
+            self.metrics_panel.update_metrics(self.synthesis_thread.metrics.snapshot())
+
+    def on_preview(self):
+        """预览按钮点击事件：合成第一个片段并边合成边播放"""
+        params = self.current_synthesis_params()
+        if params is None:
+            self.log("错误: 未选择音色")
+            return
+        voice_id, speed, volume = params
+        try:
+            items = audio_generator.preview_items(
+                self.synthesis_items(self.text_input.toPlainText(), voice_id, speed, volume))
+        except dialogue.DialogueScriptError as e:
+            self.log(f"对话脚本有误: {e}")
+            return
+        if not items:
+            return
+        
+        # 取消上一次预览，停止当前播放
+        self.cancel_preview()
+        self.stop_progressive_playback()
+        self.media_player.stop()
+        
+        self.log(f"预览开头{len(items[0][0])}字（音色{voice_id}，语速{speed:.1f}，音量{volume}）")
+        self.preview_thread = PreviewThread(items)
+        self.preview_thread.segment_ready.connect(self.on_segment_ready)
+        self.preview_thread.preview_complete.connect(self.on_preview_complete)
+        self.preview_thread.start()
+    
+    def cancel_preview(self):
+        """取消进行中的预览，之后就绪的片段不再播放"""
+        if self.preview_thread is not None and self.preview_thread.isRunning():
+            self.preview_thread.segment_ready.disconnect(self.on_segment_ready)
+            self.preview_thread.cancel()
+            self.preview_thread.finished.connect(self.on_cancelled_preview_finished)
+            if not self.preview_thread.isFinished():
+                self.cancelled_previews.append(self.preview_thread)
+    
+    def on_cancelled_preview_finished(self):
+        """已取消的预览线程结束后释放引用"""
+        thread = self.sender()
+        if thread in self.cancelled_previews:
+            self.cancelled_previews.remove(thread)
+    
+    def on_preview_complete(self, success):
+        """预览片段全部就绪后结束数据源，播放完即停止"""
+        if self.sender() is not self.preview_thread:
+            return
+        if success and self.progressive_device is not None:
+            self.progressive_device.finish()
+        elif not success:
+            self.stop_progressive_playback()
+            if not self.preview_thread.cancel_token.cancelled:
+                self.log("预览合成失败")
+
+    def on_cancel_synthesis(self):
+        """取消按钮点击事件"""
+        if self.synthesis_thread is not None and self.synthesis_thread.isRunning():
+            self.log("正在取消合成...")
+            self.cancel_button.setEnabled(False)
+            self.synthesis_thread.cancel()
+
+    def on_segment_ready(self, index, total, audio_data):
+        """片段就绪后追加到边合成边播放的数据源"""
+        try:
+            fmt, pcm = extract_pcm(audio_data)
+        except ValueError as e:
+            self.log(f"片段 {index+1} 音频格式无法识别，停止边合成边播放: {e}")
+            self.stop_progressive_playback()
+            return
+        
+        if self.progressive_device is None:
+            if index != 0:
+                return
+            audio_format = QAudioFormat()
+            audio_format.setSampleRate(fmt["sample_rate"])
+            audio_format.setChannelCount(fmt["channels"])
+            audio_format.setSampleSize(fmt["bits_per_sample"])
+            audio_format.setCodec("audio/pcm")
+            audio_format.setByteOrder(QAudioFormat.LittleEndian)
+            audio_format.setSampleType(QAudioFormat.SignedInt)
+            
+            self.progressive_device = ProgressiveAudioDevice(self)
+            self.progressive_device.open(QIODevice.ReadOnly)
+            self.progressive_output = QAudioOutput(audio_format, self)
+            self.progressive_output.stateChanged.connect(self.progressive_state_changed)
+            self.progressive_device.append(pcm)
+            self.progressive_output.start(self.progressive_device)
+            self.play_button.setIcon(FluentIcon.PAUSE)
+            self.log(f"开始边合成边播放（共{total}个片段）")
+        else:
+            self.progressive_device.append(pcm)
+
+    def on_segment_waveform(self, index, total, audio_data):
+        """片段就绪后追加到波形概览"""
+        try:
+            fmt, pcm = extract_pcm(audio_data)
+        except ValueError:
+            return
+        if self.waveform_peaks is None:
+            if index != 0 or fmt["audio_format"] != 1 or fmt["bits_per_sample"] != 16:
+                return
+            self.waveform_peaks = WaveformPeaks(fmt["sample_rate"], fmt["channels"])
+            self.waveform_view.set_peaks(self.waveform_peaks)
+        self.waveform_peaks.append_pcm(pcm)
+        self.waveform_view.update()
+
+    def progressive_state_changed(self, state):
+        """数据源播放完毕后释放边合成边播放的输出"""
+        if state == QAudio.IdleState and self.progressive_device and self.progressive_device.is_drained():
+            self.stop_progressive_playback()
+        elif state == QAudio.ActiveState:
+            self.play_button.setIcon(FluentIcon.PAUSE)
+        elif state == QAudio.SuspendedState:
+            self.play_button.setIcon(FluentIcon.PLAY)
+
+    def stop_progressive_playback(self):
+        """停止并释放边合成边播放的输出"""
+        if self.progressive_output is not None:
+            self.progressive_output.stateChanged.disconnect(self.progressive_state_changed)
+            self.progressive_output.stop()
+            self.progressive_output.deleteLater()
+            self.progressive_output = None
+        if self.progressive_device is not None:
+            self.progressive_device.close()
+            self.progressive_device.deleteLater()
+            self.progressive_device = None
+        self.play_button.setIcon(FluentIcon.PLAY)
 
     def on_synthesis_complete(self, success, output_path):
         """语音合成完成后的处理"""
+        self.metrics_timer.stop()
+        self.refresh_metrics()
+        self.log(self.synthesis_thread.metrics.summary())
         if success:
             self.log("语音合成成功！")
             InfoBar.info(
@@ -1072,9 +1800,30 @@ class TTSApp(QWidget):
             # 保存当前合成的音频文件路径，以便播放
             self.current_audio_file = output_path
             
-            # 自动播放合成的音频
-            self.play_audio_file(output_path)
+            # 合成时增量计算的波形写入缓存，播放时不必再读取整个文件
+            if self.waveform_peaks is not None:
+                self.waveform_peaks.finish()
+                try:
+                    self.waveform_peaks.save(peaks_path(output_path), output_path)
+                except OSError as e:
+                    self.log(f"保存波形缓存失败: {str(e)}")
+            
+            if self.progressive_device is not None:
+                # 已在边合成边播放，播放完剩余片段即可
+                self.progressive_device.finish()
+            else:
+                # 自动播放合成的音频
+                self.play_audio_file(output_path)
+        elif self.synthesis_thread.cancel_token.cancelled:
+            self.stop_progressive_playback()
+            self.log("语音合成已取消。")
+            InfoBar.warning(
+                title="已取消",
+                content="语音合成已取消。",
+                parent=self
+            )
         else:
+            self.stop_progressive_playback()
             self.log("语音合成失败。")
             InfoBar.error(
                 title="失败",
@@ -1084,6 +1833,8 @@ class TTSApp(QWidget):
         
         # 启用UI控件，允许重复操作
         self.synthesize_button.setEnabled(True)
+        self.preview_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
         self.text_input.setReadOnly(False)
     
     def play_audio_file(self, file_path):
@@ -1100,6 +1851,7 @@ class TTSApp(QWidget):
             media_content = QMediaContent(QUrl.fromLocalFile(file_path))
             self.media_player.setMedia(media_content)
             self.media_player.play()
+            self.show_waveform(file_path)
             
             # 启用进度条
             self.progress_slider.setEnabled(True)
@@ -1113,6 +1865,24 @@ class TTSApp(QWidget):
             self.log(f"播放音频失败: {str(e)}")
             return False
     
+    def show_waveform(self, file_path):
+        """显示音频文件的波形概览（读取缓存，没有缓存时通过内存映射计算）"""
+        if not file_path.lower().endswith(".wav"):
+            self.waveform_view.set_peaks(None)
+            return
+        try:
+            self.waveform_peaks = load_waveform(file_path)
+        except (OSError, ValueError) as e:
+            self.log(f"无法生成波形概览: {str(e)}")
+            self.waveform_peaks = None
+        self.waveform_view.set_peaks(self.waveform_peaks)
+    
+    def seek_to_fraction(self, fraction):
+        """点击波形概览时跳转到对应位置"""
+        duration = self.media_player.duration()
+        if duration > 0:
+            self.media_player.setPosition(int(fraction * duration))
+    
     def media_state_changed(self, state):
         """媒体播放状态改变时的处理"""
         if state == QMediaPlayer.PlayingState:
@@ -1121,8 +1891,11 @@ class TTSApp(QWidget):
             self.play_button.setIcon(FluentIcon.PLAY)
     
     def position_changed(self, position):
-        """播放位置改变时更新进度条"""
+        """播放位置改变时更新进度条和波形概览"""
         self.progress_slider.setValue(position)
+        duration = self.media_player.duration()
+        if duration > 0:
+            self.waveform_view.set_position(position / duration)
         
         # 更新时间显示
         current_secs = position // 1000
@@ -1145,6 +1918,14 @@ class TTSApp(QWidget):
     
     def on_play_audio(self):
         """播放按钮点击事件 - 只控制合成音频，不控制示例音频"""
+        # 边合成边播放时控制其暂停和继续
+        if self.progressive_output is not None:
+            if self.progressive_output.state() == QAudio.SuspendedState:
+                self.progressive_output.resume()
+            else:
+                self.progressive_output.suspend()
+            return
+        
         # 检查播放器状态
         if self.media_player.state() == QMediaPlayer.PlayingState:
             # 如果正在播放，则暂停
@@ -1165,8 +1946,9 @@ class TTSApp(QWidget):
             self.log("没有可播放的合成音频")
     
     def play_sample_audio(self, voice_card, file_path):
-        """播放示例音频"""
-        if not os.path.exists(file_path):
+        """播放示例音频（优先从内存缓存播放）"""
+        data = self.sample_cache.load(file_path)
+        if data is None:
             self.log(f"错误: 音频文件 {file_path} 不存在")
             return False
         
@@ -1184,8 +1966,15 @@ class TTSApp(QWidget):
             self.current_playing_card = voice_card
             voice_card.set_playing_state(True)
             
-            # 播放示例音频
-            self.sample_player.setMedia(QMediaContent(QUrl.fromLocalFile(file_path)))
+            # 从内存缓冲区播放示例音频，文件URL仅用于识别格式；
+            # fromRawData直接引用缓存的数据（音频包为mmap的memoryview），不复制
+            buffer = QBuffer()
+            buffer.setData(QByteArray.fromRawData(data))
+            buffer.open(QIODevice.ReadOnly)
+            self.sample_player.setMedia(QMediaContent(QUrl.fromLocalFile(file_path)), buffer)
+            # 新媒体设置完成后再释放旧缓冲区；缓冲区播放期间保留对音频数据的引用
+            self.sample_buffer = buffer
+            self.sample_data = data
             self.sample_player.play()
             
             self.log(f"正在播放示例音频: {os.path.basename(file_path)}")
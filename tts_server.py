@@ -0,0 +1,423 @@
+# 本地语音合成HTTP服务
+# 用法：python audio_generator.py serve [--host 127.0.0.1] [--port 8765]
+#
+# 接口：
+#   POST   /synthesize       JSON: text, voice, speed, volume, format, mode("stream"或"job"),
+#                            priority("interactive"或"bulk"，默认stream模式为interactive、job模式为bulk)
+#                            stream模式返回分块传输的音频，job模式返回任务ID
+#   GET    /jobs/<id>        查询任务状态
+#   GET    /jobs/<id>/audio  下载任务生成的音频
+#   DELETE /jobs/<id>        删除任务及其音频文件（进行中的任务先取消，合成线程退出后删除文件）
+#   GET    /health           服务状态和缓存统计
+#
+# 所有请求共享同一个SynthesisSession（TTS客户端、片段缓存和并发限制）
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+
+import audio_generator
+from audio_utils import build_wav_header, extract_pcm
+from hedging import HedgeStats
+from job_metrics import JobMetrics
+from scheduler import PRIORITY_NAMES, priority_scope, run_with_priority
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# 请求体大小上限
+MAX_BODY_SIZE = 1024 * 1024
+# 保留的已结束任务数量，超出后删除最早的任务及其音频
+MAX_FINISHED_JOBS = 100
+# 文件分块发送的大小
+STREAM_CHUNK_SIZE = 64 * 1024
+
+SUPPORTED_FORMATS = {
+    "wav": "audio/wav",
+    "mp3": "audio/mpeg",
+    "aac": "audio/aac",
+    "m4a": "audio/mp4",
+    "ogg": "audio/ogg",
+    "flac": "audio/flac",
+}
+
+HTTP_REASONS = {
+    200: "OK",
+    202: "Accepted",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    502: "Bad Gateway",
+}
+
+
+class HttpError(Exception):
+    """请求处理失败，携带HTTP状态码"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class SynthesisJob:
+    """一个异步合成任务"""
+
+    def __init__(self, job_id, params, output_file):
+        self.job_id = job_id
+        self.params = params
+        self.output_file = output_file
+        self.status = "pending"  # pending / running / done / failed / cancelled
+        self.created = time.time()
+        self.finished = None
+        self.hedge_stats = HedgeStats()
+        self.metrics = JobMetrics()
+        self.cancel_token = audio_generator.CancelToken()
+
+    def to_dict(self):
+        snapshot = self.metrics.snapshot()
+        return {
+            "id": self.job_id,
+            "status": self.status,
+            "format": self.params["format"],
+            "created": self.created,
+            "finished": self.finished,
+            "hedges": self.hedge_stats.hedges,
+            "hedge_wins": self.hedge_stats.wins,
+            "segments_done": snapshot["segments_done"],
+            "segments_total": snapshot["segments_total"],
+            # 按历史吞吐预估的总耗时和剩余时间（秒），没有历史记录且尚未完成片段时为null
+            "estimate": snapshot["estimate"],
+            "eta": snapshot["eta"],
+        }
+
+
+def parse_synthesis_params(payload):
+    """校验合成参数，返回规范化后的参数字典"""
+    if not isinstance(payload, dict):
+        raise HttpError(400, "请求体必须是JSON对象")
+
+    text = payload.get("text")
+    if not isinstance(text, str) or not text.strip():
+        raise HttpError(400, "text不能为空")
+
+    try:
+        params = {
+            "text": text.strip(),
+            "voice": int(payload.get("voice", 101011)),
+            "speed": float(payload.get("speed", 0)),
+            "volume": int(payload.get("volume", 5)),
+            "format": str(payload.get("format", "wav")).lower().lstrip("."),
+            "mode": str(payload.get("mode", "job")).lower(),
+        }
+    except (TypeError, ValueError) as e:
+        raise HttpError(400, f"参数格式错误: {e}")
+
+    if params["format"] not in SUPPORTED_FORMATS:
+        raise HttpError(400, f"不支持的格式: {params['format']}")
+    if params["mode"] not in ("stream", "job"):
+        raise HttpError(400, f"不支持的模式: {params['mode']}")
+    # 等待音频的流式请求默认优先于后台任务
+    priority = str(payload.get("priority", "interactive" if params["mode"] == "stream" else "bulk")).lower()
+    if priority not in PRIORITY_NAMES:
+        raise HttpError(400, f"不支持的优先级: {priority}")
+    params["priority"] = PRIORITY_NAMES[priority]
+    if not -2 <= params["speed"] <= 6:
+        raise HttpError(400, "speed取值范围为[-2, 6]")
+    if not -10 <= params["volume"] <= 10:
+        raise HttpError(400, "volume取值范围为[-10, 10]")
+    return params
+
+
+async def read_request(reader):
+    """读取一个HTTP请求，返回(方法, 路径, 头部, 请求体)"""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "请求行格式错误")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", "0") or 0)
+    except ValueError:
+        raise HttpError(400, "Content-Length格式错误")
+    if length < 0:
+        raise HttpError(400, "Content-Length格式错误")
+    if length > MAX_BODY_SIZE:
+        raise HttpError(413, "请求体过大")
+    body = await reader.readexactly(length) if length else b""
+    path = target.split("?", 1)[0]
+    return method.upper(), path, headers, body
+
+
+def write_head(writer, status, content_type, extra_headers=None):
+    """写出响应状态行和头部"""
+    lines = [f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}",
+             f"Content-Type: {content_type}",
+             "Connection: close"]
+    for name, value in (extra_headers or {}).items():
+        lines.append(f"{name}: {value}")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("utf-8"))
+
+
+def write_json(writer, status, payload):
+    """写出JSON响应"""
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    write_head(writer, status, "application/json; charset=utf-8",
+               {"Content-Length": str(len(body))})
+    writer.write(body)
+
+
+def write_chunk(writer, data):
+    """按chunked编码写出一个数据块"""
+    if data:
+        writer.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+
+
+class TTSServer:
+    """asyncio HTTP服务，所有请求共享同一个合成会话"""
+
+    def __init__(self, session, output_dir):
+        self.session = session
+        self.output_dir = output_dir
+        self.jobs = OrderedDict()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            request = await read_request(reader)
+            if request is not None:
+                await self.dispatch(writer, *request)
+        except HttpError as e:
+            write_json(writer, e.status, {"error": e.message})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print(f"处理请求出错: {e}")
+            write_json(writer, 500, {"error": str(e)})
+        finally:
+            try:
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def dispatch(self, writer, method, path, headers, body):
+        # 每个请求都清理一次，任务结束后即使不再创建新任务也不会无限累积
+        self.prune_jobs()
+        parts = [p for p in path.split("/") if p]
+        if parts == ["health"] and method == "GET":
+            cache = self.session.cache
+            write_json(writer, 200, {
+                "status": "ok",
+                "jobs": len(self.jobs),
+                "cache_entries": len(cache),
+                "cache_hits": cache.hits,
+                "cache_misses": cache.misses,
+                "deduplicated": self.session.single_flight.shared,
+                "credentials": self.session.get_pool().stats(),
+                "regions": self.session.region_selector.stats() if self.session.region_selector else None,
+                "hedging": self.session.hedge_policy.stats() if self.session.hedge_policy else None,
+            })
+        elif parts == ["synthesize"]:
+            if method != "POST":
+                raise HttpError(405, "仅支持POST")
+            try:
+                payload = json.loads(body.decode("utf-8") or "{}")
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                raise HttpError(400, "请求体不是有效的JSON")
+            params = parse_synthesis_params(payload)
+            if params["mode"] == "stream":
+                await self.stream_synthesis(writer, params)
+            else:
+                job = self.create_job(params)
+                write_json(writer, 202, job.to_dict())
+        elif len(parts) in (2, 3) and parts[0] == "jobs":
+            job = self.jobs.get(parts[1])
+            if job is None:
+                raise HttpError(404, "任务不存在")
+            if len(parts) == 3 and parts[2] == "audio" and method == "GET":
+                await self.send_job_audio(writer, job)
+            elif len(parts) == 2 and method == "GET":
+                write_json(writer, 200, job.to_dict())
+            elif len(parts) == 2 and method == "DELETE":
+                self.remove_job(job)
+                write_json(writer, 200, {"id": job.job_id, "deleted": True})
+            else:
+                raise HttpError(405, "不支持的操作")
+        else:
+            raise HttpError(404, "接口不存在")
+
+    def create_job(self, params):
+        """创建后台合成任务"""
+        job_id = uuid.uuid4().hex
+        output_file = os.path.join(self.output_dir, f"{job_id}.{params['format']}")
+        job = SynthesisJob(job_id, params, output_file)
+        self.jobs[job_id] = job
+        asyncio.get_running_loop().create_task(self.run_job(job))
+        return job
+
+    async def run_job(self, job):
+        loop = asyncio.get_running_loop()
+        job.status = "running"
+        params = job.params
+        try:
+            success = await loop.run_in_executor(
+                None, run_with_priority, params["priority"], audio_generator.text_to_speech, params["text"],
+                job.output_file, params["voice"], params["speed"], params["volume"], self.session, None,
+                job.hedge_stats, job.cancel_token, job.metrics)
+        except Exception as e:
+            print(f"任务 {job.job_id} 失败: {e}")
+            success = False
+        if job.cancel_token.cancelled:
+            job.status = "cancelled"
+        else:
+            job.status = "done" if success else "failed"
+        job.finished = time.time()
+        if self.jobs.get(job.job_id) is not job:
+            # 任务在合成过程中被删除，合成线程退出后再删除它写出的文件
+            self.delete_output(job)
+        self.prune_jobs()
+
+    def remove_job(self, job):
+        """删除任务；进行中的任务先取消，音频文件在合成线程退出后由run_job删除"""
+        self.jobs.pop(job.job_id, None)
+        if job.finished is None:
+            job.cancel_token.cancel()
+        else:
+            self.delete_output(job)
+
+    def delete_output(self, job):
+        if os.path.exists(job.output_file):
+            os.remove(job.output_file)
+
+    def prune_jobs(self):
+        """删除超出保留数量的已结束任务"""
+        finished = [job for job in self.jobs.values() if job.finished is not None]
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            self.remove_job(job)
+
+    async def send_job_audio(self, writer, job):
+        if job.status != "done":
+            raise HttpError(409, f"任务尚未完成: {job.status}")
+        write_head(writer, 200, SUPPORTED_FORMATS[job.params["format"]],
+                   {"Content-Length": str(os.path.getsize(job.output_file))})
+        with open(job.output_file, "rb") as f:
+            while True:
+                data = f.read(STREAM_CHUNK_SIZE)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+
+    async def stream_synthesis(self, writer, params):
+        """分块返回音频：WAV按片段完成顺序边合成边发送，其他格式合成后分块发送"""
+        if params["format"] != "wav":
+            job = self.create_job(params)
+            while job.finished is None:
+                await asyncio.sleep(0.05)
+            if job.status != "done":
+                self.remove_job(job)
+                raise HttpError(502, "语音合成失败")
+            try:
+                await self.send_job_audio(writer, job)
+            finally:
+                self.remove_job(job)
+            return
+
+        segments = audio_generator.split_text_for_voice(params["text"], params["voice"])
+        with priority_scope(params["priority"]):
+            futures = [self.session.submit(self.session.fetch_segment, segment, params["voice"],
+                                           params["speed"], params["volume"], "wav")
+                       for segment in segments]
+        try:
+            # 首个片段成功后才发送响应头，这样早期错误仍能返回正确的状态码
+            try:
+                fmt, pcm = extract_pcm(await asyncio.wrap_future(futures[0]))
+            except Exception as e:
+                raise HttpError(502, f"语音合成失败: {e}")
+
+            write_head(writer, 200, SUPPORTED_FORMATS["wav"], {"Transfer-Encoding": "chunked"})
+            # 总长度未知，WAV头中的长度使用最大值占位
+            write_chunk(writer, build_wav_header(fmt["channels"], fmt["sample_rate"],
+                                                 fmt["bits_per_sample"], 0xFFFFFFFF - 36))
+            write_chunk(writer, pcm)
+            await writer.drain()
+
+            for future in futures[1:]:
+                try:
+                    _, pcm = extract_pcm(await asyncio.wrap_future(future))
+                except Exception as e:
+                    # 响应头已发送，只能中断连接让客户端感知到失败
+                    print(f"流式合成中断: {e}")
+                    return
+                write_chunk(writer, pcm)
+                await writer.drain()
+            writer.write(b"0\r\n\r\n")
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+async def serve(host, port, session, output_dir):
+    server = TTSServer(session, output_dir)
+    tcp_server = await asyncio.start_server(server.handle_connection, host, port)
+    print(f"语音合成服务已启动: http://{host}:{port}")
+    print(f"任务音频保存目录: {output_dir}")
+    async with tcp_server:
+        await tcp_server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="audio_generator.py serve", description="本地语音合成HTTP服务")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="监听地址")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="监听端口")
+    parser.add_argument("--concurrency", type=int, default=audio_generator.DEFAULT_CONCURRENCY,
+                        help="同时进行的合成请求数")
+    parser.add_argument("--cache-size", type=int, default=audio_generator.DEFAULT_CACHE_ENTRIES,
+                        help="片段缓存的最大条目数")
+    parser.add_argument("--key-strategy", choices=("round_robin", "least_loaded"), default="round_robin",
+                        help="多凭证时的分配策略")
+    audio_generator.add_session_arguments(parser)
+    parser.add_argument("--output-dir", help="任务音频保存目录（默认使用临时目录）")
+    args = parser.parse_args(argv)
+
+    output_dir = args.output_dir or tempfile.mkdtemp(prefix="tts_server_")
+    os.makedirs(output_dir, exist_ok=True)
+
+    session = audio_generator.create_session_from_args(
+        args,
+        max_concurrency=args.concurrency,
+        cache=audio_generator.SegmentCache(args.cache_size),
+        key_strategy=args.key_strategy)
+    if session.get_pool() is None:
+        return 1
+
+    try:
+        asyncio.run(serve(args.host, args.port, session, output_dir))
+    except KeyboardInterrupt:
+        print("语音合成服务已停止")
+    finally:
+        session.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
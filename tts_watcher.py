@@ -0,0 +1,317 @@
+# 监视目录：自动合成目录中新增或修改的.txt文件
+# 用法：python audio_generator.py watch -i /share/scripts -o /share/audios [-v 101011] [--format mp3] [--jobs 2]
+#
+# Linux上使用inotify接收文件写入完成的事件，其他系统（或--poll）定时扫描目录；
+# 处理结果记录在状态文件中，重启后不会重复合成已完成且未修改的文件
+import argparse
+import ctypes
+import ctypes.util
+import json
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+
+import audio_generator
+from scheduler import PRIORITY_BULK, priority_scope
+
+# 默认状态文件名（位于输入目录）
+STATE_FILE_NAME = ".tts_watch_state.json"
+# 同时合成的文件数
+DEFAULT_JOBS = 2
+# 等待合成的文件数上限，队列满时暂停接收新文件
+DEFAULT_QUEUE_SIZE = 100
+# 轮询模式的扫描间隔（秒），文件在两次扫描之间没有变化才开始合成
+DEFAULT_POLL_INTERVAL = 5.0
+# 监视的文件后缀
+TEXT_EXTENSION = ".txt"
+
+# inotify事件（见inotify(7)）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def list_text_files(directory):
+    """目录下所有.txt文件的路径"""
+    return [entry.path for entry in os.scandir(directory)
+            if entry.is_file() and entry.name.endswith(TEXT_EXTENSION)]
+
+
+def file_signature(path):
+    """文件的(修改时间, 大小)，文件不存在时返回None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime, stat.st_size]
+
+
+class InotifyWatcher:
+    """通过inotify接收目录中文件写入完成或移入的事件（仅Linux）"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1失败")
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"无法监视目录 {directory}")
+
+    @staticmethod
+    def supported():
+        return sys.platform.startswith("linux")
+
+    def changes(self, timeout):
+        """等待最多timeout秒，返回写入完成的.txt文件路径"""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        pos = 0
+        while pos + EVENT_HEADER.size <= len(data):
+            _, mask, _, name_len = EVENT_HEADER.unpack_from(data, pos)
+            name = data[pos + EVENT_HEADER.size:pos + EVENT_HEADER.size + name_len].rstrip(b"\0")
+            pos += EVENT_HEADER.size + name_len
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出，可能漏掉了文件，重新扫描整个目录
+                return list_text_files(self.directory)
+            name = os.fsdecode(name)
+            if name.endswith(TEXT_EXTENSION):
+                paths.append(os.path.join(self.directory, name))
+        return paths
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """定时扫描目录，文件在两次扫描之间没有变化时才报告（避免读到写了一半的文件）"""
+
+    def __init__(self, directory, interval=DEFAULT_POLL_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self._last_scan = {}
+        self._reported = {}
+
+    def changes(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        scan = {path: file_signature(path) for path in list_text_files(self.directory)}
+        paths = [path for path, signature in scan.items()
+                 if signature is not None and signature == self._last_scan.get(path)
+                 and signature != self._reported.get(path)]
+        for path in paths:
+            self._reported[path] = scan[path]
+        self._last_scan = scan
+        return paths
+
+    def close(self):
+        pass
+
+
+class WatchState:
+    """状态文件：记录每个文件已处理版本的(修改时间, 大小)和结果"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.files = json.load(f).get("files", {})
+        except FileNotFoundError:
+            self.files = {}
+        except (OSError, ValueError) as e:
+            print(f"读取状态文件失败，将重新处理所有文件: {e}")
+            self.files = {}
+
+    def is_processed(self, name, signature):
+        with self._lock:
+            entry = self.files.get(name)
+            return entry is not None and entry["signature"] == signature
+
+    def record(self, name, signature, status, output_file=None, error=None):
+        with self._lock:
+            self.files[name] = {
+                "signature": signature,
+                "status": status,
+                "output": output_file,
+                "error": error,
+                "finished": time.time(),
+            }
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({"files": self.files}, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.path)
+
+
+class WatchProcessor:
+    """把待合成的文件放入有界队列，由固定数量的线程依次合成"""
+
+    def __init__(self, session, state, input_dir, output_dir, voice_type, speed, volume, output_format,
+                 jobs=DEFAULT_JOBS, queue_size=DEFAULT_QUEUE_SIZE):
+        self.session = session
+        self.state = state
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.voice_type = voice_type
+        self.speed = speed
+        self.volume = volume
+        self.output_format = output_format
+        self.voice_name = audio_generator.get_voice_name(voice_type)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.cancel_token = audio_generator.CancelToken()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self.loop, name=f"tts-watch-{i}", daemon=True)
+                         for i in range(jobs)]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """取消进行中的合成（不记录状态，下次启动时重新处理）"""
+        self.cancel_token.cancel()
+        for _ in self._threads:
+            try:
+                self.queue.put_nowait(None)
+            except queue.Full:
+                break
+        for thread in self._threads:
+            thread.join()
+
+    def offer(self, path):
+        """文件未处理过且不在队列中时加入队列（队列满时阻塞）"""
+        name = os.path.relpath(path, self.input_dir)
+        signature = file_signature(path)
+        if signature is None or self.state.is_processed(name, signature):
+            return
+        with self._lock:
+            if path in self._pending:
+                return
+            self._pending.add(path)
+        print(f"发现文件 {name}，已加入队列（等待中 {self.queue.qsize() + 1}）")
+        self.queue.put(path)
+
+    def output_path(self, path):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(self.output_dir, f"{self.voice_name}_{stem}.{self.output_format}")
+
+    def loop(self):
+        while not self.cancel_token.cancelled:
+            path = self.queue.get()
+            if path is None:
+                return
+            with self._lock:
+                self._pending.discard(path)
+            self.process(path)
+
+    def process(self, path):
+        name = os.path.relpath(path, self.input_dir)
+        # 以开始合成时的版本为准，合成期间文件再次修改时会重新入队
+        signature = file_signature(path)
+        if signature is None or self.state.is_processed(name, signature):
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read().strip()
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"读取文件 {name} 失败: {e}")
+            self.state.record(name, signature, "failed", error=str(e))
+            return
+        if not text:
+            print(f"文件 {name} 内容为空，跳过")
+            self.state.record(name, signature, "failed", error="内容为空")
+            return
+
+        output_file = self.output_path(path)
+        print(f"开始合成 {name} -> {output_file}")
+        with priority_scope(PRIORITY_BULK):
+            success = audio_generator.text_to_speech(text, output_file, self.voice_type, self.speed, self.volume,
+                                                     session=self.session, cancel_token=self.cancel_token)
+        if self.cancel_token.cancelled:
+            return
+        if success:
+            print(f"文件 {name} 合成完成")
+            self.state.record(name, signature, "done", output_file)
+        else:
+            print(f"文件 {name} 合成失败，文件再次修改后会重试")
+            self.state.record(name, signature, "failed", output_file, "合成失败")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="audio_generator.py watch", description="监视目录并自动合成新增或修改的文本文件")
+    parser.add_argument("-i", "--input", required=True, help="监视的文本目录")
+    parser.add_argument("-o", "--output", help="音频输出目录（默认与输入目录相同）")
+    parser.add_argument("-v", "--voice", type=int, default=101012, help="音色ID")
+    parser.add_argument("--speed", type=float, default=0, help="语速")
+    parser.add_argument("--volume", type=int, default=5, help="音量")
+    parser.add_argument("--format", default="wav", help="输出格式（文件后缀，例如wav、mp3）")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="同时合成的文件数")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="等待合成的文件数上限")
+    parser.add_argument("--concurrency", type=int, default=audio_generator.DEFAULT_CONCURRENCY,
+                        help="所有文件共享的同时请求数上限")
+    parser.add_argument("--state", help=f"状态文件路径（默认: 输入目录/{STATE_FILE_NAME}）")
+    parser.add_argument("--poll", action="store_true", help="强制使用定时扫描（例如监视网络共享目录时）")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, help="定时扫描的间隔（秒）")
+    audio_generator.add_session_arguments(parser)
+    args = parser.parse_args(argv)
+
+    input_dir = os.path.abspath(args.input)
+    if not os.path.isdir(input_dir):
+        print(f"错误：监视目录 {args.input} 不存在")
+        return 1
+    output_dir = os.path.abspath(args.output or input_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    session = audio_generator.create_session_from_args(args, max_concurrency=args.concurrency)
+    if session.get_pool() is None:
+        return 1
+    state = WatchState(args.state or os.path.join(input_dir, STATE_FILE_NAME))
+
+    watcher = None
+    if not args.poll and InotifyWatcher.supported():
+        try:
+            watcher = InotifyWatcher(input_dir)
+            print(f"使用inotify监视目录 {input_dir}")
+        except (OSError, AttributeError) as e:
+            print(f"inotify不可用（{e}），改为定时扫描")
+    if watcher is None:
+        watcher = PollingWatcher(input_dir, args.poll_interval)
+        print(f"每{args.poll_interval}秒扫描一次目录 {input_dir}")
+
+    processor = WatchProcessor(session, state, input_dir, output_dir, args.voice, args.speed, args.volume,
+                               args.format.lstrip("."), args.jobs, args.queue_size)
+    processor.start()
+    try:
+        # 先处理停止期间新增或修改的文件
+        for path in sorted(list_text_files(input_dir)):
+            processor.offer(path)
+        while True:
+            for path in watcher.changes(args.poll_interval):
+                processor.offer(path)
+    except KeyboardInterrupt:
+        print("正在停止，进行中的文件会在下次启动时重新合成...")
+        processor.stop()
+    finally:
+        watcher.close()
+        session.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,534 @@
+# 分布式合成：多个进程（可在多台机器上）从共享队列中领取片段级任务
+# 用法：
+#   python audio_generator.py worker submit -f text.txt -o /share/out/book.mp3 --queue /share/tts_queue.db --store /share/segments
+#   python audio_generator.py worker run --queue /share/tts_queue.db --store /share/segments
+#   python audio_generator.py worker status --queue /share/tts_queue.db [job_id]
+#
+# 每个片段合成后写入共享存储目录；某个任务的片段全部完成后，由空闲的worker负责合并。
+# 提交时按历史吞吐（throughput_model.py）预估任务耗时，worker按“提交时间+预估耗时”的顺序领取片段：
+# 短任务可以排到稍早提交的长任务之前，长任务的顺序随时间推移不会被无限推后
+import argparse
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import closing, contextmanager
+
+import audio_generator
+from scheduler import PRIORITY_BULK, priority_scope
+from throughput_model import format_eta
+
+# 片段领取后的租约时长（秒），worker崩溃后租约过期的片段会被重新领取
+SEGMENT_LEASE_SECONDS = 120
+# 合并任务的租约时长（秒）
+MERGE_LEASE_SECONDS = 600
+# 处理片段或合并期间续租的间隔（秒），需明显小于租约时长
+HEARTBEAT_INTERVAL = 30
+# 单个片段的最大尝试次数，超过后整个任务标记为失败
+MAX_SEGMENT_ATTEMPTS = 3
+# 队列为空时的轮询间隔（秒）
+DEFAULT_POLL_INTERVAL = 2.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    output_file TEXT NOT NULL,
+    voice_type INTEGER NOT NULL,
+    speed REAL NOT NULL,
+    volume INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    worker TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    estimate REAL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    result_path TEXT,
+    error TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS segments_status ON segments (status, lease_until);
+"""
+
+
+class SQLiteJobQueue:
+    """基于SQLite文件的共享任务队列
+
+    任务状态：queued -> merging -> done / failed
+    片段状态：pending -> running -> done / failed
+    放在网络共享目录时使用默认的回滚日志模式（WAL不支持网络文件系统）
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """为旧版本创建的队列补充新增的列"""
+        conn = self._transaction()
+        try:
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "estimate" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN estimate REAL")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _transaction(self):
+        """获取写锁后执行事务，避免多个worker领取同一个片段"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def submit_job(self, segments, output_file, voice_type, speed, volume, estimate=None):
+        """提交任务，返回任务ID；estimate为预估耗时（秒），用于安排领取顺序，None表示没有历史记录"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._transaction()
+        try:
+            conn.execute(
+                "INSERT INTO jobs (id, output_file, voice_type, speed, volume, total, status, created, updated, "
+                "estimate) VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, output_file, voice_type, speed, volume, len(segments), now, now, estimate))
+            conn.executemany(
+                "INSERT INTO segments (job_id, idx, text, status) VALUES (?, ?, ?, 'pending')",
+                [(job_id, i, text) for i, text in enumerate(segments)])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return job_id
+
+    def claim_segment(self, worker_id):
+        """领取一个待处理（或租约已过期）的片段，没有则返回None"""
+        now = time.time()
+        conn = self._transaction()
+        try:
+            row = conn.execute(
+                "SELECT s.job_id, s.idx, s.text, s.attempts, j.voice_type, j.speed, j.volume "
+                "FROM segments s JOIN jobs j ON j.id = s.job_id "
+                "WHERE j.status = 'queued' AND (s.status = 'pending' OR (s.status = 'running' AND s.lease_until < ?)) "
+                "ORDER BY j.created + COALESCE(j.estimate, 0), j.created, s.idx LIMIT 1", (now,)).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE segments SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1 "
+                    "WHERE job_id = ? AND idx = ?",
+                    (worker_id, now + SEGMENT_LEASE_SECONDS, row["job_id"], row["idx"]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return dict(row) if row is not None else None
+
+    def renew_segment(self, job_id, idx, worker_id):
+        """延长片段的租约，租约已被其他worker领取时返回False"""
+        now = time.time()
+        conn = self._transaction()
+        try:
+            renewed = conn.execute(
+                "UPDATE segments SET lease_until = ? "
+                "WHERE job_id = ? AND idx = ? AND worker = ? AND status = 'running' AND lease_until > ?",
+                (now + SEGMENT_LEASE_SECONDS, job_id, idx, worker_id, now)).rowcount > 0
+            if renewed:
+                conn.execute("UPDATE jobs SET updated = ? WHERE id = ?", (now, job_id))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return renewed
+
+    def complete_segment(self, job_id, idx, worker_id, result_path):
+        """记录片段完成；租约已失效或任务已失败时不做修改并返回False"""
+        now = time.time()
+        conn = self._transaction()
+        try:
+            completed = conn.execute(
+                "UPDATE segments SET status = 'done', result_path = ?, error = NULL "
+                "WHERE job_id = ? AND idx = ? AND worker = ? AND status = 'running' AND lease_until > ? "
+                "AND EXISTS (SELECT 1 FROM jobs j WHERE j.id = segments.job_id AND j.status = 'queued')",
+                (result_path, job_id, idx, worker_id, now)).rowcount > 0
+            if completed:
+                conn.execute("UPDATE jobs SET updated = ? WHERE id = ?", (now, job_id))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return completed
+
+    def fail_segment(self, job_id, idx, worker_id, error):
+        """记录片段失败；尝试次数用完时整个任务失败并返回True，租约已失效时返回None"""
+        now = time.time()
+        conn = self._transaction()
+        try:
+            row = conn.execute(
+                "SELECT attempts FROM segments "
+                "WHERE job_id = ? AND idx = ? AND worker = ? AND status = 'running' AND lease_until > ?",
+                (job_id, idx, worker_id, now)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            final = row["attempts"] >= MAX_SEGMENT_ATTEMPTS
+            conn.execute("UPDATE segments SET status = ?, error = ? WHERE job_id = ? AND idx = ?",
+                         ("failed" if final else "pending", error, job_id, idx))
+            if final:
+                conn.execute("UPDATE jobs SET status = 'failed', error = ?, updated = ? WHERE id = ? AND status = 'queued'",
+                             (f"片段 {idx+1} 合成失败: {error}", now, job_id))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return final
+
+    def claim_merge(self, worker_id):
+        """领取一个所有片段都已完成、等待合并的任务，返回(任务, 片段文件列表)或None"""
+        now = time.time()
+        conn = self._transaction()
+        try:
+            job = conn.execute(
+                "SELECT * FROM jobs j WHERE "
+                "(j.status = 'queued' AND NOT EXISTS "
+                " (SELECT 1 FROM segments s WHERE s.job_id = j.id AND s.status != 'done')) "
+                "OR (j.status = 'merging' AND j.updated < ?) "
+                "ORDER BY j.created LIMIT 1", (now - MERGE_LEASE_SECONDS,)).fetchone()
+            files = []
+            if job is not None:
+                conn.execute("UPDATE jobs SET status = 'merging', worker = ?, updated = ? WHERE id = ?",
+                             (worker_id, now, job["id"]))
+                files = [row["result_path"] for row in conn.execute(
+                    "SELECT result_path FROM segments WHERE job_id = ? ORDER BY idx", (job["id"],))]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return (dict(job), files) if job is not None else None
+
+    def renew_merge(self, job_id, worker_id):
+        """延长合并任务的租约，已被其他worker接手时返回False"""
+        now = time.time()
+        conn = self._transaction()
+        try:
+            renewed = conn.execute(
+                "UPDATE jobs SET updated = ? WHERE id = ? AND worker = ? AND status = 'merging' AND updated > ?",
+                (now, job_id, worker_id, now - MERGE_LEASE_SECONDS)).rowcount > 0
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return renewed
+
+    def finish_job(self, job_id, worker_id, success, error=None):
+        """记录合并结果；租约已失效（已被其他worker接手）时不做修改并返回False"""
+        now = time.time()
+        conn = self._transaction()
+        try:
+            finished = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated = ? "
+                "WHERE id = ? AND worker = ? AND status = 'merging' AND updated > ?",
+                ("done" if success else "failed", error, now, job_id, worker_id,
+                 now - MERGE_LEASE_SECONDS)).rowcount > 0
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return finished
+
+    def segment_files(self, job_id):
+        """任务已完成片段的文件列表"""
+        with closing(self._connect()) as conn:
+            return [row["result_path"] for row in conn.execute(
+                "SELECT result_path FROM segments WHERE job_id = ? AND result_path IS NOT NULL", (job_id,))]
+
+    def is_idle(self):
+        """没有等待处理或正在合并的任务"""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'merging')").fetchone()
+        return row[0] == 0
+
+    def job_status(self, job_id=None):
+        """查询任务状态（含已完成片段数），未指定ID时返回所有任务"""
+        query = ("SELECT j.id, j.status, j.output_file, j.total, j.error, j.worker, j.estimate, "
+                 "(SELECT COUNT(*) FROM segments s WHERE s.job_id = j.id AND s.status = 'done') AS done "
+                 "FROM jobs j")
+        with closing(self._connect()) as conn:
+            if job_id:
+                rows = conn.execute(query + " WHERE j.id = ?", (job_id,)).fetchall()
+            else:
+                rows = conn.execute(query + " ORDER BY j.created").fetchall()
+        return [dict(row) for row in rows]
+
+
+# 队列后端：URL前缀 -> 实现类（本地或共享目录上的SQLite文件作为默认实现）
+QUEUE_BACKENDS = {
+    "sqlite": SQLiteJobQueue,
+}
+
+
+def open_queue(url):
+    """根据队列地址打开队列，例如 /share/tts_queue.db 或 sqlite:///share/tts_queue.db"""
+    scheme, sep, rest = url.partition("://")
+    if not sep:
+        return SQLiteJobQueue(url)
+    if scheme not in QUEUE_BACKENDS:
+        raise ValueError(f"不支持的队列后端: {scheme}")
+    return QUEUE_BACKENDS[scheme](rest)
+
+
+@contextmanager
+def keep_lease(renew, interval=HEARTBEAT_INTERVAL):
+    """在处理期间由后台线程定期调用renew()续租，renew返回False（租约已丢失）后停止"""
+    stop_event = threading.Event()
+
+    def heartbeat():
+        while not stop_event.wait(interval):
+            try:
+                if not renew():
+                    return
+            except sqlite3.Error as e:
+                print(f"续租失败: {e}")
+
+    thread = threading.Thread(target=heartbeat, name="tts-worker-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop_event.set()
+        thread.join()
+
+
+def estimate_job_seconds(segments, output_file, voice_type, speed, volume):
+    """按历史吞吐预估任务的总耗时（秒），没有记录或预估出错时返回None"""
+    items = [(segment, voice_type, speed, volume) for segment in segments]
+    try:
+        # 各worker的缓存不同，提交时不扣除缓存命中的片段
+        estimate = audio_generator.get_throughput_model().estimate(
+            items, output_file, audio_generator.DEFAULT_CONCURRENCY,
+            categories=audio_generator.voice_categories(items))
+    except Exception as e:
+        print(f"警告：预估耗时失败: {e}")
+        return None
+    return sum(estimate) if estimate is not None else None
+
+
+def write_atomic(path, data):
+    """先写临时文件再重命名，避免其他机器读到不完整的片段"""
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+class Worker:
+    """从队列领取片段进行合成，并合并已完成的任务"""
+
+    def __init__(self, queue, store_dir, session, worker_id, concurrency, poll_interval, exit_when_idle):
+        self.queue = queue
+        self.store_dir = store_dir
+        self.session = session
+        self.worker_id = worker_id
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.exit_when_idle = exit_when_idle
+        self.stop_event = threading.Event()
+
+    def process_segment(self, item):
+        job_id, idx = item["job_id"], item["idx"]
+        job_dir = os.path.join(self.store_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        # 每次领取使用不同的文件名，租约过期后被其他worker重新领取时不会互相覆盖
+        result_path = os.path.join(job_dir, f"segment_{idx}_{uuid.uuid4().hex[:8]}.wav")
+        try:
+            with keep_lease(lambda: self.queue.renew_segment(job_id, idx, self.worker_id)):
+                audio_data = self.session.fetch_segment(item["text"], item["voice_type"], item["speed"], item["volume"])
+                write_atomic(result_path, audio_data)
+        except Exception as e:
+            final = self.queue.fail_segment(job_id, idx, self.worker_id, str(e))
+            if final is None:
+                print(f"任务 {job_id[:8]} 片段 {idx+1} 合成失败，租约已失效: {e}")
+                return
+            print(f"任务 {job_id[:8]} 片段 {idx+1} 合成失败{'（已放弃）' if final else '，稍后重试'}: {e}")
+            if final:
+                self.remove_segments(job_id, self.queue.segment_files(job_id))
+            return
+        if not self.queue.complete_segment(job_id, idx, self.worker_id, result_path):
+            # 租约已被其他worker领取或任务已失败，丢弃本次结果
+            os.remove(result_path)
+            print(f"任务 {job_id[:8]} 片段 {idx+1} 的租约已失效，丢弃本次结果")
+            return
+        print(f"任务 {job_id[:8]} 片段 {idx+1} 合成成功")
+
+    def remove_segments(self, job_id, files):
+        """删除共享存储中任务的片段文件"""
+        for path in files:
+            if os.path.exists(path):
+                os.remove(path)
+        job_dir = os.path.join(self.store_dir, job_id)
+        if os.path.isdir(job_dir) and not os.listdir(job_dir):
+            os.rmdir(job_dir)
+
+    def merge_job(self, job, files):
+        print(f"开始合并任务 {job['id'][:8]}（{len(files)}个片段）")
+        output_dir = os.path.dirname(job["output_file"])
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        work_dir = tempfile.mkdtemp()
+        try:
+            with keep_lease(lambda: self.queue.renew_merge(job["id"], self.worker_id)):
+                success = audio_generator.merge_audio_files(files, job["output_file"], work_dir)
+        except Exception as e:
+            print(f"合并任务 {job['id'][:8]} 出错: {e}")
+            success = False
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        if not self.queue.finish_job(job["id"], self.worker_id, success, None if success else "合并音频失败"):
+            # 租约已失效，任务由其他worker接手合并，片段文件保留
+            print(f"合并任务 {job['id'][:8]} 的租约已失效，结果由其他worker处理")
+            return
+        # 任务结束（成功或失败）后删除共享存储中的片段
+        self.remove_segments(job["id"], files)
+
+    def loop(self):
+        # 队列中的都是批量任务，与监视模式、预合成一样排在同一会话的交互式请求之后
+        with priority_scope(PRIORITY_BULK):
+            while not self.stop_event.is_set():
+                try:
+                    item = self.queue.claim_segment(self.worker_id)
+                    if item is not None:
+                        self.process_segment(item)
+                        continue
+                    merge = self.queue.claim_merge(self.worker_id)
+                    if merge is not None:
+                        self.merge_job(*merge)
+                        continue
+                    if self.exit_when_idle and self.queue.is_idle():
+                        break
+                except sqlite3.Error as e:
+                    print(f"访问任务队列出错: {e}")
+                self.stop_event.wait(self.poll_interval)
+
+    def run(self):
+        print(f"worker {self.worker_id} 已启动，并发数 {self.concurrency}")
+        threads = [threading.Thread(target=self.loop, name=f"tts-worker-{i}", daemon=True)
+                   for i in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            print("正在停止worker，等待进行中的片段完成...")
+            self.stop_event.set()
+            for thread in threads:
+                thread.join()
+        print(f"worker {self.worker_id} 已退出")
+
+
+def cmd_submit(args):
+    if not os.path.exists(args.file):
+        print(f"错误：指定的文件 {args.file} 不存在")
+        return 1
+    with open(args.file, 'r', encoding='utf-8') as f:
+        text = f.read().strip()
+    if not text:
+        print(f"错误：文件 {args.file} 内容为空")
+        return 1
+    segments = audio_generator.split_text_for_voice(text, args.voice)
+    output_file = os.path.abspath(args.output or f"{os.path.splitext(args.file)[0]}.wav")
+    estimate = estimate_job_seconds(segments, output_file, args.voice, args.speed, args.volume)
+    queue = open_queue(args.queue)
+    job_id = queue.submit_job(segments, output_file, args.voice, args.speed, args.volume, estimate)
+    print(f"已提交任务 {job_id}（{len(segments)}个片段），输出文件: {output_file}")
+    if estimate is not None:
+        print(f"根据历史记录预计耗时约{format_eta(estimate)}（单个worker）")
+    return 0
+
+
+def cmd_run(args):
+    if args.mp3_transport:
+        # 片段由不同的worker合成，无法保证都使用MP3编码，合并时统一用ffmpeg处理WAV片段
+        print("错误：worker不支持--mp3-transport，片段始终以WAV传输并由ffmpeg合并")
+        return 1
+    os.makedirs(args.store, exist_ok=True)
+    session = audio_generator.create_session_from_args(args, max_concurrency=args.concurrency)
+    if session.get_pool() is None:
+        return 1
+    worker_id = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    worker = Worker(open_queue(args.queue), args.store, session, worker_id,
+                    args.concurrency, args.poll_interval, args.exit_when_idle)
+    try:
+        worker.run()
+    finally:
+        session.close()
+    return 0
+
+
+def cmd_status(args):
+    jobs = open_queue(args.queue).job_status(args.job_id)
+    if args.job_id and not jobs:
+        print(f"任务 {args.job_id} 不存在")
+        return 1
+    print(json.dumps(jobs, ensure_ascii=False, indent=2))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="audio_generator.py worker", description="分布式合成worker")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    submit = subparsers.add_parser("submit", help="提交合成任务到队列")
+    submit.add_argument("--queue", required=True, help="队列地址（SQLite文件路径）")
+    submit.add_argument("-f", "--file", required=True, help="文本文件路径")
+    submit.add_argument("-o", "--output", help="输出文件路径（需位于合并worker可访问的共享目录）")
+    submit.add_argument("-v", "--voice", type=int, default=101012, help="音色ID")
+    submit.add_argument("--speed", type=float, default=0, help="语速")
+    submit.add_argument("--volume", type=int, default=5, help="音量")
+    submit.set_defaults(func=cmd_submit)
+
+    run = subparsers.add_parser("run", help="启动worker处理队列中的片段")
+    run.add_argument("--queue", required=True, help="队列地址（SQLite文件路径）")
+    run.add_argument("--store", required=True, help="片段结果的共享存储目录")
+    run.add_argument("--concurrency", type=int, default=audio_generator.DEFAULT_CONCURRENCY,
+                     help="同时处理的片段数")
+    run.add_argument("--worker-id", help="worker标识（默认: 主机名-进程号）")
+    run.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, help="队列为空时的轮询间隔（秒）")
+    run.add_argument("--exit-when-idle", action="store_true", help="队列中没有未完成的任务时退出")
+    audio_generator.add_session_arguments(run)
+    run.set_defaults(func=cmd_run)
+
+    status = subparsers.add_parser("status", help="查询任务状态")
+    status.add_argument("--queue", required=True, help="队列地址（SQLite文件路径）")
+    status.add_argument("job_id", nargs="?", help="任务ID（省略时列出所有任务）")
+    status.set_defaults(func=cmd_status)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+# 波形概览：把16位PCM WAV降采样为每块的(最小值, 最大值)，用于在播放器中显示整段音频并点击跳转
+#
+# 音频文件通过内存映射分块计算，不会整个读入内存；结果缓存在音频文件旁的.peaks文件中，
+# 音频文件的大小或修改时间变化后重新计算。合成过程中可以逐个片段追加PCM，边合成边更新概览
+import mmap
+import os
+import struct
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # 没有NumPy时按步长抽样计算（峰值为近似值）
+    np = None
+
+from audio_utils import AudioFormatError, parse_wav_header
+
+# 每秒音频的峰值块数（一小时约7.2万块，缓存约288KB）
+PEAKS_PER_SECOND = 20
+PEAKS_SUFFIX = ".peaks"
+PEAKS_MAGIC = b"TTSPEAK1"
+# 缓存文件头：魔数, 采样率, 声道数, 每块采样数, 块数, 源文件大小, 源文件修改时间(纳秒)
+PEAKS_HEADER = struct.Struct("<8sIHIIQQ")
+# 内存映射计算时每次处理的块数，限制临时数组的大小
+CHUNK_PEAKS = 4096
+# 没有NumPy时每块最多检查的采样数
+FALLBACK_SAMPLES_PER_PEAK = 64
+
+
+def peaks_path(audio_path):
+    """波形缓存文件的路径（音频文件旁）"""
+    return audio_path + PEAKS_SUFFIX
+
+
+def source_signature(audio_path):
+    stat = os.stat(audio_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class WaveformPeaks:
+    """按固定采样数分块的峰值序列，可从WAV文件计算，也可逐段追加PCM"""
+
+    def __init__(self, sample_rate, channels, samples_per_peak=None):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.samples_per_peak = samples_per_peak or max(1, sample_rate // PEAKS_PER_SECOND)
+        self.mins = array("h")
+        self.maxs = array("h")
+        self._pending = b""
+
+    @property
+    def block_bytes(self):
+        return self.samples_per_peak * self.channels * 2
+
+    def __len__(self):
+        return len(self.mins)
+
+    def duration(self):
+        """已计算部分的时长（秒）"""
+        return len(self.mins) * self.samples_per_peak / self.sample_rate
+
+    def append_pcm(self, pcm):
+        """追加PCM数据，不足一块的部分留到下次追加或finish时处理"""
+        data = self._pending + bytes(pcm) if self._pending else pcm
+        usable = len(data) - len(data) % self.block_bytes
+        self._add_blocks(data, 0, usable)
+        self._pending = bytes(data[usable:])
+
+    def finish(self):
+        """把剩余不足一块的数据作为最后一块"""
+        frame_bytes = self.channels * 2
+        tail = self._pending[:len(self._pending) - len(self._pending) % frame_bytes]
+        self._pending = b""
+        if tail:
+            samples = array("h")
+            samples.frombytes(tail)
+            self.mins.append(min(samples))
+            self.maxs.append(max(samples))
+
+    def _add_blocks(self, buffer, offset, length):
+        """计算buffer[offset:offset+length]（整数个块）的峰值"""
+        count = length // self.block_bytes
+        if not count:
+            return
+        per_block = self.samples_per_peak * self.channels
+        if np is not None:
+            samples = np.frombuffer(buffer, dtype="<i2", count=count * per_block, offset=offset)
+            samples = samples.reshape(count, per_block)
+            self.mins.frombytes(samples.min(axis=1).astype("<i2").tobytes())
+            self.maxs.frombytes(samples.max(axis=1).astype("<i2").tobytes())
+            return
+        step = max(1, per_block // FALLBACK_SAMPLES_PER_PEAK)
+        with memoryview(buffer) as view, view[offset:offset + length].cast("h") as samples:
+            for i in range(count):
+                block = samples[i * per_block:(i + 1) * per_block:step]
+                self.mins.append(min(block))
+                self.maxs.append(max(block))
+
+    @classmethod
+    def from_wav(cls, audio_path):
+        """通过内存映射分块计算WAV文件的峰值，只支持16位PCM"""
+        with open(audio_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            fmt = parse_wav_header(mm)
+            if fmt["audio_format"] != 1 or fmt["bits_per_sample"] != 16:
+                raise AudioFormatError("波形概览只支持16位PCM WAV")
+            peaks = cls(fmt["sample_rate"], fmt["channels"])
+            offset, size = fmt["data_offset"], fmt["data_size"]
+            whole = size - size % peaks.block_bytes
+            chunk = CHUNK_PEAKS * peaks.block_bytes
+            for pos in range(0, whole, chunk):
+                peaks._add_blocks(mm, offset + pos, min(chunk, whole - pos))
+            peaks.append_pcm(mm[offset + whole:offset + size])
+            peaks.finish()
+        return peaks
+
+    def save(self, cache_path, audio_path):
+        """写入缓存文件，记录源文件的大小和修改时间"""
+        size, mtime_ns = source_signature(audio_path)
+        temp_path = f"{cache_path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(PEAKS_HEADER.pack(PEAKS_MAGIC, self.sample_rate, self.channels, self.samples_per_peak,
+                                      len(self.mins), size, mtime_ns))
+            f.write(self.mins.tobytes())
+            f.write(self.maxs.tobytes())
+        os.replace(temp_path, cache_path)
+
+    @classmethod
+    def load(cls, cache_path, audio_path):
+        """读取缓存文件，不存在、损坏或源文件已变化时返回None"""
+        try:
+            with open(cache_path, "rb") as f:
+                header = f.read(PEAKS_HEADER.size)
+                magic, sample_rate, channels, samples_per_peak, count, size, mtime_ns = PEAKS_HEADER.unpack(header)
+                if magic != PEAKS_MAGIC or (size, mtime_ns) != source_signature(audio_path):
+                    return None
+                peaks = cls(sample_rate, channels, samples_per_peak)
+                peaks.mins.fromfile(f, count)
+                peaks.maxs.fromfile(f, count)
+        except (OSError, EOFError, struct.error):
+            return None
+        return peaks
+
+    def columns(self, width):
+        """把峰值合并为width列，返回[(最小值, 最大值), ...]，取值范围-1到1"""
+        count = len(self.mins)
+        if not count or width <= 0:
+            return []
+        edges = [count * x // width for x in range(width + 1)]
+        if np is not None:
+            mins = np.frombuffer(self.mins, dtype=np.int16)
+            maxs = np.frombuffer(self.maxs, dtype=np.int16)
+            starts = np.minimum(np.array(edges[:-1]), count - 1)
+            return list(zip((np.minimum.reduceat(mins, starts) / 32768.0).tolist(),
+                            (np.maximum.reduceat(maxs, starts) / 32768.0).tolist()))
+        result = []
+        for x in range(width):
+            start = min(edges[x], count - 1)
+            end = max(edges[x + 1], start + 1)
+            result.append((min(self.mins[start:end]) / 32768.0, max(self.maxs[start:end]) / 32768.0))
+        return result
+
+
+def load_waveform(audio_path):
+    """读取音频文件的波形概览，缓存不存在或已过期时重新计算并写入缓存"""
+    cache_path = peaks_path(audio_path)
+    peaks = WaveformPeaks.load(cache_path, audio_path)
+    if peaks is None:
+        peaks = WaveformPeaks.from_wav(audio_path)
+        try:
+            peaks.save(cache_path, audio_path)
+        except OSError as e:
+            print(f"保存波形缓存失败: {e}")
+    return peaks